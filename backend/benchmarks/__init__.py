@@ -0,0 +1,15 @@
+"""Performance benchmarks for the backend.
+
+Run from the backend directory, e.g. `python -m benchmarks.bench_async_sessions`.
+Benchmarks use a temporary SQLite database file by default. Set BENCH_DB_URL to
+benchmark against Postgres instead (the database will be dropped and re-seeded, so
+don't point it at a database containing real data)."""
+
+import os
+import tempfile
+
+# set before database.database is imported, so the app's engines use the
+# benchmark database rather than the DB_URL in .env
+os.environ["DB_URL"] = os.getenv(
+    "BENCH_DB_URL", f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+)
@@ -0,0 +1,121 @@
+"""Compares GET /users/{user_id}/activities-to-plot/ (pace, speed and formatted
+date computed in the SQL query) against the previous pipeline (formatting the rows
+into dicts, deep copying them and computing the metrics per row in Python, then
+validating against ActivityPlot).
+
+    python -m benchmarks.bench_activities_to_plot --activities 10000 100000
+"""
+
+import argparse
+import asyncio
+from copy import deepcopy
+from typing import Any, Dict, List
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+from fastapi import FastAPI
+from sqlalchemy import select
+
+from benchmarks.utils import print_table, run_concurrent, seed_database
+from database.database import async_session_maker
+from database.models import ACTIVITY_PUBLIC_COLUMNS, Activity, ActivityPlot
+from main import app
+
+
+# the previous implementation of the common/utils.py functions used by
+# GET /users/{user_id}/activities-to-plot/, copied here (as common/utils.py has
+# since changed) so the baseline is the pipeline as it was
+
+
+def calculate_time_secs(moving_time: str) -> int:
+    hours, minutes, seconds = map(int, moving_time.split(":"))
+    return seconds + (minutes * 60) + (hours * 60 * 60)
+
+
+def calculate_pace_mins_per_km(distance: float, moving_time: str) -> str:
+    pace_secs_per_km = calculate_time_secs(moving_time) / distance
+    pace_mins = int(pace_secs_per_km // 60)
+    pace_secs = int(pace_secs_per_km % 60)
+    return f"{pace_mins}:{str(pace_secs).rjust(2, '0')}"
+
+
+def calculate_speed_km_per_hr(distance: float, moving_time: str) -> float:
+    time_hrs = calculate_time_secs(moving_time) / (60 * 60)
+    return round(distance / time_hrs, 2)
+
+
+def convert_pace_to_float(pace_string: str) -> float:
+    minutes, seconds = map(int, pace_string.split(":"))
+    return round((minutes + (seconds / 60)), 2)
+
+
+def convert_date_to_dt_format(date: str) -> str:
+    try:
+        year, month, day = date.split("/")
+        return f"{year}-{month}-{day}T00:00:00.000Z"
+    except ValueError:
+        return f"{date}T00:00:00.000Z"
+
+
+def update_activities_dict(
+    activities_data: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    updated_activities = deepcopy(activities_data)
+    for activity in updated_activities:
+        distance = activity["distance_km"]
+        moving_time = activity["moving_time"]
+        activity["pace_str_mps"] = calculate_pace_mins_per_km(distance, moving_time)
+        activity["pace_float_mps"] = convert_pace_to_float(activity["pace_str_mps"])
+        activity["speed_kmphr"] = calculate_speed_km_per_hr(distance, moving_time)
+        activity["formatted_date"] = convert_date_to_dt_format(activity["date"])
+    return updated_activities
+
+
+def format_query_output(data: List[tuple], col_names: List) -> List[Dict[str, Any]]:
+    formatted_data = []
+    for row in data:
+        formatted_data.append(dict(zip(col_names, row)))
+    return formatted_data
+
+
+# the previous implementation of GET /users/{user_id}/activities-to-plot/
+python_pipeline_app = FastAPI()
+
+
+@python_pipeline_app.get(
+    "/users/{user_id}/activities-to-plot/", response_model=list[ActivityPlot]
+)
+async def get_activities_to_plot_python_pipeline(
+    user_id: int, start_date: str = "1981-01-01", end_date: str = "2081-01-01"
+):
+    async with async_session_maker() as session:
+        query = select(*ACTIVITY_PUBLIC_COLUMNS).where(
+            Activity.user_id == user_id,
+            Activity.date > start_date,
+            Activity.date < end_date,
+        )
+        activities = await session.execute(query)
+        formatted = format_query_output(activities.all(), activities.keys())
+    return update_activities_dict(formatted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for n_activities in args.activities:
+        seed_database(n_users=1, activities_per_user=n_activities)
+        paths = ["/users/1/activities-to-plot/"] * args.requests
+        for name, target_app in (
+            ("python pipeline", python_pipeline_app),
+            ("sql", app),
+        ):
+            stats = asyncio.run(run_concurrent(target_app, paths, concurrency=1))
+            results.append({"pipeline": name, "activities": n_activities, **stats})
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
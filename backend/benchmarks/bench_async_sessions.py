@@ -0,0 +1,88 @@
+"""Compares requests per second at increasing concurrency for the async session
+routes against the previous approach of a sync Session inside an async def route.
+
+Against SQLite, each query is given an artificial latency (--query-latency-ms) to
+model a database round-trip. With the sync session the latency blocks the event
+loop, so throughput stays flat at the single-query rate; with the async session it
+scales with the number of requests in flight (up to the connection pool size).
+
+    python -m benchmarks.bench_async_sessions --query-latency-ms 5
+"""
+
+import argparse
+import asyncio
+import time
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import event
+from sqlmodel import Session
+
+from benchmarks.utils import print_table, run_concurrent, seed_database
+from database.database import async_engine, engine
+from database.models import Activity
+from main import app
+
+
+# the previous (blocking) implementation of GET /activities/{id}
+blocking_app = FastAPI()
+
+
+@blocking_app.get("/activities/{id}", response_model=Activity)
+async def get_activity_by_activity_id_blocking(id: int):
+    with Session(engine) as session:
+        activity = session.get(Activity, id)
+    if not activity:
+        raise HTTPException(status_code=404, detail="Activity not found")
+    return activity
+
+
+def add_query_latency(latency_secs: float):
+    """sleeps before every SQLite statement on both engines, to simulate the
+    round-trip time to the database. The sleep runs in the thread executing the
+    statement (the event loop thread for the sync engine, the aiosqlite worker
+    thread for the async engine), as a real network round-trip would."""
+
+    def sleep_on_statement(statement):
+        time.sleep(latency_secs)
+
+    def set_trace_callback(dbapi_connection, connection_record):
+        if hasattr(dbapi_connection, "await_"):  # aiosqlite adapted connection
+            dbapi_connection.await_(
+                dbapi_connection._connection.set_trace_callback(sleep_on_statement)
+            )
+        else:
+            dbapi_connection.set_trace_callback(sleep_on_statement)
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "connect", set_trace_callback)
+        # drop pooled connections opened before the listener was added
+        sync_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--query-latency-ms", type=float, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    seed_database(n_users=10, activities_per_user=100)
+    if engine.dialect.name == "sqlite":
+        # a real database server already has network latency
+        add_query_latency(args.query_latency_ms / 1000)
+    paths = [f"/activities/{i % 1000 + 1}" for i in range(args.requests)]
+
+    results = []
+    for concurrency in args.concurrency:
+        for name, target_app in (
+            ("sync session", blocking_app),
+            ("async session", app),
+        ):
+            stats = asyncio.run(run_concurrent(target_app, paths, concurrency))
+            results.append({"session": name, "concurrency": concurrency, **stats})
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
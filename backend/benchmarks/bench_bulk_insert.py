@@ -0,0 +1,78 @@
+"""Compares the throughput (activities created per second) of creating activities
+one at a time with POST /activities/ against POST /activities/bulk.
+
+    python -m benchmarks.bench_bulk_insert --activities 2000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+import httpx
+
+from benchmarks.utils import close_app_connections, print_table, seed_database
+from main import app
+from seed_db import make_activity
+
+
+async def post_one_at_a_time(client: httpx.AsyncClient, activities: list):
+    for activity in activities:
+        response = await client.post("/activities/", json=activity)
+        response.raise_for_status()
+
+
+async def post_bulk(client: httpx.AsyncClient, activities: list, batch_size: int):
+    for i in range(0, len(activities), batch_size):
+        response = await client.post(
+            "/activities/bulk", json=activities[i : i + batch_size]
+        )
+        response.raise_for_status()
+
+
+async def time_inserts(activities: list, batch_size: int | None) -> float:
+    """returns the seconds taken to create the activities (one at a time if
+    batch_size is None)"""
+    seed_database(n_users=1, activities_per_user=0)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        start = time.perf_counter()
+        if batch_size is None:
+            await post_one_at_a_time(client, activities)
+        else:
+            await post_bulk(client, activities, batch_size)
+        elapsed = time.perf_counter() - start
+    await close_app_connections()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[100, 1000])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    activities = [make_activity(1, rng) for _ in range(args.activities)]
+
+    results = []
+    for batch_size in [None, *args.batch_size]:
+        elapsed = asyncio.run(time_inserts(activities, batch_size))
+        results.append(
+            {
+                "endpoint": (
+                    "/activities/" if batch_size is None else "/activities/bulk"
+                ),
+                "batch_size": batch_size or 1,
+                "seconds": round(elapsed, 2),
+                "activities_per_sec": round(len(activities) / elapsed, 1),
+            }
+        )
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
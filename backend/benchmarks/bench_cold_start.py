@@ -0,0 +1,95 @@
+"""Measures the time to first response of a new server process: from starting
+uvicorn to the first successful GET / (importing the app, setting up the schema
+and starting the server), for each DB_SCHEMA_ON_STARTUP mode. The schema is
+created before the runs, as it would be for a new instance of a deployed app.
+
+    python -m benchmarks.bench_cold_start --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+import httpx
+
+from benchmarks.utils import print_table
+from database.database import create_db_and_tables
+
+MODES = ["create", "check", "skip"]
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_response(mode: str, timeout_secs: float = 30) -> float:
+    """starts a server with the schema startup mode, and returns the seconds until
+    it first responds to GET /"""
+    port = get_free_port()
+    env = {**os.environ, "DB_SCHEMA_ON_STARTUP": mode}
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout_secs:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+        raise TimeoutError(f"server didn't respond within {timeout_secs}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def time_import(module: str) -> float:
+    """returns the seconds taken to import the module in a new interpreter"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return float(output.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+
+    imports = [time_import("main") for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(imports) * 1000:.0f} ms\n")
+
+    results = []
+    for mode in MODES:
+        runs = [time_to_first_response(mode) for _ in range(args.runs)]
+        results.append(
+            {
+                "DB_SCHEMA_ON_STARTUP": mode,
+                "median_ms": round(statistics.median(runs) * 1000),
+                "min_ms": round(min(runs) * 1000),
+                "max_ms": round(max(runs) * 1000),
+            }
+        )
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compares the payload size and end-to-end latency of the activity listings
+uncompressed, gzipped and brotli compressed, over a simulated slow link (each
+response is delayed by the round trip time plus the time to transfer its body at
+the link's bandwidth).
+
+    python -m benchmarks.bench_compression --activities 2000 --bandwidth-kbps 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+import httpx
+
+from benchmarks.utils import close_app_connections, print_table, seed_database
+from main import app
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+class SlowLinkTransport(httpx.AsyncBaseTransport):
+    """transport to the ASGI app, delaying each response by the round trip time
+    plus the time to transfer its (compressed) body at the bandwidth"""
+
+    def __init__(self, app, bandwidth_kbps: float, rtt_ms: float):
+        self.transport = httpx.ASGITransport(app=app)
+        self.bytes_per_sec = bandwidth_kbps * 1000 / 8
+        self.rtt_secs = rtt_ms / 1000
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+        await asyncio.sleep(self.rtt_secs + len(body) / self.bytes_per_sec)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=httpx.ByteStream(body),
+        )
+
+
+async def time_requests(
+    path: str, encoding: str, requests: int, bandwidth_kbps: float, rtt_ms: float
+) -> dict:
+    """returns the size of the response body (as sent) and the median latency of
+    requesting the path (including decompressing the body)"""
+    transport = SlowLinkTransport(app, bandwidth_kbps, rtt_ms)
+    headers = {"Accept-Encoding": encoding}
+    latencies = []
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            size = response.num_bytes_downloaded
+    await close_app_connections()
+    latencies.sort()
+    return {
+        "bytes": size,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--bandwidth-kbps", type=float, default=2000)
+    parser.add_argument("--rtt-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    seed_database(n_users=1, activities_per_user=args.activities)
+    paths = [
+        f"/activities/?limit={min(args.activities, 1000)}",
+        "/users/1/activities-to-plot/",
+        "/users/1/activities/export?format=ndjson",
+        "/users/1/activities/export?format=csv",
+    ]
+
+    results = []
+    for path in paths:
+        for encoding in ENCODINGS:
+            stats = asyncio.run(
+                time_requests(
+                    path, encoding, args.requests, args.bandwidth_kbps, args.rtt_ms
+                )
+            )
+            results.append({"path": path, "encoding": encoding} | stats)
+        identity = results[-len(ENCODINGS)]
+        for row in results[-len(ENCODINGS) :]:
+            row["ratio"] = round(identity["bytes"] / row["bytes"], 1)
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
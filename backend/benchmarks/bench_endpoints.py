@@ -0,0 +1,239 @@
+"""Load test of every endpoint: seeds a synthetic dataset (see seed_db.py), then
+sends --requests requests to each endpoint against the ASGI app from --concurrency
+concurrent clients, and reports the throughput and p50/p95/p99 latency of each.
+
+The read endpoints are run first, then the writes (which create, update and then
+delete their own users and activities, so every request succeeds).
+
+    python -m benchmarks.bench_endpoints --output results.json
+
+The results can be saved as JSON with --output, and compared against a previous
+run with --baseline. The comparison fails (exit status 1) if any endpoint's p95
+latency has increased, or its throughput decreased, by more than --max-regression
+(a fraction, default 0.25):
+
+    python -m benchmarks.bench_endpoints --baseline results.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+
+from benchmarks.utils import print_table, run_requests, seed_database
+from database.database import engine
+from main import app
+from seed_db import make_activity
+
+# (method, path, json body or None)
+BenchRequest = Tuple[str, str, Any]
+
+BULK_ACTIVITIES = 100
+
+
+def get_scenarios(
+    n_users: int, activities_per_user: int, rng: random.Random
+) -> List[Tuple[str, int, Callable[[int], BenchRequest]]]:
+    """returns the (endpoint name, requests divisor, make request) of each endpoint
+    to benchmark, in the order to run them. make request is called with the index
+    of each request, and the divisor reduces the number of requests sent to slow
+    endpoints (e.g. exports of all of a user's activities)."""
+    n_activities = n_users * activities_per_user
+
+    def user_id(i: int) -> int:
+        return rng.randint(1, n_users)
+
+    def activity_id(i: int) -> int:
+        return rng.randint(1, n_activities)
+
+    def new_user_id(i: int) -> int:
+        # the users created by POST /users/
+        return n_users + 1 + i
+
+    return [
+        ("GET /", 1, lambda i: ("GET", "/", None)),
+        ("GET /users/", 1, lambda i: ("GET", "/users/", None)),
+        ("GET /users/{user_id}", 1, lambda i: ("GET", f"/users/{user_id(i)}", None)),
+        (
+            "GET /users/{user_id}/activities/",
+            1,
+            lambda i: ("GET", f"/users/{user_id(i)}/activities/?limit=20", None),
+        ),
+        (
+            "GET /users/{user_id}/activities-to-plot/",
+            1,
+            lambda i: ("GET", f"/users/{user_id(i)}/activities-to-plot/", None),
+        ),
+        (
+            "GET /users/{user_id}/stats",
+            1,
+            lambda i: ("GET", f"/users/{user_id(i)}/stats?period=month", None),
+        ),
+        (
+            "GET /users/{user_id}/weekly-summary",
+            1,
+            lambda i: ("GET", f"/users/{user_id(i)}/weekly-summary", None),
+        ),
+        (
+            "GET /users/{user_id}/activities/export",
+            10,
+            lambda i: ("GET", f"/users/{user_id(i)}/activities/export", None),
+        ),
+        ("GET /activities/", 1, lambda i: ("GET", "/activities/?limit=20", None)),
+        (
+            "GET /activities/{id}",
+            1,
+            lambda i: ("GET", f"/activities/{activity_id(i)}", None),
+        ),
+        ("GET /metrics", 10, lambda i: ("GET", "/metrics", None)),
+        (
+            "POST /users/",
+            1,
+            lambda i: (
+                "POST",
+                "/users/",
+                {"name": f"bench_{i}", "email": f"bench_{i}@email"},
+            ),
+        ),
+        (
+            "PATCH /users/{user_id}",
+            1,
+            lambda i: ("PATCH", f"/users/{new_user_id(i)}", {"name": f"renamed_{i}"}),
+        ),
+        (
+            "DELETE /users/{user_id}",
+            1,
+            lambda i: ("DELETE", f"/users/{new_user_id(i)}", None),
+        ),
+        (
+            "POST /activities/",
+            1,
+            lambda i: ("POST", "/activities/", make_activity(user_id(i), rng)),
+        ),
+        (
+            "POST /activities/bulk",
+            10,
+            lambda i: (
+                "POST",
+                "/activities/bulk",
+                [make_activity(user_id(i), rng) for _ in range(BULK_ACTIVITIES)],
+            ),
+        ),
+        (
+            "PATCH /activities/{id}",
+            1,
+            lambda i: (
+                "PATCH",
+                f"/activities/{activity_id(i)}",
+                {"distance_km": round(rng.uniform(1, 50), 2)},
+            ),
+        ),
+        (
+            # the seeded activities, from the last (so each exists)
+            "DELETE /activities/{id}",
+            1,
+            lambda i: ("DELETE", f"/activities/{n_activities - i}", None),
+        ),
+    ]
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    max_regression: float,
+) -> List[Dict[str, Any]]:
+    """returns a comparison of each endpoint in both results, and whether its p95
+    latency or throughput has regressed by more than max_regression"""
+    rows = []
+    for endpoint, result in results.items():
+        if endpoint not in baseline:
+            continue
+        base = baseline[endpoint]
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1
+        rps_change = result["rps"] / base["rps"] - 1
+        rows.append(
+            {
+                "endpoint": endpoint,
+                "p95_ms": result["p95_ms"],
+                "base_p95_ms": base["p95_ms"],
+                "p95_change": f"{p95_change:+.0%}",
+                "rps": result["rps"],
+                "base_rps": base["rps"],
+                "rps_change": f"{rps_change:+.0%}",
+                "regressed": p95_change > max_regression
+                or rps_change < -max_regression,
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--activities-per-user", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--baseline", help="results JSON file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    seed_database(args.users, args.activities_per_user, args.seed)
+    rng = random.Random(args.seed)
+    scenarios = get_scenarios(args.users, args.activities_per_user, rng)
+    # warm up (imports, connections)
+    warm_up = [
+        ("GET", f"/users/{i % args.users + 1}/activities/", None) for i in range(50)
+    ]
+    asyncio.run(run_requests(app, warm_up, args.concurrency))
+
+    results = {}
+    for endpoint, divisor, make_request in scenarios:
+        requests = [make_request(i) for i in range(max(args.requests // divisor, 1))]
+        results[endpoint] = asyncio.run(run_requests(app, requests, args.concurrency))
+
+    print_table(
+        [{"endpoint": endpoint, **result} for endpoint, result in results.items()]
+    )
+
+    if args.output:
+        config = {
+            "db": engine.dialect.name,
+            **{
+                key: getattr(args, key)
+                for key in (
+                    "users",
+                    "activities_per_user",
+                    "requests",
+                    "concurrency",
+                    "seed",
+                )
+            },
+        }
+        with open(args.output, "w") as file:
+            json.dump({"config": config, "results": results}, file, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        rows = find_regressions(results, baseline["results"], args.max_regression)
+        print()
+        print_table(rows)
+        regressed = [row["endpoint"] for row in rows if row["regressed"]]
+        if regressed:
+            print(
+                f"Regressed by more than {args.max_regression:.0%}: "
+                + ", ".join(regressed)
+            )
+            sys.exit(1)
+        print(f"No endpoint regressed by more than {args.max_regression:.0%}")
+
+
+if __name__ == "__main__":
+    main()
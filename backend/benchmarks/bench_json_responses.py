@@ -0,0 +1,56 @@
+"""Compares the activity listings (GET /activities/ and GET /users/{user_id}/activities/)
+with FastAPI's response_model handling against the FAST_JSON_RESPONSES path (rows
+encoded straight to JSON with orjson), for each page size.
+
+    python -m benchmarks.bench_json_responses --page-sizes 100 1000 5000
+"""
+
+import argparse
+import asyncio
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+
+from benchmarks.utils import print_table, run_concurrent, seed_database
+from main import app
+from routes import activities, users
+
+ENDPOINTS = ["/activities/", "/users/1/activities/"]
+
+
+def set_fast_json_responses(enabled: bool):
+    """switches the listings between the two paths (FAST_JSON_RESPONSES is
+    otherwise read from the environment on import)"""
+    activities.FAST_JSON_RESPONSES = enabled
+    users.FAST_JSON_RESPONSES = enabled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    seed_database(n_users=1, activities_per_user=max(args.page_sizes))
+
+    results = []
+    for endpoint in ENDPOINTS:
+        for page_size in args.page_sizes:
+            # each page is requested once first, so the comparison isn't skewed by
+            # the first query warming up the database
+            paths = [f"{endpoint}?limit={page_size}"] * (args.requests + 1)
+            p50 = {}
+            for name, enabled in (("response_model", False), ("fast", True)):
+                set_fast_json_responses(enabled)
+                asyncio.run(run_concurrent(app, paths[:1], concurrency=1))
+                stats = asyncio.run(run_concurrent(app, paths[1:], concurrency=1))
+                p50[name] = stats["p50_ms"]
+                results.append(
+                    {"endpoint": endpoint, "page_size": page_size, "path": name} | stats
+                )
+            results[-1]["speedup"] = round(p50["response_model"] / p50["fast"], 2)
+            results[-2]["speedup"] = 1.0
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
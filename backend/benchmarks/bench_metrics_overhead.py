@@ -0,0 +1,64 @@
+"""Measures the overhead of the request and database metrics (common/metrics.py),
+by timing the same requests with the metrics enabled and disabled. The runs
+alternate, so both see the same warm caches and database.
+
+    python -m benchmarks.bench_metrics_overhead --requests 2000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import statistics
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+
+from benchmarks.utils import print_table, run_concurrent, seed_database
+from common.metrics import metrics
+from main import app
+
+PATHS = [
+    "/",
+    "/activities/1",
+    "/users/1",
+    "/users/1/activities/?limit=20",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    seed_database(n_users=10, activities_per_user=100)
+    paths = [PATHS[i % len(PATHS)] for i in range(args.requests)]
+    # warm up (imports, connections)
+    asyncio.run(run_concurrent(app, paths[:100], args.concurrency))
+
+    runs = {True: [], False: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            metrics.enabled = enabled
+            runs[enabled].append(
+                asyncio.run(run_concurrent(app, paths, args.concurrency))
+            )
+
+    results = []
+    for enabled in (False, True):
+        results.append(
+            {
+                "metrics": "enabled" if enabled else "disabled",
+                **{
+                    key: round(statistics.median(run[key] for run in runs[enabled]), 2)
+                    for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+                },
+            }
+        )
+    disabled, enabled = results
+    overhead = (enabled["p50_ms"] - disabled["p50_ms"]) / disabled["p50_ms"] * 100
+    print_table(results)
+    print(f"p50 overhead: {overhead:.1f}% (median of {args.rounds} rounds)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compares the latency of GET /activities/ pages at increasing depth using
+offset pagination and cursor (keyset) pagination.
+
+    python -m benchmarks.bench_pagination --activities 100000
+"""
+
+import argparse
+import asyncio
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+from sqlalchemy import select
+from sqlmodel import Session
+
+from benchmarks.utils import print_table, run_concurrent, seed_database
+from common.pagination import encode_cursor, sort_activities
+from database.database import engine
+from database.models import Activity
+from main import app
+
+
+def cursor_at(depth: int, sort_by: str, order_by: str) -> str:
+    """returns the cursor for the page starting after depth activities"""
+    query = (
+        sort_activities(select(Activity), sort_by, order_by).offset(depth - 1).limit(1)
+    )
+    with Session(engine) as session:
+        last = session.exec(query).scalars().one()
+    return encode_cursor(sort_by, order_by, getattr(last, sort_by), last.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--sort-by", default="date")
+    parser.add_argument("--order-by", default="desc")
+    args = parser.parse_args()
+
+    seed_database(n_users=100, activities_per_user=args.activities // 100)
+    depths = [1, 1_000, 10_000, args.activities // 2]
+    depths = [depth for depth in depths if depth < args.activities]
+    base = f"/activities/?limit={args.limit}&sort_by={args.sort_by}&order_by={args.order_by}"
+
+    results = []
+    for depth in depths:
+        cursor = cursor_at(depth, args.sort_by, args.order_by)
+        for mode, path in (
+            ("offset", f"{base}&offset={depth}"),
+            ("cursor", f"{base}&cursor={cursor}"),
+        ):
+            stats = asyncio.run(
+                run_concurrent(app, [path] * args.requests, concurrency=1)
+            )
+            results.append({"mode": mode, "depth": depth, **stats})
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
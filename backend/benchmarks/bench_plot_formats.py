@@ -0,0 +1,79 @@
+"""Compares the payload size and latency of GET /users/{user_id}/activities-to-plot/
+as rows (every field of every activity) against the columnar format, against the
+columnar format projected to the two fields of a plot, and downsampled to 1000
+points.
+
+    python -m benchmarks.bench_plot_formats --activities 10000
+"""
+
+import argparse
+import asyncio
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+import httpx
+
+from benchmarks.utils import (
+    close_app_connections,
+    print_table,
+    run_concurrent,
+    seed_database,
+)
+from common.cache import activities_to_plot_cache
+from main import app
+
+QUERIES = {
+    "rows": "",
+    "columnar": "?format=columnar",
+    "rows, 2 fields": "?fields=distance_km,pace_float_mps",
+    "columnar, 2 fields": "?format=columnar&fields=distance_km,pace_float_mps",
+    "columnar, 2 fields, 1000 points": (
+        "?format=columnar&fields=date,pace_float_mps"
+        "&max_points=1000&x=date&y=pace_float_mps"
+    ),
+}
+
+
+async def get_sizes(path: str) -> dict:
+    """returns the uncompressed and gzipped size of the response body"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        sizes = {}
+        for encoding in ("identity", "gzip"):
+            response = await client.get(path, headers={"Accept-Encoding": encoding})
+            response.raise_for_status()
+            sizes[f"{encoding}_bytes"] = response.num_bytes_downloaded
+    await close_app_connections()
+    return sizes
+
+
+async def time_request(path: str, requests: int) -> float:
+    """returns the median latency, in ms, of uncached requests for the path"""
+    latencies = []
+    for _ in range(requests):
+        activities_to_plot_cache.clear()
+        stats = await run_concurrent(app, [path], concurrency=1)
+        latencies.append(stats["p50_ms"])
+    return sorted(latencies)[len(latencies) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    seed_database(n_users=1, activities_per_user=args.activities)
+
+    results = []
+    for name, query in QUERIES.items():
+        path = f"/users/1/activities-to-plot/{query}"
+        sizes = asyncio.run(get_sizes(path))
+        p50_ms = asyncio.run(time_request(path, args.requests))
+        results.append({"format": name, **sizes, "uncached_p50_ms": p50_ms})
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
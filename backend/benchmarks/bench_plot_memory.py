@@ -0,0 +1,99 @@
+"""Compares the peak memory (RSS) of GET /users/{user_id}/activities-to-plot/ for a
+user with 100k activities, before (dicts built from the rows, deep copied, then
+validated against ActivityPlot) and after (rows encoded straight to JSON).
+
+Each pipeline runs in a fresh subprocess, so its peak RSS isn't affected by the
+other.
+
+    python -m benchmarks.bench_plot_memory --activities 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+
+import benchmarks  # noqa: F401 (configures the benchmark database)
+import httpx
+
+from benchmarks.utils import close_app_connections, print_table, seed_database
+
+
+def peak_rss_mb() -> float:
+    """returns the peak resident set size of this process so far, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def get(app, path: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        response = await client.get(path)
+    await close_app_connections()
+    return response
+
+
+def measure(pipeline: str):
+    """requests the activities to plot with the given pipeline and prints the peak
+    RSS before and after as JSON (run in a subprocess by main)"""
+    from benchmarks.bench_activities_to_plot import python_pipeline_app
+    from main import app
+
+    target_app = python_pipeline_app if pipeline == "before" else app
+    # warm up (imports, connections) on a small date range
+    asyncio.run(get(target_app, "/users/1/activities-to-plot/?start_date=2025-01-01"))
+    baseline = peak_rss_mb()
+    response = asyncio.run(get(target_app, "/users/1/activities-to-plot/"))
+    peak = peak_rss_mb()
+    response.raise_for_status()
+
+    print(
+        json.dumps(
+            {
+                "pipeline": pipeline,
+                "activities": len(response.json()),
+                "baseline_rss_mb": round(baseline, 1),
+                "peak_rss_mb": round(peak, 1),
+                "increase_mb": round(peak - baseline, 1),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=100_000)
+    parser.add_argument(
+        "--measure", choices=["before", "after"], help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.measure:
+        return measure(args.measure)
+
+    seed_database(n_users=1, activities_per_user=args.activities)
+    results = []
+    for pipeline in ("before", "after"):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_plot_memory",
+                "--measure",
+                pipeline,
+            ],
+            env={**os.environ, "BENCH_DB_URL": os.environ["DB_URL"]},
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Compares the throughput of validating activity payloads with the shared
+validators (common/validation.py) against the previous strptime based validators,
+as the time taken per 100k payloads.
+
+    python -m benchmarks.bench_validation --payloads 100000 --invalid 0.05
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+from typing import Callable
+
+from pydantic import ValidationError, field_validator
+from sqlmodel import SQLModel
+
+from benchmarks.utils import print_table
+from common import validation
+from database.models import Activity, ActivityCreate, ActivityUpdate
+from seed_db import make_activity
+
+INVALID_VALUES = {
+    "date": ["25 March 25", "2025-02-30"],
+    "time": ["7.30pm", "24:00"],
+    "moving_time": ["30mins", "00:30"],
+    "activity": ["running"],
+    "perceived_effort": [100, "hard"],
+}
+
+
+def legacy_date(value):
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+        return value
+    except (ValueError, TypeError):
+        raise ValueError("Date does not match format 'YYYY-MM-DD'")
+
+
+def legacy_time(value):
+    try:
+        datetime.strptime(value, "%H:%M")
+        return value
+    except (ValueError, TypeError):
+        raise ValueError("Time does not match format 'HH:MM'")
+
+
+def legacy_duration(value):
+    try:
+        hours, minutes, seconds = map(int, value.split(":"))
+        return value
+    except (ValueError, AttributeError):
+        raise ValueError("Time does not match format 'HH:MM:SS'")
+
+
+def legacy_activity(value):
+    valid_activities = ["run", "ride"]
+    if value not in valid_activities:
+        raise ValueError(f"Activity not in {valid_activities}")
+    return value
+
+
+def legacy_perceived_effort(value):
+    try:
+        if value < 1 or value > 10:
+            raise ValueError("Perceived_effort not in range 1 - 10")
+        return value
+    except TypeError:
+        raise ValueError("Perceived_effort not a valid number in the range 1 - 10")
+
+
+class LegacyActivityUpdate(SQLModel):
+    """ActivityUpdate with the validators as they were before the shared ones"""
+
+    user_id: int | None = None
+    date: str | None = None
+    time: str | None = None
+    activity: str | None = None
+    activity_type: str | None = None
+    moving_time: str | None = None
+    distance_km: float | None = None
+    perceived_effort: int | None = None
+    elevation_m: int | None = None
+
+    _date_valid = field_validator("date", mode="before")(legacy_date)
+    _time_valid = field_validator("time", mode="before")(legacy_time)
+    _moving_time_valid = field_validator("moving_time", mode="before")(legacy_duration)
+    _activity_valid = field_validator("activity", mode="before")(legacy_activity)
+    _perceived_effort_valid = field_validator("perceived_effort", mode="before")(
+        legacy_perceived_effort
+    )
+
+
+LEGACY_CHECKS = {
+    "date": legacy_date,
+    "time": legacy_time,
+    "moving_time": legacy_duration,
+    "activity": legacy_activity,
+    "perceived_effort": legacy_perceived_effort,
+}
+
+SHARED_CHECKS = {
+    "date": validation.check_date,
+    "time": validation.check_time,
+    "moving_time": validation.check_duration,
+    "activity": validation.check_activity,
+    "perceived_effort": validation.check_perceived_effort,
+}
+
+
+def make_payloads(n: int, invalid: float, seed: int) -> list:
+    """returns n activity payloads (as from POST /activities/bulk), with the
+    fraction invalid having one invalid field"""
+    rng = random.Random(seed)
+    payloads = []
+    for _ in range(n):
+        payload = make_activity(1, rng)
+        if rng.random() < invalid:
+            field = rng.choice(list(INVALID_VALUES))
+            payload[field] = rng.choice(INVALID_VALUES[field])
+        payloads.append(payload)
+    return payloads
+
+
+def run_checks(checks: dict) -> Callable[[dict], None]:
+    def validate(payload: dict):
+        for field, check in checks.items():
+            try:
+                check(payload[field])
+            except ValueError:
+                pass
+
+    return validate
+
+
+def validate_model(model) -> Callable[[dict], None]:
+    def validate(payload: dict):
+        try:
+            model.model_validate(payload)
+        except ValidationError:
+            pass
+
+    return validate
+
+
+def validate_bulk(payload: dict):
+    """as POST /activities/bulk validates each activity"""
+    try:
+        Activity.model_validate(ActivityCreate.model_validate(payload))
+    except ValidationError:
+        pass
+
+
+def time_per_100k(validate: Callable[[dict], None], payloads: list) -> float:
+    """returns the milliseconds taken to validate 100k of the payloads"""
+    start = time.perf_counter()
+    for payload in payloads:
+        validate(payload)
+    return (time.perf_counter() - start) * 1000 * 100_000 / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payloads", type=int, default=100_000)
+    parser.add_argument(
+        "--invalid", type=float, default=0.05, help="fraction of invalid payloads"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.payloads, args.invalid, args.seed)
+    scenarios = [
+        ("field checks", run_checks(LEGACY_CHECKS), run_checks(SHARED_CHECKS)),
+        (
+            "ActivityUpdate",
+            validate_model(LegacyActivityUpdate),
+            validate_model(ActivityUpdate),
+        ),
+    ]
+
+    results = []
+    for name, legacy, shared in scenarios:
+        legacy_ms = time_per_100k(legacy, payloads)
+        shared_ms = time_per_100k(shared, payloads)
+        results.append(
+            {
+                "validation": name,
+                "legacy_ms_per_100k": round(legacy_ms),
+                "shared_ms_per_100k": round(shared_ms),
+                "speedup": round(legacy_ms / shared_ms, 2),
+            }
+        )
+    print_table(results)
+
+    bulk_ms = time_per_100k(validate_bulk, payloads)
+    print(f"\nbulk insert validation (ActivityCreate -> Activity): {bulk_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
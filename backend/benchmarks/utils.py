@@ -0,0 +1,97 @@
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+from sqlmodel import SQLModel
+
+from database.database import async_engine, engine
+from seed_db import seed_synthetic_data
+
+
+def reset_database():
+    """drops and recreates all tables in the benchmark database"""
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+
+
+def seed_database(n_users: int, activities_per_user: int, seed: int = 0):
+    """resets the benchmark database and seeds it with n_users users, each with
+    activities_per_user random activities (see seed_db.py)"""
+    reset_database()
+    seed_synthetic_data(engine, n_users, activities_per_user, seed)
+
+
+async def close_app_connections():
+    """closes the pooled connections of the app's async engine. asyncpg connections
+    are bound to the event loop they were opened in, so they must be closed before
+    the loop is (e.g. at the end of each asyncio.run()) for the next loop to open
+    its own."""
+    await async_engine.dispose()
+
+
+async def run_concurrent(
+    app, paths: List[str], concurrency: int, method: str = "GET"
+) -> Dict[str, float]:
+    """sends a request to each path against the ASGI app, with at most concurrency
+    requests in flight at once. Returns the throughput and latency percentiles."""
+    return await run_requests(
+        app, [(method, path, None) for path in paths], concurrency
+    )
+
+
+async def run_requests(
+    app, requests: List[Tuple[str, str, Any]], concurrency: int
+) -> Dict[str, float]:
+    """sends each (method, path, json body or None) request against the ASGI app,
+    in order, with at most concurrency requests in flight at once. Returns the
+    throughput and latency percentiles. The app's pooled connections are closed
+    afterwards, so each run can be in its own event loop."""
+    latencies = []
+    queue = list(reversed(requests))
+    transport = httpx.ASGITransport(app=app)
+
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+
+            async def worker():
+                while queue:
+                    method, path, body = queue.pop()
+                    start = time.perf_counter()
+                    response = await client.request(method, path, json=body)
+                    latencies.append(time.perf_counter() - start)
+                    response.raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+    finally:
+        await close_app_connections()
+
+    return summarise_latencies(latencies, elapsed)
+
+
+def summarise_latencies(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """returns throughput (requests per second) and p50/p95/p99 latency in ms"""
+    percentiles = (
+        statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    )
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentiles[49] * 1000, 2),
+        "p95_ms": round(percentiles[94] * 1000, 2),
+        "p99_ms": round(percentiles[98] * 1000, 2),
+    }
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    """prints a list of dicts (with the same keys) as an aligned table"""
+    headers = list(rows[0])
+    widths = [max(len(str(h)), *(len(str(row[h])) for row in rows)) for h in headers]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(row[h]).rjust(w) for h, w in zip(headers, widths)))
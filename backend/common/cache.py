@@ -0,0 +1,138 @@
+"""In-process cache of per-user responses, e.g. the encoded body of
+GET /users/{user_id}/activities-to-plot/, so repeated reads of the same user's
+activities don't re-run the query.
+
+Entries are evicted least recently used first once the cache is over its size
+limits, and expire after a TTL. The routes that change a user's activities
+invalidate that user's entries after committing. Each user also has a generation,
+incremented on invalidation: a read records the generation before querying the
+database, and its result is only stored if no write has invalidated the user since
+(otherwise a read which started before a write could store the old activities
+after the write's invalidation).
+
+The cache is per process, so with multiple workers a write in one worker doesn't
+invalidate the others' entries until they expire (set PLOT_CACHE_TTL_SECS
+accordingly, or to 0 to disable the cache).
+"""
+
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Set, Tuple
+
+
+class UserCache:
+    """bounded LRU cache with a TTL, for values keyed by a tuple starting with a
+    user_id, e.g. (user_id, start_date, end_date). The size of each value is its
+    length (e.g. for bytes) unless given."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_secs: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_secs = ttl_secs
+        self.clock = clock
+        # key -> (expiry time, value, size), least recently used first
+        self._entries: OrderedDict[Tuple, Tuple[float, Any, int]] = OrderedDict()
+        self._user_keys: Dict[int, Set[Tuple]] = defaultdict(set)
+        self._generations: Dict[int, int] = defaultdict(int)
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_secs > 0 and self.max_entries > 0
+
+    def generation(self, user_id: int) -> int:
+        """returns the user's generation, to pass to set"""
+        return self._generations[user_id]
+
+    def get(self, key: Tuple) -> Any | None:
+        """returns the value for key, or None if it isn't cached (or has expired)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Tuple, value: Any, generation: int, size: int | None = None):
+        """caches the value for key, unless the user has been invalidated since
+        generation was read (or the value is larger than the cache)"""
+        user_id = key[0]
+        size = len(value) if size is None else size
+        if (
+            not self.enabled
+            or generation != self._generations[user_id]
+            or size > self.max_bytes
+        ):
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self.clock() + self.ttl_secs, value, size)
+        self._user_keys[user_id].add(key)
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *user_ids: int):
+        """removes the users' entries, and stops any reads in progress for the users
+        from being cached"""
+        for user_id in user_ids:
+            self._generations[user_id] += 1
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        """removes all entries and resets the counters (the generations are kept,
+        so reads in progress still can't be cached)"""
+        for user_id in list(self._user_keys):
+            self._generations[user_id] += 1
+        self._entries.clear()
+        self._user_keys.clear()
+        self.size_bytes = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: Tuple):
+        _, _, size = self._entries.pop(key)
+        self.size_bytes -= size
+        user_keys = self._user_keys[key[0]]
+        user_keys.discard(key)
+        if not user_keys:
+            del self._user_keys[key[0]]
+
+
+# (ETag, encoded body) of GET /users/{user_id}/activities-to-plot/ responses, keyed
+# by (user_id, start date, end date, format, fields)
+activities_to_plot_cache = UserCache(
+    max_entries=int(os.getenv("PLOT_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.getenv("PLOT_CACHE_MAX_MB", 64)) * 1024 * 1024,
+    ttl_secs=float(os.getenv("PLOT_CACHE_TTL_SECS", 60)),
+)
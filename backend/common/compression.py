@@ -0,0 +1,162 @@
+"""Compression of responses, negotiated from the Accept-Encoding request header.
+
+The activity listings are long and repetitive JSON (the same keys, and values such
+as "run" and "road", in every row), so they compress to a fraction of their size.
+Brotli is used if the client accepts it, otherwise gzip. Responses smaller than
+the minimum size aren't compressed, as the saving is outweighed by the overhead.
+
+Streaming responses (the activity exports) are compressed chunk by chunk, with
+each compressed chunk flushed as it is sent, so the client still receives the
+export as it is streamed from the database.
+
+Configured from the environment:
+
+    COMPRESSION_ENABLED         compress responses (default true)
+    COMPRESSION_MINIMUM_SIZE    smallest response body, in bytes, that is
+                                compressed (default 1024)
+    COMPRESSION_GZIP_LEVEL      gzip level, 1 - 9 (default 6)
+    COMPRESSION_BROTLI_QUALITY  brotli quality, 0 - 11 (default 4, as higher
+                                qualities are too slow to compress per request)
+
+Compressed responses have a weak ETag, as the ETag then identifies the content
+rather than the exact bytes (see common/etags.py, which compares ETags weakly).
+"""
+
+import os
+import zlib
+from typing import List
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import IdentityResponder
+
+from database.pool import get_env_bool
+
+try:
+    import brotli
+except ImportError:  # brotli is in requirements.txt, but gzip alone works
+    brotli = None
+
+COMPRESSION_ENABLED = get_env_bool("COMPRESSION_ENABLED", True)
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+
+
+def get_supported_encodings() -> List[str]:
+    """returns the supported content encodings, in order of preference"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: str, supported: List[str]) -> str | None:
+    """returns the supported encoding with the highest q-value in the
+    Accept-Encoding header (preferring the first in supported on a tie), or None
+    if the client doesn't accept any of them"""
+    q_values = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            q_values[coding] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = q_values.get(encoding, q_values.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressingResponder(IdentityResponder):
+    """compresses the response (if it's at least the minimum size and not already
+    encoded), using Starlette's GZipMiddleware handling of the response messages.
+    Subclasses compress and flush each chunk of the body."""
+
+    async def send_with_compression(self, message):
+        if message["type"] == "http.response.body" and not self.started:
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if (
+                not self.content_encoding_set
+                and not self.content_type_is_excluded
+                and (more_body or len(body) >= self.minimum_size)
+            ):
+                # ETags from common/etags.py are already weak
+                headers = MutableHeaders(raw=self.initial_message["headers"])
+                etag = headers.get("ETag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+        await super().send_with_compression(message)
+
+
+class GZipResponder(CompressingResponder):
+    content_encoding = "gzip"
+
+    def __init__(self, app, minimum_size: int, level: int):
+        super().__init__(app, minimum_size)
+        # wbits 31 writes a gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        compressed = self.compressor.compress(body)
+        if more_body:
+            return compressed + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return compressed + self.compressor.flush()
+
+
+class BrotliResponder(CompressingResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        compressed = self.compressor.process(body)
+        if more_body:
+            return compressed + self.compressor.flush()
+        return compressed + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with brotli or gzip, whichever the
+    client prefers (see the module docstring)"""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.supported = get_supported_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("Accept-Encoding", "")
+        encoding = negotiate_encoding(accept_encoding, self.supported)
+        if encoding == "br":
+            responder = BrotliResponder(
+                self.app, self.minimum_size, self.brotli_quality
+            )
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, self.gzip_level)
+        else:
+            # adds Vary: Accept-Encoding, so caches don't serve this response to
+            # clients that accept compression
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -0,0 +1,80 @@
+"""Downsampling of plot series, so a long history (e.g. 10 years of daily runs)
+can be sent as about as many points as a chart can show.
+
+Points are selected with Largest-Triangle-Three-Buckets (LTTB, Steinarsson 2013):
+the first and last points are kept, the points in between are split into equal
+buckets, and from each bucket the point forming the largest triangle with the
+point selected from the previous bucket and the average of the next bucket is
+kept. This keeps the peaks and troughs that give the series its shape, which
+averaging or taking every nth point would smooth out or miss."""
+
+from typing import TYPE_CHECKING, Any, List, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def lttb_indices(
+    x: Sequence[float], y: Sequence[float], max_points: int
+) -> "np.ndarray":
+    """returns the indices (in ascending order) of at most max_points points of
+    the series selected by LTTB (max_points must be at least 3, for the first and
+    last points and one bucket). x must be sorted ascending. All the indices are
+    returned if there are no more than max_points points."""
+    # imported here as it's only needed for downsampling, and numpy is slow to
+    # import
+    import numpy as np
+
+    if max_points < 3:
+        raise ValueError("max_points must be at least 3")
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # max_points - 2 buckets between the first and last points, each with at
+    # least one point as n > max_points
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # the next bucket is the last point for the last bucket
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        # twice the triangle areas (the factor doesn't change the largest)
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def plot_values_to_floats(values: Sequence[Any]) -> "np.ndarray":
+    """returns the values of a plot axis as numbers, with dates ("YYYY-MM-DD") as
+    day numbers"""
+    import numpy as np
+
+    if values and isinstance(values[0], str):
+        return np.array(values, dtype="datetime64[D]").astype(np.float64)
+    return np.asarray(values, dtype=np.float64)
+
+
+def downsample_rows(
+    rows: Sequence[Sequence], x_index: int, y_index: int, max_points: int
+) -> List[Sequence]:
+    """returns at most max_points of the rows, selected by LTTB on the values at
+    x_index and y_index of each row. The rows must be sorted by x, and have no
+    null x or y values."""
+    if len(rows) <= max_points:
+        return list(rows)
+    x = plot_values_to_floats([row[x_index] for row in rows])
+    y = plot_values_to_floats([row[y_index] for row in rows])
+    return [rows[i] for i in lttb_indices(x, y, max_points)]
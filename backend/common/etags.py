@@ -0,0 +1,40 @@
+"""ETags for conditional GETs, so clients polling the same view get a 304 (without
+the body being queried or encoded again) if it hasn't changed.
+
+ETags are built from a version of the data rather than a hash of the body: a
+user's or activity's date_updated, or for a user's activity listings the number of
+activities and latest date_updated (see get_user_activities_etag in
+routes/users.py). The version must be read before the data, so an ETag can only be
+older than its body (in which case the next request gets the new body) and never
+newer.
+
+ETags are weak, as the same version is sent with different Content-Encodings (see
+common/compression.py), so 200 and 304 responses have the same ETag."""
+
+import hashlib
+from typing import Any
+
+from fastapi.responses import Response
+
+
+def make_etag(*parts: Any) -> str:
+    """returns a weak ETag for the version parts, e.g. make_etag("user", 1,
+    date_updated)"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """returns whether the If-None-Match request header matches the ETag (weak
+    comparison, so W/ prefixes are ignored)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in tags
+
+
+def not_modified(etag: str) -> Response:
+    """returns a 304 response for the ETag"""
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,228 @@
+"""Request and database metrics, exposed in the Prometheus text format on
+GET /metrics.
+
+MetricsMiddleware records, per method, route template (e.g. "/users/{user_id}")
+and status code:
+
+    http_request_duration_seconds   latency histogram (its _count is the number of
+                                    requests)
+    http_response_size_bytes        response body size histogram
+    http_request_db_queries         database queries per request histogram
+    http_request_db_duration_seconds  database time per request histogram
+
+The database queries are counted by SQLAlchemy engine events (see
+instrument_engine), and attributed to the request being handled through a context
+variable. Gauges registered with register_gauges (e.g. the connection pool and
+cache stats) are read when the metrics are scraped.
+
+Metrics are kept in memory per process, with no locking as they are only updated
+from the event loop. Set METRICS_ENABLED=false to turn off the recording.
+"""
+
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import Engine, event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+REQUEST_LABELS = ("method", "route", "status")
+
+
+def format_labels(label_names: Sequence[str], labels: Sequence[str]) -> str:
+    pairs = []
+    for name, value in zip(label_names, labels):
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return ",".join(pairs)
+
+
+class Histogram:
+    """histogram of observed values per set of labels, with fixed buckets"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float],
+        label_names: Sequence[str] = REQUEST_LABELS,
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        # labels -> [count per bucket (the last for values above all buckets),
+        # sum of values, count of values]
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (bucket_counts, total, count) in sorted(self.series.items()):
+            label_str = format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{{{label_str},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{self.name}_bucket{{{label_str},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {total}")
+            lines.append(f"{self.name}_count{{{label_str}}} {count}")
+        return lines
+
+
+class RequestDBStats:
+    """database queries made while handling a request"""
+
+    __slots__ = ("queries", "secs")
+
+    def __init__(self):
+        self.queries = 0
+        self.secs = 0.0
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.request_duration = Histogram(
+            "http_request_duration_seconds",
+            "Time to handle each request.",
+            LATENCY_BUCKETS,
+        )
+        self.response_size = Histogram(
+            "http_response_size_bytes",
+            "Size of each response body.",
+            SIZE_BUCKETS,
+        )
+        self.db_queries = Histogram(
+            "http_request_db_queries",
+            "Database queries made by each request.",
+            QUERY_COUNT_BUCKETS,
+        )
+        self.db_duration = Histogram(
+            "http_request_db_duration_seconds",
+            "Time spent executing database queries by each request.",
+            LATENCY_BUCKETS,
+        )
+        self.histograms = [
+            self.request_duration,
+            self.response_size,
+            self.db_queries,
+            self.db_duration,
+        ]
+        self.gauges: List[Tuple[str, str, Callable[[], Dict[str, float]]]] = []
+
+    def reset(self):
+        """clears the recorded histograms (the registered gauges are kept)"""
+        for histogram in self.histograms:
+            histogram.series.clear()
+
+    def register_gauges(
+        self, prefix: str, help: str, get_values: Callable[[], Dict[str, float]]
+    ):
+        """registers a function returning a dict of values, each exposed as a gauge
+        named prefix_key when the metrics are scraped"""
+        self.gauges.append((prefix, help, get_values))
+
+    def observe_request(
+        self, labels: Tuple[str, str, str], secs: float, size: int, db: RequestDBStats
+    ):
+        self.request_duration.observe(labels, secs)
+        self.response_size.observe(labels, size)
+        self.db_queries.observe(labels, db.queries)
+        self.db_duration.observe(labels, db.secs)
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms:
+            lines += histogram.render()
+        for prefix, help, get_values in self.gauges:
+            for key, value in get_values().items():
+                name = f"{prefix}_{key}"
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(
+    enabled=os.getenv("METRICS_ENABLED", "true").strip().lower()
+    not in ("0", "false", "no", "off")
+)
+
+# the database stats of the request being handled (None outside of requests)
+current_request_db_stats: ContextVar[RequestDBStats | None] = ContextVar(
+    "current_request_db_stats", default=None
+)
+
+
+def instrument_engine(engine: Engine):
+    """counts the queries executed by the engine (and the time taken) towards the
+    current request's database stats"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if current_request_db_stats.get() is not None:
+            starts = conn.info.setdefault("metrics_query_start", [])
+            starts.append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        stats = current_request_db_stats.get()
+        if stats is None or not conn.info.get("metrics_query_start"):
+            return
+        stats.queries += 1
+        stats.secs += time.perf_counter() - conn.info["metrics_query_start"].pop()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency, response size and database queries
+    of each request (see the module docstring)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        db_stats = RequestDBStats()
+        token = current_request_db_stats.set(db_stats)
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            current_request_db_stats.reset(token)
+            # the route is set on the scope by the router once matched, so the
+            # template is used rather than the path (e.g. "/users/{user_id}")
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            metrics.observe_request(
+                (scope["method"], route, str(status)),
+                time.perf_counter() - start,
+                size,
+                db_stats,
+            )
@@ -0,0 +1,146 @@
+"""Sorting and keyset (cursor) pagination for activity listings.
+
+Activities are ordered by the sort column with the id as a tie-breaker, so every
+page boundary can be described by the (sort value, id) of its last row. A cursor
+encodes that boundary, and the next page is fetched by seeking past it with a
+WHERE clause (using the (column, id) indexes) instead of an OFFSET, so deep pages
+cost the same as the first page."""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Float, Integer, Select, String, tuple_
+from sqlalchemy.types import TypeDecorator
+
+from database.models import Activity
+from database.types import DateString, DurationString, TimeString
+
+# the Python types of the (JSON decoded) cursor values of each column type (JSON
+# numbers without a fraction are decoded as ints)
+CURSOR_VALUE_TYPES = {Integer: int, Float: (int, float), String: str}
+
+
+def cursor_supported(sort_by: str) -> bool:
+    """whether activities sorted by the column can be paged with a cursor. Columns
+    which can be null (elevation_m) can't, as seeking past a position
+    would also need the nulls sorted last, which stops the (column, id) index being
+    used for the seek (on Postgres), so they are paged by offset."""
+    return not Activity.__table__.c[sort_by].nullable
+
+
+def encode_cursor(sort_by: str, order_by: str, value: Any, id: int) -> str:
+    """encodes the position of the last activity on a page as an opaque string"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    data = json.dumps([sort_by, order_by.lower(), value, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def parse_cursor_value(value: Any, sort_by: str) -> Any:
+    """returns the sort value of a decoded cursor, checked against the type of the
+    sort column. Raises a ValueError if it isn't a value of the column."""
+    col_type = Activity.__table__.c[sort_by].type
+    if isinstance(col_type, (DateString, TimeString, DurationString)):
+        # kept in the API format, checked by converting it as it would be bound
+        if not isinstance(value, str):
+            raise ValueError("Invalid cursor")
+        col_type.process_bind_param(value, None)
+        return value
+    if isinstance(col_type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(col_type, TypeDecorator):
+        col_type = col_type.impl_instance
+    # bools are ints in Python, but not in the database
+    if isinstance(value, bool):
+        raise ValueError("Invalid cursor")
+    for sql_type, python_types in CURSOR_VALUE_TYPES.items():
+        if isinstance(col_type, sql_type) and isinstance(value, python_types):
+            return value
+    raise ValueError("Invalid cursor")
+
+
+def decode_cursor(cursor: str, sort_by: str, order_by: str) -> Tuple[Any, int]:
+    """decodes a cursor made by encode_cursor, returning the (sort value, id) of the
+    last activity on the previous page. Raises a ValueError if the cursor is invalid
+    or was made for a different sort_by / order_by."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        cursor_sort_by, cursor_order_by, value, id = data
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_sort_by != sort_by or cursor_order_by != order_by.lower():
+        raise ValueError("Cursor does not match sort_by and order_by")
+    if not cursor_supported(sort_by):
+        raise ValueError(f"Cursors are not supported when sorting by {sort_by}")
+    if not isinstance(id, int) or isinstance(id, bool):
+        raise ValueError("Invalid cursor")
+    try:
+        value = parse_cursor_value(value, sort_by)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return value, id
+
+
+def sort_activities(query: Select, sort_by: str, order_by: str) -> Select:
+    """orders the activities query by the sort column then id. Nulls are sorted last
+    in both directions (so the order is the same on Postgres and SQLite)."""
+    sort_col = Activity.__table__.c[sort_by]
+    id_col = Activity.__table__.c.id
+    descending = order_by.lower() == "desc"
+
+    sort_order = sort_col.desc() if descending else sort_col.asc()
+    if sort_col.nullable:
+        sort_order = sort_order.nulls_last()
+    if sort_col is id_col:
+        return query.order_by(sort_order)
+    return query.order_by(sort_order, id_col.desc() if descending else id_col.asc())
+
+
+def seek_activities(
+    query: Select, sort_by: str, order_by: str, value: Any, id: int
+) -> Select:
+    """filters the activities query to those sorted after the (sort value, id)
+    position, matching the order of sort_activities. The sort column can't be null
+    (see cursor_supported), so the seek is a single range of the (column, id)
+    index."""
+    sort_col = Activity.__table__.c[sort_by]
+    id_col = Activity.__table__.c.id
+    descending = order_by.lower() == "desc"
+
+    if sort_col is id_col:
+        return query.where(id_col < id if descending else id_col > id)
+
+    position = tuple_(sort_col, id_col)
+    return query.where(position < (value, id) if descending else position > (value, id))
+
+
+def paginate_activities(
+    query: Select,
+    sort_by: str,
+    order_by: str,
+    offset: int,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Select:
+    """sorts and paginates the activities query. If a cursor is given, the page
+    starts after the cursor position (and offset is ignored), otherwise offset
+    activities are skipped."""
+    query = sort_activities(query, sort_by, order_by).limit(limit)
+    if cursor is None:
+        return query.offset(offset)
+    value, id = decode_cursor(cursor, sort_by, order_by)
+    return seek_activities(query, sort_by, order_by, value, id)
+
+
+def get_next_cursor(
+    activities: List[Activity], sort_by: str, order_by: str, limit: int
+) -> Optional[str]:
+    """returns the cursor for the page after the given page of activities, or None
+    if the page isn't full (so there are no more activities) or the sort column
+    doesn't support cursors"""
+    if not cursor_supported(sort_by) or not activities or len(activities) < limit:
+        return None
+    last = activities[-1]
+    return encode_cursor(sort_by, order_by, getattr(last, sort_by), last.id)
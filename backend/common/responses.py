@@ -0,0 +1,82 @@
+"""Responses for returning query results (rows) directly, without first building
+a dict (or model) per row.
+
+Set FAST_JSON_RESPONSES=true to also return the activity listings this way, encoded
+with orjson, rather than validating each activity against the response_model and
+encoding it with FastAPI's encoder. The response_model is kept for the OpenAPI
+schema, and the responses are the same either way."""
+
+import json
+from typing import Iterable, Sequence
+
+import orjson
+from fastapi.responses import Response
+
+from database.pool import get_env_bool
+
+FAST_JSON_RESPONSES = get_env_bool("FAST_JSON_RESPONSES", False)
+
+
+def encode_json_rows(
+    rows: Iterable[Sequence], col_names: Sequence[str], fast: bool = False
+) -> memoryview:
+    """encodes rows (tuples of values in the order of col_names) as a JSON array of
+    objects in a single pass, in the format [{col_1: value_1, col_2: value_2}].
+
+    Each row is appended to a single buffer as it is encoded (rather than joining
+    a list of encoded rows), which is returned without copying it to bytes. If
+    fast, rows are encoded with orjson rather than the json module."""
+    if fast:
+        dumps = orjson.dumps
+    else:
+        encode = json.JSONEncoder(
+            ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode
+
+        def dumps(obj) -> bytes:
+            return encode(obj).encode("utf-8")
+
+    buffer = bytearray(b"[")
+    for row in rows:
+        # each row's dict only lives until it is encoded
+        buffer += dumps(dict(zip(col_names, row)))
+        buffer += b","
+    if len(buffer) > 1:
+        buffer[-1:] = b"]"
+    else:
+        buffer += b"]"
+    return memoryview(buffer)
+
+
+def encode_json_columns(
+    rows: Iterable[Sequence], col_names: Sequence[str], fast: bool = False
+) -> bytes:
+    """encodes rows (tuples of values in the order of col_names) as a JSON object of
+    one array per column, in the format {col_1: [row_1_value, row_2_value]}.
+
+    The keys are only encoded once (rather than once per row), so this is much
+    smaller than encode_json_rows for many rows. If fast, the object is encoded
+    with orjson rather than the json module."""
+    columns = list(zip(*rows)) or [()] * len(col_names)
+    obj = dict(zip(col_names, columns))
+    if fast:
+        return orjson.dumps(obj)
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class JSONRowsResponse(Response):
+    """JSON response of a list of rows, encoded as an array of objects with the
+    column names as keys (the same as a JSONResponse of a list of dicts)"""
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        rows: Iterable[Sequence],
+        col_names: Sequence[str],
+        fast: bool = False,
+        **kwargs,
+    ):
+        super().__init__(content=encode_json_rows(rows, col_names, fast), **kwargs)
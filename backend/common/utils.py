@@ -1,5 +1,8 @@
-from typing import Any, Dict, List
-from copy import deepcopy
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 def calculate_time_secs(moving_time: str) -> int:
@@ -11,6 +14,14 @@ def calculate_time_secs(moving_time: str) -> int:
     return time_secs
 
 
+def format_time_secs(time_secs: int) -> str:
+    """formats a time in seconds as a string in the format "HH:MM:SS" (the inverse
+    of calculate_time_secs)"""
+    hours, remainder = divmod(time_secs, 60 * 60)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
 def calculate_pace_mins_per_km(distance: float, moving_time: str) -> str:
     """Calculates the pace of an activity in minutes per km, returning the pace as
     a string in the format "MM:SS"
@@ -47,19 +58,94 @@ def convert_date_to_dt_format(date: str) -> str:
         return formatted_date_str
 
 
-def update_activities_dict(activities_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def parse_date(date_str: str) -> date:
+    """parses a date string in the format "YYYY-MM-DD" or "YYYY/MM/DD" into a date.
+    Raises a ValueError if the string is in neither format."""
+    return datetime.strptime(date_str.replace("/", "-"), "%Y-%m-%d").date()
+
+
+def round_2dp(values: "np.ndarray") -> "np.ndarray":
+    """rounds an array of floats to 2 decimal places, matching round(value, 2).
+
+    np.round scales by 100 before rounding, which can round differently to round()
+    when the scaled value is (almost) exactly halfway between two integers, so
+    those values (and any too large to scale exactly) are rounded with round()."""
+    import numpy as np
+
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_halfway = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    inexact = near_halfway | (np.abs(scaled) > 2**52)
+    for i in np.flatnonzero(inexact):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def calculate_activity_metrics(
+    distances: Sequence[float], times_secs: Sequence[int]
+) -> Dict[str, List[Any]]:
+    """calculates the pace and speed of a batch of activities at once, from a
+    sequence of distances (km) and a sequence of moving times (secs). Returns a
+    dictionary of lists (one value per activity) in the format
+    {"pace_str_mps": [...], "pace_float_mps": [...], "speed_kmphr": [...]}
+
+    The results are the same as calculate_pace_mins_per_km, convert_pace_to_float
+    and calculate_speed_km_per_hr, but calculated with array arithmetic rather
+    than per activity. Like those, raises a ZeroDivisionError if any distance or
+    moving time is 0.
+    """
+    # imported here rather than at the top of the module, as the API doesn't use
+    # these functions (the metrics are computed in SQL, see database/expressions.py)
+    # and numpy is slow to import
+    import numpy as np
+
+    distance = np.asarray(distances, dtype=np.float64)
+    time_secs = np.asarray(times_secs, dtype=np.int64)
+    if not np.all(distance) or not np.all(time_secs):
+        raise ZeroDivisionError("distance and moving time must not be 0")
+
+    pace_secs_per_km = time_secs / distance
+    pace_mins = np.floor_divide(pace_secs_per_km, 60).astype(np.int64)
+    pace_secs = np.mod(pace_secs_per_km, 60).astype(np.int64)
+    speed = distance / (time_secs / (60 * 60))
+
+    return {
+        "pace_str_mps": [
+            f"{mins}:{str(secs).rjust(2, "0")}"
+            for mins, secs in zip(pace_mins.tolist(), pace_secs.tolist())
+        ],
+        "pace_float_mps": round_2dp(pace_mins + (pace_secs / 60)).tolist(),
+        "speed_kmphr": round_2dp(speed).tolist(),
+    }
+
+
+def update_activities_dict(
+    activities_data: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
     """updates the activities data returned from the API with additional keys of pace_str_mps,
-    pace_float_mps, speed_kmphr and formatted_time"""
-    updated_activities = deepcopy(activities_data)
-    for activity in updated_activities:
-        distance = activity["distance_km"]
-        moving_time = activity["moving_time"]
-        date = activity["date"]
-        activity["pace_str_mps"] = calculate_pace_mins_per_km(distance, moving_time)
-        activity["pace_float_mps"] = convert_pace_to_float(activity["pace_str_mps"])
-        activity["speed_kmphr"] = calculate_speed_km_per_hr(distance, moving_time)
-        activity["formatted_date"] = convert_date_to_dt_format(date)
-    return updated_activities
+    pace_float_mps, speed_kmphr and formatted_time. Returns new dictionaries (in a
+    single pass, without copying the input first) and leaves the input unchanged."""
+    if not activities_data:
+        return []
+    metrics = calculate_activity_metrics(
+        [activity["distance_km"] for activity in activities_data],
+        [calculate_time_secs(activity["moving_time"]) for activity in activities_data],
+    )
+    return [
+        {
+            **activity,
+            "pace_str_mps": pace_str,
+            "pace_float_mps": pace_float,
+            "speed_kmphr": speed,
+            "formatted_date": convert_date_to_dt_format(activity["date"]),
+        }
+        for activity, pace_str, pace_float, speed in zip(
+            activities_data,
+            metrics["pace_str_mps"],
+            metrics["pace_float_mps"],
+            metrics["speed_kmphr"],
+        )
+    ]
 
 
 def format_query_output(data: List[tuple], col_names: List) -> List[Dict[str, Any]]:
@@ -73,4 +159,4 @@ def format_query_output(data: List[tuple], col_names: List) -> List[Dict[str, An
     formatted_data = []
     for row in data:
         formatted_data.append(dict(zip(col_names, row)))
-    return formatted_data
\ No newline at end of file
+    return formatted_data
@@ -0,0 +1,99 @@
+"""Checks of the activity and user fields, shared by the models' validators (see
+database/models.py).
+
+Activities are validated on every write (up to 10,000 per bulk request), so the
+common, well formed values are checked with precompiled regexes rather than
+datetime.strptime. Anything the regexes don't match (e.g. "2025-3-5", which strptime
+also accepts, or an invalid value) falls back to the original check, so exactly
+the same values are accepted."""
+
+import re
+from datetime import date, datetime
+from typing import Any
+
+VALID_ACTIVITIES = ["run", "ride"]
+_VALID_ACTIVITIES_SET = frozenset(VALID_ACTIVITIES)
+
+# zero padded "YYYY-MM-DD", "HH:MM" and "HH:MM:SS" (ASCII digits only)
+DATE_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+TIME_PATTERN = re.compile(r"(?:[01][0-9]|2[0-3]):[0-5][0-9]")
+DURATION_PATTERN = re.compile(r"[0-9]+:[0-9]+:[0-9]+")
+
+DATE_ERROR = "Date does not match format 'YYYY-MM-DD'"
+TIME_ERROR = "Time does not match format 'HH:MM'"
+DURATION_ERROR = "Time does not match format 'HH:MM:SS'"
+ACTIVITY_ERROR = f"Activity not in {VALID_ACTIVITIES}"
+EFFORT_RANGE_ERROR = "Perceived_effort not in range 1 - 10"
+EFFORT_TYPE_ERROR = "Perceived_effort not a valid number in the range 1 - 10"
+EMAIL_ERROR = "Invalid email address."
+
+
+def check_date(value: Any) -> Any:
+    """returns the value if it's a date in the format "YYYY-MM-DD" (as parsed by
+    datetime.strptime), otherwise raises a ValueError"""
+    if type(value) is str and DATE_PATTERN.fullmatch(value):
+        try:
+            # checks the month and day are in range
+            date.fromisoformat(value)
+            return value
+        except ValueError:
+            pass
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+        return value
+    except (ValueError, TypeError):
+        raise ValueError(DATE_ERROR)
+
+
+def check_time(value: Any) -> Any:
+    """returns the value if it's a time in the format "HH:MM" (as parsed by
+    datetime.strptime), otherwise raises a ValueError"""
+    if type(value) is str and TIME_PATTERN.fullmatch(value):
+        return value
+    try:
+        datetime.strptime(value, "%H:%M")
+        return value
+    except (ValueError, TypeError):
+        raise ValueError(TIME_ERROR)
+
+
+def check_duration(value: Any) -> Any:
+    """returns the value if it's a duration in the format "HH:MM:SS" (three
+    integers, as parsed by calculate_time_secs), otherwise raises a ValueError"""
+    if type(value) is str and DURATION_PATTERN.fullmatch(value):
+        return value
+    try:
+        hours, minutes, seconds = map(int, value.split(":"))
+        return value
+    except (ValueError, AttributeError):
+        raise ValueError(DURATION_ERROR)
+
+
+def check_activity(value: Any) -> Any:
+    """returns the value if it's one of VALID_ACTIVITIES, otherwise raises a
+    ValueError"""
+    if type(value) is str and value in _VALID_ACTIVITIES_SET:
+        return value
+    if value not in VALID_ACTIVITIES:
+        raise ValueError(ACTIVITY_ERROR)
+    return value
+
+
+def check_perceived_effort(value: Any) -> Any:
+    """returns the value if it's between 1 and 10, otherwise raises a ValueError"""
+    if type(value) is int and 1 <= value <= 10:
+        return value
+    try:
+        if value < 1 or value > 10:
+            raise ValueError(EFFORT_RANGE_ERROR)
+        return value
+    except TypeError:
+        raise ValueError(EFFORT_TYPE_ERROR)
+
+
+def check_email(value: Any) -> Any:
+    """returns the value if it looks like an email address, otherwise raises a
+    ValueError"""
+    if "@" not in value:
+        raise ValueError(EMAIL_ERROR)
+    return value
@@ -1,20 +1,95 @@
-from typing import Annotated
+from typing import Annotated, AsyncGenerator, Literal, get_args
 from fastapi import Depends
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
 import os
 from dotenv import load_dotenv
 
+from database.migrations import run_migrations, schema_is_current
+from database.pool import PoolMetrics, get_pool_class, get_pool_options, get_pool_stats
+
 
 load_dotenv()
 
-# create sqlalchemy engine (holds connection to db)
+# async drivers to swap in for each sync driver, so a single DB_URL can be used
+# for both the sync engine (scripts, table creation) and the async engine (routes)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+pg8000": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_url(url: str) -> str:
+    """converts a sync database url (e.g. "postgresql://...") into the equivalent
+    url for its async driver (e.g. "postgresql+asyncpg://..."). Urls which already
+    use an async driver are returned unchanged."""
+    db_url = make_url(url)
+    async_driver = ASYNC_DRIVERS.get(db_url.drivername, db_url.drivername)
+    return db_url.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
+# create sqlalchemy engines (hold connections to db). The sync engine is used for
+# creating tables and scripts such as seed_db.py, the async engine is used by the
+# routes so database round-trips don't block the event loop
 postgres_url = os.getenv("DB_URL")
-engine = create_engine(postgres_url)
+async_url = os.getenv("ASYNC_DB_URL") or get_async_url(postgres_url)
+engine = create_engine(postgres_url, **get_pool_options(postgres_url))
+# checkout metrics for the routes' connection pool (see get_async_pool_stats)
+async_pool_metrics = PoolMetrics()
+async_engine = create_async_engine(
+    async_url,
+    poolclass=get_pool_class(async_url, async_pool_metrics),
+    **get_pool_options(async_url),
+)
+
+# expire_on_commit=False so returned objects can be serialised after the commit
+# without triggering a lazy (blocking) refresh
+async_session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+# how the app sets up the schema on startup (DB_SCHEMA_ON_STARTUP):
+#   "check"   (default) creates the tables and runs migrations only if the
+#             schema_version table is behind, checked with a single query
+#   "create"  always runs create_all and the migrations, which inspect each table
+#   "skip"    does nothing, e.g. in the workers of the production server (see
+#             server.py), which sets up the schema once before starting them
+SchemaStartupMode = Literal["check", "create", "skip"]
+SCHEMA_ON_STARTUP = os.getenv("DB_SCHEMA_ON_STARTUP", "check").strip().lower()
+if SCHEMA_ON_STARTUP not in get_args(SchemaStartupMode):
+    raise ValueError(
+        f"DB_SCHEMA_ON_STARTUP must be one of {', '.join(get_args(SchemaStartupMode))}"
+    )
 
 
 def create_db_and_tables():
-    """Creates tables for all table models"""
+    """Creates tables for all table models, then applies any schema migrations
+    (e.g. new indexes) which create_all doesn't make to existing tables"""
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+
+
+def setup_schema(mode: SchemaStartupMode = SCHEMA_ON_STARTUP):
+    """sets up the schema on startup, according to mode (see SCHEMA_ON_STARTUP)"""
+    if mode == "skip":
+        return
+    if mode == "check" and schema_is_current(engine):
+        return
+    create_db_and_tables()
+
+
+async def dispose_engines():
+    """closes the engines' pooled connections (on shutdown)"""
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def get_async_pool_stats() -> dict:
+    """returns the size, usage and checkout metrics of the routes' connection pool"""
+    return get_pool_stats(async_engine.sync_engine, async_pool_metrics)
 
 
 def get_session():
@@ -27,4 +102,28 @@ def get_session():
         yield session
 
 
+def get_async_session_maker() -> async_sessionmaker[AsyncSession]:
+    """Returns the factory for async sessions. Used directly by routes which need
+    a session that outlives the request handler (e.g. streaming responses, as
+    the session dependency is closed before the response is sent)."""
+    return async_session_maker
+
+
+AsyncSessionMakerDep = Annotated[
+    async_sessionmaker[AsyncSession], Depends(get_async_session_maker)
+]
+
+
+async def get_async_session(
+    session_maker: AsyncSessionMakerDep,
+) -> AsyncGenerator[AsyncSession, None]:
+    """Creates an async session. A new session is provided for each request.
+
+    Async equivalent of get_session, used by the routes so that queries are
+    awaited rather than blocking the event loop."""
+    async with session_maker() as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
@@ -0,0 +1,132 @@
+"""SQL expressions for metrics derived from the activity columns (pace, speed and
+formatted date), so they are computed by the database in the SELECT rather than
+per row in Python. They match the functions in common/utils.py: values rounded to
+decimal places are rounded in Python as the result is read (see round_float), as
+the databases' ROUND can round halfway values differently to round().
+
+The expressions compile for both Postgres and SQLite, using the custom functions
+below where the two differ."""
+
+from sqlalchemy import Float, Integer, String, case, cast, func, type_coerce
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from database.models import ACTIVITY_PUBLIC_COLUMNS, Activity
+from database.types import DateString, RoundedFloat
+
+
+class floor_int(FunctionElement):
+    """rounds a non-negative number down to an integer"""
+
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(floor_int)
+def compile_floor_int(element, compiler, **kw):
+    # Postgres rounds to the nearest integer when casting, so floor first
+    return f"CAST(FLOOR({compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+
+@compiles(floor_int, "sqlite")
+def compile_floor_int_sqlite(element, compiler, **kw):
+    # SQLite truncates when casting (and FLOOR isn't always available)
+    return f"CAST({compiler.process(element.clauses, **kw)} AS INTEGER)"
+
+
+class date_bucket(FunctionElement):
+    """truncates a date to the start of its week (Monday), month or year, e.g.
+    date_bucket("month", Activity.date)"""
+
+    type = DateString()
+    inherit_cache = True
+    # so the period is part of the statement cache key
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ("period", InternalTraversal.dp_string)
+    ]
+
+    def __init__(self, period: str, date, **kwargs):
+        if period not in ("week", "month", "year"):
+            raise ValueError(f"Invalid period {period!r}")
+        self.period = period
+        super().__init__(date, **kwargs)
+
+
+@compiles(date_bucket)
+def compile_date_bucket(element, compiler, **kw):
+    date = compiler.process(element.clauses, **kw)
+    return f"CAST(DATE_TRUNC('{element.period}', {date}) AS DATE)"
+
+
+@compiles(date_bucket, "sqlite")
+def compile_date_bucket_sqlite(element, compiler, **kw):
+    date = compiler.process(element.clauses, **kw)
+    if element.period == "week":
+        # %w is the day of the week, with Sunday as 0
+        return f"DATE({date}, '-' || ((STRFTIME('%w', {date}) + 6) % 7) || ' days')"
+    return f"DATE({date}, 'start of {element.period}')"
+
+
+def round_float(value, places: int):
+    """the value as a float, rounded to the given number of decimal places when
+    the result is read (with round() in Python, see RoundedFloat), e.g.
+    round_float(column, 2)"""
+    return type_coerce(cast(value, Float), RoundedFloat(places))
+
+
+# moving_time is stored as seconds (see database/types.py)
+moving_time_secs = type_coerce(Activity.moving_time, Integer)
+
+# nulls (rather than division by zero errors) if distance or moving_time are 0
+pace_secs_per_km = cast(moving_time_secs, Float) / func.nullif(Activity.distance_km, 0)
+pace_whole_secs = floor_int(pace_secs_per_km)
+pace_mins = pace_whole_secs // 60
+pace_secs = pace_whole_secs % 60
+
+# see calculate_pace_mins_per_km, convert_pace_to_float, calculate_speed_km_per_hr
+# and convert_date_to_dt_format
+pace_str_mps = (
+    cast(pace_mins, String)
+    + ":"
+    + case((pace_secs < 10, "0"), else_="")
+    + cast(pace_secs, String)
+)
+pace_float_mps = round_float(pace_mins + cast(pace_secs, Float) / 60, 2)
+speed_kmphr = round_float(
+    Activity.distance_km / (cast(func.nullif(moving_time_secs, 0), Float) / 3600), 2
+)
+formatted_date = cast(Activity.date, String) + "T00:00:00.000Z"
+
+# the ActivityPlot fields added to the activity columns
+ACTIVITY_PLOT_METRICS = [
+    pace_str_mps.label("pace_str_mps"),
+    pace_float_mps.label("pace_float_mps"),
+    speed_kmphr.label("speed_kmphr"),
+    formatted_date.label("formatted_date"),
+]
+
+# the columns of each ActivityPlot field, in the order of ActivityPlot, so
+# activities-to-plot can select only the requested fields
+ACTIVITY_PLOT_COLUMNS = {
+    col.name: col for col in [*ACTIVITY_PUBLIC_COLUMNS, *ACTIVITY_PLOT_METRICS]
+}
+
+
+def activity_stats_columns(period: str) -> list:
+    """the columns of ActivityStats, aggregated over the activities in each period
+    (to be grouped by the period_start column)"""
+    return [
+        date_bucket(period, Activity.date).label("period_start"),
+        func.count().label("count"),
+        round_float(func.sum(Activity.distance_km), 2).label("total_distance_km"),
+        func.sum(moving_time_secs).label("total_moving_time_secs"),
+        func.sum(Activity.elevation_m).label("total_elevation_m"),
+        func.sum(Activity.perceived_effort).label("total_perceived_effort"),
+        round_float(func.avg(Activity.distance_km), 2).label("average_distance_km"),
+        round_float(func.avg(moving_time_secs), 2).label("average_moving_time_secs"),
+        round_float(func.avg(Activity.elevation_m), 2).label("average_elevation_m"),
+        round_float(func.avg(Activity.perceived_effort), 2).label(
+            "average_perceived_effort"
+        ),
+    ]
@@ -0,0 +1,226 @@
+"""Schema migrations for existing databases.
+
+create_all only creates tables which don't exist yet, so changes to existing tables
+(e.g. new indexes) are made by migrations. Each migration has a version number and
+is applied once, in order, recording its version in the schema_version table.
+Migrations must be safe to run against a database freshly created by create_all
+(which already has the latest schema).
+
+Migrations run on startup (see create_db_and_tables), or can be run by hand from
+the backend directory with `python -m database.migrations`.
+"""
+
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (
+    Connection,
+    Engine,
+    String,
+    Table,
+    func,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Field, SQLModel
+
+from database.models import Activity, User, UserWeeklySummary, utc_now
+from database.summaries import rebuild_weekly_summaries
+
+
+class SchemaVersion(SQLModel, table=True):
+    __tablename__ = "schema_version"
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+def create_indexes(conn: Connection, table: Table, index_names: List[str]):
+    """creates the named indexes (declared on the table model) if they don't exist"""
+    indexes = {index.name: index for index in table.indexes}
+    for name in index_names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+def add_activity_indexes(conn: Connection):
+    create_indexes(
+        conn,
+        Activity.__table__,
+        [
+            "ix_activity_user_id_date",
+            "ix_activity_user_id_id",
+            "ix_activity_date_id",
+            "ix_activity_time_id",
+            "ix_activity_activity_id",
+            "ix_activity_activity_type_id",
+            "ix_activity_moving_time_id",
+            "ix_activity_distance_km_id",
+            "ix_activity_perceived_effort_id",
+            "ix_activity_elevation_m_id",
+        ],
+    )
+
+
+def convert_activity_date_and_time_types(conn: Connection):
+    """converts the date, time and moving_time columns of activity_table from
+    strings to DATE, TIME and INTEGER (seconds) columns"""
+    columns = {
+        col["name"]: col["type"] for col in inspect(conn).get_columns("activity_table")
+    }
+    if not isinstance(columns["moving_time"], String):
+        return  # created with the native types
+
+    if conn.dialect.name == "sqlite":
+        # SQLite can't alter column types, so the table is recreated and the rows
+        # copied over (converted from strings by the column types when inserted)
+        rows = conn.execute(text("SELECT * FROM activity_table")).mappings().all()
+        Activity.__table__.drop(conn)
+        Activity.__table__.create(conn)
+        if rows:
+            conn.execute(Activity.__table__.insert(), [dict(row) for row in rows])
+    else:
+        conn.execute(
+            text(
+                "ALTER TABLE activity_table "
+                "ALTER COLUMN date TYPE DATE USING date::date, "
+                "ALTER COLUMN time TYPE TIME USING time::time, "
+                "ALTER COLUMN moving_time TYPE INTEGER "
+                "USING EXTRACT(EPOCH FROM moving_time::interval)::integer"
+            )
+        )
+
+
+def add_user_weekly_summary(conn: Connection):
+    """creates the user_weekly_summary table and fills it from activity_table"""
+    UserWeeklySummary.__table__.create(conn, checkfirst=True)
+    rebuild_weekly_summaries(conn)
+
+
+def add_date_updated_columns(conn: Connection):
+    """adds the date_updated column to user_table and activity_table, set to the
+    time of the migration for existing rows"""
+    for table in (User.__table__, Activity.__table__):
+        columns = {col["name"] for col in inspect(conn).get_columns(table.name)}
+        if "date_updated" not in columns:
+            col_type = table.c.date_updated.type.compile(conn.dialect)
+            conn.execute(
+                text(f"ALTER TABLE {table.name} ADD COLUMN date_updated {col_type}")
+            )
+        conn.execute(
+            update(table)
+            .where(table.c.date_updated.is_(None))
+            .values(date_updated=utc_now())
+        )
+    create_indexes(
+        conn,
+        Activity.__table__,
+        ["ix_activity_user_id_date_updated", "ix_activity_date_updated_id"],
+    )
+
+
+def make_activity_date_updated_not_null(conn: Connection):
+    """makes activity_table.date_updated NOT NULL (every activity has one, set on
+    insert or by add_date_updated_columns), so it can be paged with a cursor"""
+    columns = {col["name"]: col for col in inspect(conn).get_columns("activity_table")}
+    if not columns["date_updated"]["nullable"]:
+        return  # created with the column NOT NULL
+
+    table = Activity.__table__
+    conn.execute(
+        update(table)
+        .where(table.c.date_updated.is_(None))
+        .values(date_updated=utc_now())
+    )
+    if conn.dialect.name == "sqlite":
+        # SQLite can't alter columns, so the table is recreated and the rows copied
+        # over as they are stored
+        col_names = ", ".join(col.name for col in table.c)
+        conn.execute(
+            text("CREATE TABLE activity_table_old AS SELECT * FROM activity_table")
+        )
+        table.drop(conn)
+        table.create(conn)
+        conn.execute(
+            text(
+                f"INSERT INTO activity_table ({col_names}) "
+                f"SELECT {col_names} FROM activity_table_old"
+            )
+        )
+        conn.execute(text("DROP TABLE activity_table_old"))
+    else:
+        conn.execute(
+            text("ALTER TABLE activity_table ALTER COLUMN date_updated SET NOT NULL")
+        )
+
+
+# (version, description, upgrade function), in the order they are applied
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add activity_table indexes", add_activity_indexes),
+    (
+        2,
+        "convert activity date, time and moving_time to native types",
+        convert_activity_date_and_time_types,
+    ),
+    (3, "add user_weekly_summary", add_user_weekly_summary),
+    (4, "add date_updated to user_table and activity_table", add_date_updated_columns),
+    (
+        5,
+        "make activity_table date_updated not null",
+        make_activity_date_updated_not_null,
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: Connection) -> int:
+    """returns the latest applied migration version (0 if none have been applied)"""
+    SchemaVersion.__table__.create(conn, checkfirst=True)
+    version = conn.execute(select(func.max(SchemaVersion.version))).scalar()
+    return version or 0
+
+
+def schema_is_current(engine: Engine) -> bool:
+    """returns whether all of the migrations have been applied to the database (so
+    create_all and run_migrations have nothing to do), with a single query rather
+    than inspecting each table"""
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(select(func.max(SchemaVersion.version))).scalar()
+    except DBAPIError:
+        return False  # no schema_version table, so a new database
+    # newer versions are from a newer deployment of the app (e.g. mid rollout)
+    return (version or 0) >= LATEST_VERSION
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """applies any migrations newer than the database's schema version, each in
+    its own transaction. Returns the versions applied."""
+    with engine.begin() as conn:
+        current_version = get_schema_version(conn)
+
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(
+                SchemaVersion.__table__.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.now(timezone.utc),
+                )
+            )
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from database.database import create_db_and_tables
+
+    create_db_and_tables()
+    print(f"Database schema at version {LATEST_VERSION}")
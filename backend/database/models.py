@@ -1,8 +1,19 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Literal
 from pydantic import BaseModel, field_validator
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
+from common.validation import (
+    check_activity,
+    check_date,
+    check_duration,
+    check_email,
+    check_perceived_effort,
+    check_time,
+)
+from database.types import DateString, DurationString, TimeString
+
 SortBy = Literal[
     "id",
     "user_id",
@@ -19,6 +30,49 @@ SortBy = Literal[
 
 OrderBy = Literal["ASC", "DESC", "asc", "desc"]
 
+ExportFormat = Literal["ndjson", "csv"]
+
+StatsPeriod = Literal["week", "month", "year"]
+
+StatsGroupBy = Literal["activity", "activity_type"]
+
+# activities-to-plot as a list of objects, or an object of one list per field
+PlotFormat = Literal["rows", "columnar"]
+
+# the activities-to-plot fields that can be the y and x axes of a downsampled plot
+# (see common/downsampling.py)
+PlotMetric = Literal[
+    "id",
+    "distance_km",
+    "perceived_effort",
+    "elevation_m",
+    "pace_float_mps",
+    "speed_kmphr",
+]
+PlotAxis = Literal["date", PlotMetric]
+
+
+def utc_now() -> datetime:
+    """returns the current UTC time without a timezone (as stored in TIMESTAMP
+    columns)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# SortBy columns which get an (column, id) index, so sorted pages can be read in
+# index order (id is the tie-breaker). id is covered by the primary key and user_id
+# by the (user_id, id) index.
+INDEXED_SORT_COLUMNS = [
+    "date",
+    "time",
+    "activity",
+    "activity_type",
+    "moving_time",
+    "distance_km",
+    "perceived_effort",
+    "elevation_m",
+    "date_updated",
+]
+
 
 class UserBase(SQLModel):
     name: str
@@ -28,13 +82,17 @@ class User(UserBase, table=True):
     __tablename__ = "user_table"
     user_id: int | None = Field(default=None, primary_key=True)
     email: str
+    # set by the database on insert and update (used for ETags), not returned
+    date_updated: datetime | None = Field(
+        default=None,
+        exclude=True,
+        sa_column_kwargs={"default": utc_now, "onupdate": utc_now},
+    )
 
     @field_validator("email", mode="before")
     @classmethod
-    def date_valid(cls, value: str):
-        if "@" not in value:
-            raise ValueError("Invalid email address.")
-        return value
+    def email_valid(cls, value: str):
+        return check_email(value)
 
 
 class UserPublic(UserBase):
@@ -54,69 +112,92 @@ class UserUpdate(UserBase):
 
     @field_validator("email", mode="before")
     @classmethod
-    def date_valid(cls, value: str):
-        if "@" not in value:
-            raise ValueError("Invalid email address.")
-        return value
+    def email_valid(cls, value: str):
+        return check_email(value)
 
 
-class Activity(SQLModel, table=True):
-    __tablename__ = "activity_table"
-    id: int | None = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user_table.user_id")
-    date: str
-    time: str
-    activity: str
-    activity_type: str
-    moving_time: str
-    distance_km: float
-    perceived_effort: int
-    elevation_m: int | None = None
+class ActivityValidators(SQLModel):
+    """the validators of the activity fields, shared by Activity and ActivityUpdate
+    (see common/validation.py)"""
 
-    @field_validator("date", mode="before")
+    @field_validator("date", mode="before", check_fields=False)
     @classmethod
     def date_valid(cls, value: str):
-        try:
-            datetime.strptime(value, "%Y-%m-%d")
-            return value
-        except (ValueError, TypeError):
-            raise ValueError("Date does not match format 'YYYY-MM-DD'")
+        return check_date(value)
 
-    @field_validator("time", mode="before")
+    @field_validator("time", mode="before", check_fields=False)
     @classmethod
     def time_valid(cls, value: str):
-        try:
-            datetime.strptime(value, "%H:%M")
-            return value
-        except (ValueError, TypeError):
-            raise ValueError("Time does not match format 'HH:MM'")
+        return check_time(value)
 
-    @field_validator("moving_time", mode="before")
+    @field_validator("moving_time", mode="before", check_fields=False)
     @classmethod
     def moving_time_valid(cls, value: str):
-        try:
-            hours, minutes, seconds = map(int, value.split(":"))
-            return value
-        except (ValueError, AttributeError):
-            raise ValueError("Time does not match format 'HH:MM:SS'")
+        return check_duration(value)
 
-    @field_validator("activity", mode="before")
+    @field_validator("activity", mode="before", check_fields=False)
     @classmethod
     def activity_valid(cls, value: str):
-        valid_activities = ["run", "ride"]
-        if value not in valid_activities:
-            raise ValueError(f"Activity not in {valid_activities}")
-        return value
+        return check_activity(value)
 
-    @field_validator("perceived_effort", mode="before")
+    @field_validator("perceived_effort", mode="before", check_fields=False)
     @classmethod
     def perceived_effort_valid(cls, value: int):
-        try:
-            if value < 1 or value > 10:
-                raise ValueError("Perceived_effort not in range 1 - 10")
-            return value
-        except TypeError:
-            raise ValueError("Perceived_effort not a valid number in the range 1 - 10")
+        return check_perceived_effort(value)
+
+
+class Activity(ActivityValidators, table=True):
+    __tablename__ = "activity_table"
+    # indexes for the per user queries (filtering on user_id, range scanning date)
+    # and for sorting. New indexes also need a migration in database/migrations.py
+    # so they are added to existing databases.
+    __table_args__ = (
+        Index("ix_activity_user_id_date", "user_id", "date"),
+        Index("ix_activity_user_id_id", "user_id", "id"),
+        Index("ix_activity_user_id_date_updated", "user_id", "date_updated"),
+        *(Index(f"ix_activity_{col}_id", col, "id") for col in INDEXED_SORT_COLUMNS),
+    )
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user_table.user_id")
+    # stored as DATE, TIME and INTEGER (seconds) columns, but kept as strings in
+    # the API (see database/types.py)
+    date: str = Field(sa_type=DateString)
+    time: str = Field(sa_type=TimeString)
+    activity: str
+    activity_type: str
+    moving_time: str = Field(sa_type=DurationString)
+    distance_km: float
+    perceived_effort: int
+    elevation_m: int | None = None
+    # set by the database on insert and update (used for ETags and as a sort
+    # column), not returned
+    date_updated: datetime | None = Field(
+        default=None,
+        exclude=True,
+        nullable=False,
+        sa_column_kwargs={"default": utc_now, "onupdate": utc_now},
+    )
+
+
+class UserWeeklySummary(SQLModel, table=True):
+    # totals of each user's activities per week, kept up to date as activities are
+    # created, updated and deleted (see database/summaries.py)
+    __tablename__ = "user_weekly_summary"
+    user_id: int = Field(foreign_key="user_table.user_id", primary_key=True)
+    # Monday of the week, in the format "YYYY-MM-DD"
+    week_start: str = Field(sa_type=DateString, primary_key=True)
+    count: int
+    total_distance_km: float
+    total_moving_time_secs: int
+    total_elevation_m: int
+    total_perceived_effort: int
+
+
+# the activity_table columns returned by the API (date_updated is internal), for
+# queries selecting the columns rather than Activity objects
+ACTIVITY_PUBLIC_COLUMNS = [
+    col for col in Activity.__table__.c if col.name != "date_updated"
+]
 
 
 class ActivityCreate(SQLModel):
@@ -132,7 +213,7 @@ class ActivityCreate(SQLModel):
     elevation_m: int | None = None
 
 
-class ActivityUpdate(SQLModel):  # optional updates to a specific activity id
+class ActivityUpdate(ActivityValidators):  # optional updates to an activity id
     user_id: int | None = None
     date: str | None = None
     time: str | None = None
@@ -143,53 +224,8 @@ class ActivityUpdate(SQLModel):  # optional updates to a specific activity id
     perceived_effort: int | None = None
     elevation_m: int | None = None
 
-    @field_validator("date", mode="before")
-    @classmethod
-    def date_valid(cls, value: str):
-        try:
-            datetime.strptime(value, "%Y-%m-%d")
-            return value
-        except (ValueError, TypeError):
-            raise ValueError("Date does not match format 'YYYY-MM-DD'")
-
-    @field_validator("time", mode="before")
-    @classmethod
-    def time_valid(cls, value: str):
-        try:
-            datetime.strptime(value, "%H:%M")
-            return value
-        except (ValueError, TypeError):
-            raise ValueError("Time does not match format 'HH:MM'")
-
-    @field_validator("moving_time", mode="before")
-    @classmethod
-    def moving_time_valid(cls, value: str):
-        try:
-            hours, minutes, seconds = map(int, value.split(":"))
-            return value
-        except (ValueError, AttributeError):
-            raise ValueError("Time does not match format 'HH:MM:SS'")
-
-    @field_validator("activity", mode="before")
-    @classmethod
-    def activity_valid(cls, value: str):
-        valid_activities = ["run", "ride"]
-        if value not in valid_activities:
-            raise ValueError(f"Activity not in {valid_activities}")
-        return value
-
-    @field_validator("perceived_effort", mode="before")
-    @classmethod
-    def perceived_effort_valid(cls, value: int):
-        try:
-            if value < 1 or value > 10:
-                raise ValueError("Perceived_effort not in range 1 - 10")
-            return value
-        except TypeError:
-            raise ValueError("Perceived_effort not a valid number in the range 1 - 10")
-
 
-#unsure if this is needed, but added for consistency (response_model for endpoint)
+# unsure if this is needed, but added for consistency (response_model for endpoint)
 class ActivityPlot(BaseModel):
     id: int
     user_id: int
@@ -200,8 +236,37 @@ class ActivityPlot(BaseModel):
     moving_time: str
     distance_km: float
     perceived_effort: int
-    elevation_m: int
-    pace_str_mps: str
-    pace_float_mps: float
-    speed_kmphr: float
-    formatted_date: str
\ No newline at end of file
+    elevation_m: int | None
+    # pace null if the distance is 0, speed null if the moving time is 0
+    pace_str_mps: str | None
+    pace_float_mps: float | None
+    speed_kmphr: float | None
+    formatted_date: str
+
+
+class ActivityBulkError(BaseModel):
+    index: int  # position of the activity in the request body
+    detail: str
+
+
+class ActivityBulkResult(BaseModel):
+    created: int
+    ids: list[int]  # ids of the created activities, in request order
+    errors: list[ActivityBulkError]
+
+
+class ActivityStats(BaseModel):
+    # start of the week (Monday), month or year, in the format "YYYY-MM-DD"
+    period_start: str
+    # only included if the stats are grouped by activity / activity_type
+    activity: str | None = None
+    activity_type: str | None = None
+    count: int
+    total_distance_km: float
+    total_moving_time_secs: int
+    total_elevation_m: int | None
+    total_perceived_effort: int
+    average_distance_km: float
+    average_moving_time_secs: float
+    average_elevation_m: float | None
+    average_perceived_effort: float
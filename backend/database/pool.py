@@ -0,0 +1,125 @@
+"""Connection pool settings and metrics for the database engines.
+
+The pool is configured from the environment (like DB_URL):
+
+    DB_POOL_SIZE        connections kept open in the pool (default 5)
+    DB_MAX_OVERFLOW     extra connections opened under load (default 10)
+    DB_POOL_TIMEOUT     seconds to wait for a connection before erroring (default 30)
+    DB_POOL_PRE_PING    test connections when checked out, so connections dropped
+                        by a database restart are replaced (default true)
+    DB_POOL_RECYCLE     seconds after which connections are replaced (default 1800,
+                        -1 to never replace them)
+
+The size, overflow and timeout only apply to Postgres (SQLite uses a single
+connection or one per thread).
+"""
+
+import os
+import time
+from typing import Any, Dict, Type
+
+from sqlalchemy import Engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import Pool, QueuePool
+
+
+def get_env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_pool_options(url: str) -> Dict[str, Any]:
+    """returns the create_engine pool arguments for the database url, read from
+    the environment"""
+    options = {
+        "pool_pre_ping": get_env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    }
+    if make_url(url).get_backend_name() != "sqlite":
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE", 5))
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+        options["pool_timeout"] = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    return options
+
+
+class PoolMetrics:
+    """counts of, and time spent waiting for, connection checkouts from a pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_secs_total = 0.0
+        self.checkout_secs_max = 0.0
+        # checkouts made when all of the pool's connections were in use, so an
+        # overflow connection was used
+        self.overflow_checkouts = 0
+        # checkouts which waited longer than the pool timeout
+        self.checkout_timeouts = 0
+        self.peak_in_use = 0
+
+    def record_checkout(self, secs: float, in_use: int, pool_size: int):
+        self.checkouts += 1
+        self.checkout_secs_total += secs
+        self.checkout_secs_max = max(self.checkout_secs_max, secs)
+        self.peak_in_use = max(self.peak_in_use, in_use)
+        if in_use > pool_size:
+            self.overflow_checkouts += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "checkout_secs_total": self.checkout_secs_total,
+            "checkout_secs_max": self.checkout_secs_max,
+            "overflow_checkouts": self.overflow_checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "peak_in_use": self.peak_in_use,
+        }
+
+
+def timed_pool_class(pool_class: Type[QueuePool], metrics: PoolMetrics):
+    """returns a subclass of the (queue) pool class which records the time taken
+    to check out each connection (waiting for a free connection, connecting and
+    pre-pinging) in metrics"""
+
+    class TimedPool(pool_class):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except exc.TimeoutError:
+                metrics.checkout_timeouts += 1
+                raise
+            metrics.record_checkout(
+                time.perf_counter() - start, self.checkedout(), self.size()
+            )
+            return connection
+
+    return TimedPool
+
+
+def get_pool_class(url: str, metrics: PoolMetrics) -> Type[Pool] | None:
+    """returns the timed pool class to use for the database url (or None for the
+    default pool, if the url's default isn't a queue pool, e.g. in-memory SQLite)"""
+    db_url = make_url(url)
+    default_pool_class = db_url.get_dialect().get_pool_class(db_url)
+    if not issubclass(default_pool_class, QueuePool):
+        return None
+    return timed_pool_class(default_pool_class, metrics)
+
+
+def get_pool_stats(engine: Engine, metrics: PoolMetrics) -> Dict[str, Any]:
+    """returns the current state of the engine's pool (for queue pools) with its
+    checkout metrics"""
+    pool = engine.pool
+    stats = {}
+    if isinstance(pool, QueuePool):
+        stats = {
+            "pool_size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # connections open beyond pool_size
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        }
+    return {**stats, **metrics.as_dict()}
@@ -0,0 +1,187 @@
+"""Opt-in query profiling, for catching slow queries and N+1 query patterns (e.g. a
+route which makes one query per row) during development.
+
+Enabled with DB_PROFILE=true, which installs engine events on the routes' engine
+and a middleware (see main.py):
+
+    DB_SLOW_QUERY_MS            statements taking at least this long are logged
+                                with their parameters and EXPLAIN plan (default 100)
+    DB_N_PLUS_ONE_THRESHOLD     requests executing the same statement more than
+                                this many times are logged (default 10)
+
+count_queries records the statements an engine executes in a block, and is used
+by the query_budget test fixture (see tests/conftest.py).
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import Connection, Engine, event
+
+from database.pool import get_env_bool
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = get_env_bool("DB_PROFILE", False)
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 100))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", 10))
+
+
+class QueryLog:
+    """the statements executed in a block (e.g. while handling a request)"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def add(self, statement: str):
+        # statements differing only in whitespace are the same statement
+        self.statements.append(re.sub(r"\s+", " ", statement).strip())
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """returns the (statement, count) of statements executed more than
+        threshold times, most executed first"""
+        counts = Counter(self.statements).most_common()
+        return [(statement, count) for statement, count in counts if count > threshold]
+
+    def summary(self) -> str:
+        """returns each statement with the number of times it was executed"""
+        return "\n".join(
+            f"{count} x {statement}"
+            for statement, count in Counter(self.statements).most_common()
+        )
+
+
+# the query log of the request being handled (None if it isn't being profiled)
+current_query_log: ContextVar[QueryLog | None] = ContextVar(
+    "current_query_log", default=None
+)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryLog]:
+    """records the statements executed in the block by profiled engines (see
+    enable_profiling), in the current context"""
+    log = QueryLog()
+    token = current_query_log.set(log)
+    try:
+        yield log
+    finally:
+        current_query_log.reset(token)
+
+
+@contextmanager
+def count_queries(engine: Engine) -> Iterator[QueryLog]:
+    """records every statement the engine executes in the block (from any
+    context or thread)"""
+    log = QueryLog()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        log.add(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield log
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+# statements which can be explained (others, e.g. SAVEPOINT or PRAGMA, can't be)
+EXPLAINABLE_STATEMENT = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+def explain(conn: Connection, statement: str, parameters) -> str:
+    """returns the database's plan for the statement, executed on a separate cursor
+    of the same connection (so it doesn't trigger the engine events).
+
+    The EXPLAIN runs in a savepoint, rolled back if it fails, so a failed EXPLAIN
+    doesn't abort the transaction the statement is part of (on Postgres)."""
+    if not EXPLAINABLE_STATEMENT.match(statement):
+        return "(not explained, not a SELECT, INSERT, UPDATE or DELETE)"
+    if conn.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT explain_plan")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_plan")
+            raise
+        finally:
+            cursor.execute("RELEASE SAVEPOINT explain_plan")
+    finally:
+        cursor.close()
+    # SQLite's plan detail is the last column, Postgres returns one column
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def enable_profiling(engine: Engine, slow_query_ms: float = SLOW_QUERY_MS):
+    """logs the engine's statements that take at least slow_query_ms, and records
+    its statements in the current query log (see track_queries)"""
+    slow_query_secs = slow_query_ms / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        starts = conn.info.setdefault("profiling_query_start", [])
+        starts.append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        secs = time.perf_counter() - conn.info["profiling_query_start"].pop()
+        log = current_query_log.get()
+        if log is not None:
+            log.add(statement)
+        if secs < slow_query_secs:
+            return
+        if many:
+            plan = "(not explained, executemany)"
+        else:
+            try:
+                plan = explain(conn, statement, parameters)
+            except Exception as e:
+                plan = f"(EXPLAIN failed: {e})"
+        logger.warning(
+            "Slow query (%.1f ms): %s\nParameters: %r\nPlan:\n%s",
+            secs * 1000,
+            statement,
+            parameters,
+            plan,
+        )
+
+
+class ProfilingMiddleware:
+    """ASGI middleware logging requests which execute the same statement more than
+    n_plus_one_threshold times (a likely N+1 query pattern)"""
+
+    def __init__(self, app, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as log:
+            await self.app(scope, receive, send)
+
+        for statement, count in log.repeated(self.n_plus_one_threshold):
+            logger.warning(
+                "Possible N+1 query: %s %s executed a statement %d times: %s",
+                scope["method"],
+                scope["path"],
+                count,
+                statement,
+            )
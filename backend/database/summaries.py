@@ -0,0 +1,170 @@
+"""The user_weekly_summary rollup table, which holds the totals of each user's
+activities per week so they don't need to be recomputed from activity_table.
+
+The rollups are updated in the same transaction as the activity changes (see
+routes/activities.py): an activity's contribution is subtracted from its week
+before it is updated or deleted, and added to its (new) week after it is created
+or updated. Contributions are added with INSERT ... ON CONFLICT DO UPDATE, so
+concurrent changes to the same week don't overwrite each other.
+
+The rollups can be rebuilt from activity_table, or checked against a full
+recompute, from the backend directory with:
+
+    python -m database.summaries rebuild [--user-id 1]
+    python -m database.summaries check [--user-id 1]
+"""
+
+import argparse
+import math
+import sys
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Connection, delete, func, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement, Select
+
+from database.expressions import date_bucket, moving_time_secs
+from database.models import Activity, UserWeeklySummary
+
+SUMMARY_TOTALS = [
+    "count",
+    "total_distance_km",
+    "total_moving_time_secs",
+    "total_elevation_m",
+    "total_perceived_effort",
+]
+
+
+def weekly_contributions(where: ColumnElement, sign: int = 1) -> Select:
+    """selects the totals of the activities matching where, per user and week, in
+    the order of the user_weekly_summary columns (negated if sign is -1)"""
+    week_start = date_bucket("week", Activity.date)
+    return (
+        select(
+            Activity.user_id,
+            week_start,
+            sign * func.count(),
+            sign * func.sum(Activity.distance_km),
+            sign * func.sum(moving_time_secs),
+            sign * func.coalesce(func.sum(Activity.elevation_m), 0),
+            sign * func.sum(Activity.perceived_effort),
+        )
+        .where(where)
+        .group_by(Activity.user_id, week_start)
+    )
+
+
+def add_contributions(dialect_name: str, contributions: Select):
+    """returns an upsert adding the contributions to the user_weekly_summary rows"""
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    table = UserWeeklySummary.__table__
+    query = insert(table).from_select(
+        ["user_id", "week_start", *SUMMARY_TOTALS], contributions
+    )
+    return query.on_conflict_do_update(
+        index_elements=["user_id", "week_start"],
+        set_={col: table.c[col] + query.excluded[col] for col in SUMMARY_TOTALS},
+    )
+
+
+async def update_weekly_summaries(
+    session: AsyncSession, where: ColumnElement, sign: int = 1
+):
+    """adds the activities matching where to their user's weekly summaries, or
+    removes them if sign is -1 (deleting any weeks left without activities).
+    Should be called before the session is committed, so the summaries are updated
+    in the same transaction as the activities."""
+    dialect_name = session.get_bind().dialect.name
+    await session.execute(
+        add_contributions(dialect_name, weekly_contributions(where, sign))
+    )
+    if sign < 0:
+        await session.execute(
+            delete(UserWeeklySummary).where(
+                UserWeeklySummary.count <= 0,
+                UserWeeklySummary.user_id.in_(select(Activity.user_id).where(where)),
+            )
+        )
+
+
+def rebuild_weekly_summaries(conn: Connection, user_id: int | None = None):
+    """recomputes the weekly summaries (of all users, or of user_id) from
+    activity_table"""
+    user_filter = true() if user_id is None else Activity.user_id == user_id
+    query = delete(UserWeeklySummary)
+    if user_id is not None:
+        query = query.where(UserWeeklySummary.user_id == user_id)
+    conn.execute(query)
+    query = UserWeeklySummary.__table__.insert().from_select(
+        ["user_id", "week_start", *SUMMARY_TOTALS], weekly_contributions(user_filter)
+    )
+    conn.execute(query)
+
+
+def check_weekly_summaries(
+    conn: Connection, user_id: int | None = None
+) -> List[Tuple[int, str, Dict | None, Dict | None]]:
+    """compares the weekly summaries (of all users, or of user_id) with a full
+    recompute from activity_table. Returns the (user_id, week_start, stored,
+    expected) of each week that doesn't match, with stored or expected None if the
+    week is missing."""
+    user_filter = true() if user_id is None else Activity.user_id == user_id
+    expected = {
+        (row[0], row[1]): dict(zip(SUMMARY_TOTALS, row[2:]))
+        for row in conn.execute(weekly_contributions(user_filter))
+    }
+    query = select(UserWeeklySummary.__table__)
+    if user_id is not None:
+        query = query.where(UserWeeklySummary.user_id == user_id)
+    stored = {
+        (row["user_id"], row["week_start"]): {col: row[col] for col in SUMMARY_TOTALS}
+        for row in conn.execute(query).mappings()
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        stored_totals, expected_totals = stored.get(key), expected.get(key)
+        if not totals_match(stored_totals, expected_totals):
+            mismatches.append((*key, stored_totals, expected_totals))
+    return mismatches
+
+
+def totals_match(stored: Dict | None, expected: Dict | None) -> bool:
+    if stored is None or expected is None:
+        return stored is expected
+    # the distance is a float, so may differ slightly once added and subtracted
+    return all(
+        (
+            math.isclose(stored[col], expected[col], abs_tol=1e-6)
+            if col == "total_distance_km"
+            else stored[col] == expected[col]
+        )
+        for col in SUMMARY_TOTALS
+    )
+
+
+def main():
+    from database.database import engine
+
+    parser = argparse.ArgumentParser(description="Manage the weekly summary rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user-id", type=int)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.command == "rebuild":
+            rebuild_weekly_summaries(conn, args.user_id)
+            print("Weekly summaries rebuilt")
+            return
+        mismatches = check_weekly_summaries(conn, args.user_id)
+
+    for user_id, week_start, stored, expected in mismatches:
+        print(f"user_id {user_id}, week {week_start}: {stored} != {expected}")
+    if mismatches:
+        sys.exit(f"{len(mismatches)} weekly summaries don't match activity_table")
+    print("Weekly summaries match activity_table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Column types storing activity dates and times as native database types, while
+keeping the string formats used by the API (and the rest of the code) in Python.
+
+Values are converted when bound to a query and when read from a result, so
+comparisons such as `Activity.date > "2025-01-01"` are typed comparisons in SQL.
+RoundedFloat only converts results, for rounding computed metrics (see
+database/expressions.py)."""
+
+from datetime import date, datetime, time
+
+from sqlalchemy import Date, Float, Integer, Time
+from sqlalchemy.types import TypeDecorator
+
+from common.utils import calculate_time_secs, format_time_secs, parse_date
+
+
+class DateString(TypeDecorator):
+    """DATE column, with values as "YYYY-MM-DD" strings in Python"""
+
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value: str | date | None, dialect) -> date | None:
+        if value is None or isinstance(value, date):
+            return value
+        return parse_date(value)
+
+    def process_result_value(self, value: date | None, dialect) -> str | None:
+        if value is None:
+            return None
+        return value.isoformat()
+
+
+class TimeString(TypeDecorator):
+    """TIME column, with values as "HH:MM" strings in Python"""
+
+    impl = Time
+    cache_ok = True
+
+    def process_bind_param(self, value: str | time | None, dialect) -> time | None:
+        if value is None or isinstance(value, time):
+            return value
+        return datetime.strptime(value, "%H:%M").time()
+
+    def process_result_value(self, value: time | None, dialect) -> str | None:
+        if value is None:
+            return None
+        return value.strftime("%H:%M")
+
+
+class DurationString(TypeDecorator):
+    """INTEGER column of a duration in seconds, with values as "HH:MM:SS" strings
+    in Python. Use type_coerce(column, Integer) to do arithmetic on the seconds
+    in SQL."""
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value: str | int | None, dialect) -> int | None:
+        if value is None or isinstance(value, int):
+            return value
+        return calculate_time_secs(value)
+
+    def process_result_value(self, value: int | None, dialect) -> str | None:
+        if value is None:
+            return None
+        return format_time_secs(value)
+
+
+class RoundedFloat(TypeDecorator):
+    """FLOAT result rounded to a number of decimal places in Python, with round().
+
+    The databases' ROUND rounds the decimal value, with halves away from zero,
+    whereas round() rounds the binary float (so e.g. 0.125 rounds to 0.12, and
+    2.675, stored as 2.67499..., to 2.67). Rounding when the result is read keeps
+    metrics computed in SQL the same as the functions in common/utils.py."""
+
+    impl = Float
+    cache_ok = True
+
+    def __init__(self, places: int = 2):
+        super().__init__()
+        self.places = places
+
+    def process_result_value(self, value: float | None, dialect) -> float | None:
+        if value is None:
+            return None
+        return round(float(value), self.places)
@@ -1,11 +1,19 @@
 from contextlib import asynccontextmanager
-import uvicorn
 from fastapi import FastAPI
 from fastapi.requests import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.exc import IntegrityError
 
-from database.database import create_db_and_tables
+from common.cache import activities_to_plot_cache
+from common.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from common.metrics import MetricsMiddleware, instrument_engine, metrics
+from database.database import (
+    async_engine,
+    dispose_engines,
+    get_async_pool_stats,
+    setup_schema,
+)
+from database.profiling import PROFILING_ENABLED, ProfilingMiddleware, enable_profiling
 from routes import activities, users
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -13,9 +21,12 @@ from fastapi.middleware.cors import CORSMiddleware
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """creates database and tables on startup (before the app
-    starts handling requests)"""
-    create_db_and_tables()
+    starts handling requests), if the schema isn't already up to date (see
+    DB_SCHEMA_ON_STARTUP in database/database.py). On shutdown (after in-flight
+    requests have finished), closes the database connections"""
+    setup_schema()
     yield
+    await dispose_engines()
 
 
 # create FastAPI app instance, using above func to handle startup events
@@ -27,8 +38,8 @@ app.include_router(activities.router, prefix="/activities")
 app.include_router(users.router, prefix="/users")
 
 
-# add middleware to allow backend to accept requests from the 
-# frontend, which runs on a different domain. Middleware runs before / 
+# add middleware to allow backend to accept requests from the
+# frontend, which runs on a different domain. Middleware runs before /
 # after each request
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +47,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # so the frontend can read the cursor and ETags
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+# opt-in slow query and N+1 query logging (see database/profiling.py)
+if PROFILING_ENABLED:
+    enable_profiling(async_engine.sync_engine)
+    app.add_middleware(ProfilingMiddleware)
+
+# negotiated brotli / gzip compression (see common/compression.py). Inside the
+# metrics middleware, so the response sizes recorded are the compressed sizes
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# added last so it's the outermost middleware, timing the whole request
+app.add_middleware(MetricsMiddleware)
+instrument_engine(async_engine.sync_engine)
+metrics.register_gauges(
+    "db_pool", "Database connection pool stats.", get_async_pool_stats
+)
+metrics.register_gauges(
+    "activities_to_plot_cache",
+    "Activities to plot cache stats.",
+    activities_to_plot_cache.stats,
 )
 
 
@@ -56,5 +91,25 @@ async def get_api_healthcheck():
     return {"message": "API up and running"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Endpoint to get the request latency, response size and database query
+    metrics in the Prometheus text format (see common/metrics.py)"""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/metrics/pool")
+async def get_pool_metrics():
+    """Endpoint to get the database connection pool's size, connections in use,
+    overflow and checkout latency, for sizing the pool (see database/pool.py)"""
+    return get_async_pool_stats()
+
+
 if __name__ == "__main__":
+    # imported here as it's only needed to run the development server (and is
+    # slow to import)
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8080)
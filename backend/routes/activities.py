@@ -1,20 +1,43 @@
-from fastapi import APIRouter, HTTPException
-from sqlalchemy import select, column
+from typing import Annotated, Any
 
-from database.database import SessionDep
-from database.models import Activity, ActivityCreate, ActivityUpdate, OrderBy, SortBy
+from fastapi import APIRouter, Body, Header, HTTPException, Response
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from common.cache import activities_to_plot_cache
+from common.etags import etag_matches, make_etag, not_modified
+from common.pagination import get_next_cursor, paginate_activities
+from common.responses import FAST_JSON_RESPONSES, JSONRowsResponse
+from database.database import AsyncSessionDep
+from database.models import (
+    ACTIVITY_PUBLIC_COLUMNS,
+    Activity,
+    ActivityBulkError,
+    ActivityBulkResult,
+    ActivityCreate,
+    ActivityUpdate,
+    OrderBy,
+    SortBy,
+    User,
+)
+from database.summaries import update_weekly_summaries
 
 
 router = APIRouter()
 
+# maximum number of activities accepted by the bulk endpoint in one request
+MAX_BULK_ACTIVITIES = 10_000
+
 
 @router.get("/", response_model=list[Activity])
 async def get_activities(
-    session: SessionDep,
+    session: AsyncSessionDep,
+    response: Response,
     offset: int = 0,
     limit: int = 100,
     sort_by: SortBy = "id",
     order_by: OrderBy = "asc",
+    cursor: str | None = None,
 ):
     """Endpoint to get a paginated list of activities.
 
@@ -22,32 +45,65 @@ async def get_activities(
     :param limit: number of activities to return
     :param sort_by: column to sort the activities by
     :param order_by: how to order the activities (ascending or descending)
-    """
-    sort_by_col = column(sort_by)
-    query = select(Activity).offset(offset).limit(limit)
+    :param cursor: the X-Next-Cursor header of the previous page. If given, the page
+        starts after the previous page (and offset is ignored)
 
-    if order_by.lower() == "asc":
-        query = query.order_by(sort_by_col.asc())
+    If the page is full, the X-Next-Cursor response header contains the cursor for
+    the next page (except when sorting by elevation_m, which can be null, so is
+    paged by offset). If the cursor is invalid, an exception with 400 status code
+    is raised.
+    """
+    # with FAST_JSON_RESPONSES, the rows are selected as tuples and encoded straight
+    # to JSON (see common/responses.py). date_updated is selected last for the
+    # cursor, and left out of the response by only encoding the public columns.
+    if FAST_JSON_RESPONSES:
+        query = select(*ACTIVITY_PUBLIC_COLUMNS, Activity.date_updated)
     else:
-        query = query.order_by(sort_by_col.desc())
+        query = select(Activity)
+    try:
+        query = paginate_activities(query, sort_by, order_by, offset, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    activities = session.exec(query).scalars().all()
+    result = await session.execute(query)
+    activities = result.all() if FAST_JSON_RESPONSES else result.scalars().all()
 
+    next_cursor = get_next_cursor(activities, sort_by, order_by, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    if FAST_JSON_RESPONSES:
+        col_names = [col.name for col in ACTIVITY_PUBLIC_COLUMNS]
+        return JSONRowsResponse(
+            activities, col_names, fast=True, headers=response.headers
+        )
     return activities
 
 
 @router.get("/{id}", response_model=Activity)
-async def get_activity_by_activity_id(id: int, session: SessionDep):
+async def get_activity_by_activity_id(
+    id: int,
+    session: AsyncSessionDep,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+):
     """Endpoint that gets a specific activity by id. If the ID does not exist,
-    an exception with 404 status code is raised."""
-    activity = session.get(Activity, id)
+    an exception with 404 status code is raised.
+
+    The response has an ETag header. If it matches the If-None-Match request header,
+    a 304 response is returned (without a body)."""
+    activity = await session.get(Activity, id)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
+    etag = make_etag("activity", activity.id, activity.date_updated)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return activity
 
 
 @router.post("/", response_model=Activity, status_code=201)
-async def create_activity(activity: ActivityCreate, session: SessionDep):
+async def create_activity(activity: ActivityCreate, session: AsyncSessionDep):
     """Endpoint that allows a user to create an activity, with the request body
     validated against the Activity model. The activity request body
     should be in the format:
@@ -68,8 +124,13 @@ async def create_activity(activity: ActivityCreate, session: SessionDep):
     try:
         db_activity = Activity.model_validate(activity)
         session.add(db_activity)
-        session.commit()
-        session.refresh(db_activity)
+        await session.flush()
+        await update_weekly_summaries(session, Activity.id == db_activity.id)
+        await session.commit()
+        # after committing, so a read can't cache the activities from before
+        # the change (see common/cache.py)
+        activities_to_plot_cache.invalidate(db_activity.user_id)
+        await session.refresh(db_activity)
         return db_activity
     except ValueError as e:
         error_messages = [f"{err['loc'][0]} - {err['msg']}" for err in e.errors()]
@@ -79,8 +140,92 @@ async def create_activity(activity: ActivityCreate, session: SessionDep):
         )
 
 
+# the bulk endpoint accepts any items (so each can be validated separately), but
+# documents them as ActivityCreate
+BULK_REQUEST_BODY_SCHEMA = {
+    "content": {
+        "application/json": {
+            "schema": {"items": {"$ref": "#/components/schemas/ActivityCreate"}}
+        }
+    }
+}
+
+
+@router.post(
+    "/bulk",
+    response_model=ActivityBulkResult,
+    status_code=201,
+    openapi_extra={"requestBody": BULK_REQUEST_BODY_SCHEMA},
+)
+async def create_activities_bulk(
+    activities: Annotated[
+        list[Any], Body(min_length=1, max_length=MAX_BULK_ACTIVITIES)
+    ],
+    session: AsyncSessionDep,
+):
+    """Endpoint that allows a list of activities (up to 10,000) to be created in a
+    single request and transaction, e.g. when importing activities from a watch.
+    Each activity is in the same format as for creating a single activity.
+
+    Each activity is validated separately: invalid activities (or activities with
+    a user_id that doesn't exist) are not created, and are returned in errors with
+    their index in the request body. The valid activities are inserted with
+    multi-row INSERTs, and their ids returned in request order.
+    """
+    valid_activities = []
+    valid_indexes = []
+    errors = []
+    for index, activity in enumerate(activities):
+        if not isinstance(activity, dict):
+            errors.append(
+                ActivityBulkError(index=index, detail="Activity must be an object")
+            )
+            continue
+        try:
+            db_activity = Activity.model_validate(activity)
+        except ValidationError as e:
+            error_messages = [f"{err['loc'][0]} - {err['msg']}" for err in e.errors()]
+            errors.append(
+                ActivityBulkError(
+                    index=index,
+                    detail=f"Format of data incorrect: {", ".join(error_messages)}",
+                )
+            )
+            continue
+        valid_activities.append(db_activity.model_dump(exclude={"id"}))
+        valid_indexes.append(index)
+
+    # check the user_ids exist up front, as a foreign key violation would
+    # abort the whole transaction
+    user_ids = {activity["user_id"] for activity in valid_activities}
+    query = select(User.user_id).where(User.user_id.in_(user_ids))
+    existing_user_ids = set((await session.execute(query)).scalars().all())
+
+    rows = []
+    for index, activity in zip(valid_indexes, valid_activities):
+        if activity["user_id"] in existing_user_ids:
+            rows.append(activity)
+        else:
+            errors.append(
+                ActivityBulkError(index=index, detail="user_id - User not found")
+            )
+
+    ids = []
+    if rows:
+        insert_query = insert(Activity).returning(
+            Activity.id, sort_by_parameter_order=True
+        )
+        ids = (await session.execute(insert_query, rows)).scalars().all()
+        await update_weekly_summaries(session, Activity.id.in_(ids))
+        await session.commit()
+        activities_to_plot_cache.invalidate(*{row["user_id"] for row in rows})
+
+    errors.sort(key=lambda error: error.index)
+    return ActivityBulkResult(created=len(ids), ids=ids, errors=errors)
+
+
 @router.patch("/{id}", response_model=Activity)
-async def update_activity(id: int, activity: ActivityUpdate, session: SessionDep):
+async def update_activity(id: int, activity: ActivityUpdate, session: AsyncSessionDep):
     """Endpoint that allows an activity of specified id to be modified. All
     activity properties to be modified are optional, and if no updates occur, the
     original values remain.
@@ -90,26 +235,35 @@ async def update_activity(id: int, activity: ActivityUpdate, session: SessionDep
     If any of the fields are in the incorrect format, an exception with
     422 status code is raised.
     """
-    activity_db = session.get(Activity, id)
+    activity_db = await session.get(Activity, id)
     if not activity_db:
         raise HTTPException(status_code=404, detail="Activity not found")
     activity_data = activity.model_dump(exclude_unset=True)
+    old_user_id = activity_db.user_id
+    # the activity may move to a different week (or user), so its old values are
+    # removed from the weekly summaries and its new values added
+    await update_weekly_summaries(session, Activity.id == id, sign=-1)
     # don't need to validate against Activity because model_dump is validating against
     # ActivityUpdate (optional fields required which Activity doesn't have)
     activity_db.sqlmodel_update(activity_data)
     session.add(activity_db)
-    session.commit()
-    session.refresh(activity_db)
+    await session.flush()
+    await update_weekly_summaries(session, Activity.id == id)
+    await session.commit()
+    activities_to_plot_cache.invalidate(*{old_user_id, activity_db.user_id})
+    await session.refresh(activity_db)
     return activity_db
 
 
 @router.delete("/{id}")
-async def delete_activity(id: int, session: SessionDep):
+async def delete_activity(id: int, session: AsyncSessionDep):
     """Endpoint that deletes an activity, according to the given id.
     If the ID does not exist, an exception with 404 status code is raised."""
-    activity = session.get(Activity, id)
+    activity = await session.get(Activity, id)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
-    session.delete(activity)
-    session.commit()
+    await update_weekly_summaries(session, Activity.id == id, sign=-1)
+    await session.delete(activity)
+    await session.commit()
+    activities_to_plot_cache.invalidate(activity.user_id)
     return {"message": f"Activity id {id} deleted"}
@@ -1,26 +1,103 @@
+import csv
+import io
+import json
+from datetime import date
+from typing import AsyncIterator, List, Tuple
+
 from fastapi import APIRouter
-from fastapi import HTTPException
-from sqlalchemy import select, column
+from fastapi import Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from common.utils import format_query_output, update_activities_dict
-from database.database import SessionDep
+from common.pagination import get_next_cursor, paginate_activities
+from common.cache import activities_to_plot_cache
+from common.downsampling import downsample_rows
+from common.etags import etag_matches, make_etag, not_modified
+from common.responses import (
+    FAST_JSON_RESPONSES,
+    JSONRowsResponse,
+    encode_json_columns,
+    encode_json_rows,
+)
+from common.utils import parse_date
+from database.database import AsyncSessionDep, AsyncSessionMakerDep
+from database.expressions import ACTIVITY_PLOT_COLUMNS, activity_stats_columns
 from database.models import (
+    ACTIVITY_PUBLIC_COLUMNS,
     Activity,
     ActivityPlot,
+    ActivityStats,
     User,
     UserCreate,
     UserPublic,
     UserUpdate,
+    UserWeeklySummary,
+    ExportFormat,
     OrderBy,
+    PlotAxis,
+    PlotFormat,
+    PlotMetric,
     SortBy,
+    StatsGroupBy,
+    StatsPeriod,
 )
 
 
 router = APIRouter()
 
+# number of rows fetched from the database cursor (and sent as one chunk of the
+# response) at a time when exporting activities
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def parse_date_range(start_date: str, end_date: str) -> Tuple[date, date]:
+    """parses the start_date and end_date query parameters, raising an exception
+    with 422 status code if either is in the wrong format"""
+    try:
+        return parse_date(start_date), parse_date(end_date)
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail="Dates do not match format 'YYYY-MM-DD' or 'YYYY/MM/DD'",
+        )
+
+
+def parse_plot_fields(fields: str | None) -> List[str]:
+    """parses the fields query parameter of activities-to-plot (comma separated
+    ActivityPlot fields, e.g. "distance_km,pace_float_mps"), returning all the
+    fields if not given. Raises an exception with 422 status code if any aren't
+    ActivityPlot fields."""
+    if fields is None:
+        return list(ACTIVITY_PLOT_COLUMNS)
+    # in the order given, without duplicates
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",")))
+    if not all(name in ACTIVITY_PLOT_COLUMNS for name in names):
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                "Fields must be a comma separated list of: "
+                f"{", ".join(ACTIVITY_PLOT_COLUMNS)}"
+            ),
+        )
+    return names
+
+
+async def get_user_activities_etag(session: AsyncSession, user_id: int, *params) -> str:
+    """returns the ETag of a view of the user's activities (e.g. the endpoint name
+    and query params), from the number of activities and the latest date_updated.
+    Must be called before the activities are queried (see common/etags.py)."""
+    query = select(func.count(), func.max(Activity.date_updated)).where(
+        Activity.user_id == user_id
+    )
+    count, last_updated = (await session.execute(query)).one()
+    return make_etag(user_id, count, last_updated, *params)
+
 
 @router.post("/", response_model=User, status_code=201)
-async def create_user(user: UserCreate, session: SessionDep):
+async def create_user(user: UserCreate, session: AsyncSessionDep):
     """Endpoint that allows a user to create a user. The user request body
     should be in the format:
 
@@ -33,8 +110,9 @@ async def create_user(user: UserCreate, session: SessionDep):
     try:
         db_user = User.model_validate(user)
         session.add(db_user)
-        session.commit()
-        session.refresh(db_user)
+        await session.commit()
+        await session.refresh(db_user)
+        activities_to_plot_cache.invalidate(db_user.user_id)
         return db_user
     except ValueError as e:
         error_messages = [f"{err['loc'][0]} - {err['msg']}" for err in e.errors()]
@@ -45,24 +123,37 @@ async def create_user(user: UserCreate, session: SessionDep):
 
 
 @router.get("/", response_model=list[UserPublic])
-async def get_users(session: SessionDep, offset: int = 0, limit: int = 10):
+async def get_users(session: AsyncSessionDep, offset: int = 0, limit: int = 10):
     """Endpoint to get a paginated list of users."""
-    users = session.exec(select(User).offset(offset).limit(limit)).scalars().all()
+    query = select(User).offset(offset).limit(limit)
+    users = (await session.execute(query)).scalars().all()
     return users
 
 
 @router.get("/{user_id}", response_model=UserPublic)
-async def get_user_by_user_id(user_id: int, session: SessionDep):
+async def get_user_by_user_id(
+    user_id: int,
+    session: AsyncSessionDep,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+):
     """Endpoint to get a specific user by user_id. Response does
-    not include email address."""
-    user = session.get(User, user_id)
+    not include email address.
+
+    The response has an ETag header. If it matches the If-None-Match request header,
+    a 304 response is returned (without a body)."""
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    etag = make_etag("user", user.user_id, user.date_updated)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return user
 
 
 @router.patch("/{user_id}", response_model=UserPublic)
-async def update_user(user_id: int, user: UserUpdate, session: SessionDep):
+async def update_user(user_id: int, user: UserUpdate, session: AsyncSessionDep):
     """Endpoint that allows a user of specified user_id to be modified. All
     user properties to be modified are optional, and if no updates occur, the
     original values remain.
@@ -72,7 +163,7 @@ async def update_user(user_id: int, user: UserUpdate, session: SessionDep):
     If any of the fields are in the incorrect format, an exception with
     422 status code is raised.
     """
-    user_db = session.get(User, user_id)
+    user_db = await session.get(User, user_id)
     if not user_db:
         raise HTTPException(status_code=404, detail="User not found")
     user_data = user.model_dump(
@@ -81,31 +172,36 @@ async def update_user(user_id: int, user: UserUpdate, session: SessionDep):
     # model_dump validating against UserUpdate
     user_db.sqlmodel_update(user_data)
     session.add(user_db)
-    session.commit()
-    session.refresh(user_db)
+    await session.commit()
+    await session.refresh(user_db)
+    activities_to_plot_cache.invalidate(user_id)
     return user_db
 
 
 @router.delete("/{user_id}")
-async def delete_user(user_id: int, session: SessionDep):
+async def delete_user(user_id: int, session: AsyncSessionDep):
     """Endpoint that deletes a user, according to the given user_id.
     If the ID does not exist, an exception with 404 status code is raised."""
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    session.delete(user)
-    session.commit()
+    await session.delete(user)
+    await session.commit()
+    activities_to_plot_cache.invalidate(user_id)
     return {"message": f"User_id {user_id} deleted"}
 
 
 @router.get("/{user_id}/activities/", response_model=list[Activity])
 async def get_activities_by_user_id(
-    session: SessionDep,
+    session: AsyncSessionDep,
+    response: Response,
     user_id: int,
     offset: int = 0,
     limit: int = 100,
     sort_by: SortBy = "id",
     order_by: OrderBy = "asc",
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
 ):
     """Endpoint to get a paginated list of activities.
 
@@ -114,54 +210,301 @@ async def get_activities_by_user_id(
     :param limit: number of activities to return
     :param sort_by: column to sort the activities by
     :param order_by: how to order the activities (ascending or descending)
-    """
-    sort_by_col = column(sort_by)
-    query = (
-        select(Activity).where(Activity.user_id == user_id).offset(offset).limit(limit)
-    )
+    :param cursor: the X-Next-Cursor header of the previous page. If given, the page
+        starts after the previous page (and offset is ignored)
+
+    If the page is full, the X-Next-Cursor response header contains the cursor for
+    the next page (except when sorting by elevation_m, which can be null, so is
+    paged by offset). If the cursor is invalid, an exception with 400 status code
+    is raised.
 
-    if order_by.lower() == "asc":
-        query = query.order_by(sort_by_col.asc())
+    The response has an ETag header, which changes when any of the user's
+    activities change. If it matches the If-None-Match request header, a 304
+    response is returned (without querying the activities).
+    """
+    # with FAST_JSON_RESPONSES, the rows are selected as tuples and encoded straight
+    # to JSON (see common/responses.py). date_updated is selected last for the
+    # cursor, and left out of the response by only encoding the public columns.
+    if FAST_JSON_RESPONSES:
+        query = select(*ACTIVITY_PUBLIC_COLUMNS, Activity.date_updated)
     else:
-        query = query.order_by(sort_by_col.desc())
+        query = select(Activity)
+    query = query.where(Activity.user_id == user_id)
+    try:
+        query = paginate_activities(query, sort_by, order_by, offset, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = await get_user_activities_etag(
+        session, user_id, "activities", offset, limit, sort_by, order_by, cursor
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
 
-    activities = session.exec(query).scalars().all()
+    result = await session.execute(query)
+    activities = result.all() if FAST_JSON_RESPONSES else result.scalars().all()
 
     if not activities:
         raise HTTPException(status_code=404, detail="No activities found")
 
+    next_cursor = get_next_cursor(activities, sort_by, order_by, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    if FAST_JSON_RESPONSES:
+        col_names = [col.name for col in ACTIVITY_PUBLIC_COLUMNS]
+        return JSONRowsResponse(
+            activities, col_names, fast=True, headers=response.headers
+        )
     return activities
 
 
 @router.get("/{user_id}/activities-to-plot/", response_model=list[ActivityPlot])
 async def get_activities_to_plot_by_user_id(
-    session: SessionDep,
+    session: AsyncSessionDep,
     user_id: int,
     start_date: str = "1981-01-01",
-    end_date: str = "2081-01-01"
+    end_date: str = "2081-01-01",
+    format: PlotFormat = "rows",
+    fields: str | None = None,
+    max_points: int | None = Query(default=None, ge=3),
+    x: PlotAxis = "date",
+    y: PlotMetric = "pace_float_mps",
+    if_none_match: str | None = Header(default=None),
 ):
-    """Endpoint to get a list of activity data with added pace, speed and 
-    formatted time fields.
+    """Endpoint to get a list of activity data with added pace, speed and
+    formatted time fields (computed in the database query).
 
     :param user_id: user_id for which to get activities for
     :param start_date: start date for which to get activities after
     :param start_date: end date for which to get activities before
+    :param format: "rows" for a list of activity objects, or "columnar" for an
+        object of one list per field (e.g. {"distance_km": [5.0, 10.0]}), which
+        is much smaller for many activities
+    :param fields: comma separated fields to return (e.g.
+        "distance_km,pace_float_mps"), by default all the fields. Only these
+        columns are queried.
+    :param max_points: if given, the activities are sorted by x and downsampled to
+        at most max_points, keeping the shape of the plot of y against x (see
+        common/downsampling.py). Activities with a null x or y are left out, as
+        they can't be plotted.
+    :param x: the field of the plot's x axis, for max_points
+    :param y: the field of the plot's y axis, for max_points
+
+    Dates can be in the format "YYYY-MM-DD" or "YYYY/MM/DD", otherwise an exception
+    with 422 status code is raised.
+
+    The response has an ETag header, which changes when any of the user's
+    activities change. If it matches the If-None-Match request header, a 304
+    response is returned (without querying the activities).
     """
-    # explicitly unpacking all columns in the Activiy table (to give a list of tuples
-    # instead of ORM objects)
-    query = select(*Activity.__table__.c).where(
+    start, end = parse_date_range(start_date, end_date)
+    names = parse_plot_fields(fields)
+
+    # x and y only change the response if it's downsampled
+    downsample = (max_points, x, y) if max_points is not None else None
+    cache_key = (user_id, start, end, format, tuple(names), downsample)
+    cached = activities_to_plot_cache.get(cache_key)
+    if cached is not None:
+        etag, body = cached
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return Response(
+            content=body, media_type="application/json", headers={"ETag": etag}
+        )
+    generation = activities_to_plot_cache.generation(user_id)
+
+    etag = await get_user_activities_etag(
+        session, user_id, "activities-to-plot", start, end, format, names, downsample
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    # explicitly selecting the requested columns of the Activity table (to give a
+    # list of tuples instead of ORM objects), and of the derived pace, speed and
+    # formatted date computed by the database
+    query = select(*(ACTIVITY_PLOT_COLUMNS[name] for name in names)).where(
         Activity.user_id == user_id,
-        Activity.date > start_date,
-        Activity.date < end_date,
+        Activity.date > start,
+        Activity.date < end,
     )
-    activities = session.exec(query)
-    activities_data = activities.all()
-    activities_col_names = activities.keys()
+    if max_points is not None:
+        x_col, y_col = ACTIVITY_PLOT_COLUMNS[x], ACTIVITY_PLOT_COLUMNS[y]
+        # x and y are selected last if they aren't requested fields, and left out
+        # of the response by only encoding the requested fields
+        extra_cols = [
+            col for col in {x: x_col, y: y_col}.values() if col.name not in names
+        ]
+        query = (
+            query.add_columns(*extra_cols)
+            .where(x_col.is_not(None), y_col.is_not(None))
+            .order_by(x_col, Activity.id)
+        )
+    result = await session.execute(query)
+    activities = result.all()
 
-    formatted_activities = format_query_output(activities_data, activities_col_names)
-    modified_activities = update_activities_dict(formatted_activities)
+    if not activities:
+        raise HTTPException(status_code=404, detail="No activities found")
+
+    if max_points is not None:
+        col_names = list(result.keys())
+        activities = downsample_rows(
+            activities, col_names.index(x), col_names.index(y), max_points
+        )
+
+    # the rows (tuples) are encoded straight to JSON, as they are already in the
+    # ActivityPlot format (so don't need converting or validating against it again)
+    if format == "columnar":
+        body = encode_json_columns(activities, names, FAST_JSON_RESPONSES)
+    else:
+        body = encode_json_rows(activities, names, FAST_JSON_RESPONSES)
+    activities_to_plot_cache.set(cache_key, (etag, body), generation, size=len(body))
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
-    if not modified_activities:
+
+@router.get("/{user_id}/stats", response_model=list[ActivityStats])
+async def get_activity_stats_by_user_id(
+    session: AsyncSessionDep,
+    user_id: int,
+    period: StatsPeriod = "week",
+    group_by: list[StatsGroupBy] = Query(default=[]),
+    start_date: str = "1981-01-01",
+    end_date: str = "2081-01-01",
+):
+    """Endpoint to get the total and average distance, moving time, elevation and
+    perceived effort of a user's activities in each week, month or year (computed
+    by the database, so the response size depends on the number of periods rather
+    than the number of activities).
+
+    :param user_id: user_id for which to get activity stats for
+    :param period: the period to total and average the activities over
+    :param group_by: also split each period by activity and / or activity_type,
+        e.g. ?group_by=activity&group_by=activity_type
+    :param start_date: start date for which to get activities after
+    :param end_date: end date for which to get activities before
+
+    Dates can be in the format "YYYY-MM-DD" or "YYYY/MM/DD", otherwise an exception
+    with 422 status code is raised.
+    """
+    start, end = parse_date_range(start_date, end_date)
+
+    period_start, *aggregates = activity_stats_columns(period)
+    group_cols = [period_start, *(Activity.__table__.c[col] for col in group_by)]
+    query = (
+        select(*group_cols, *aggregates)
+        .where(
+            Activity.user_id == user_id,
+            Activity.date > start,
+            Activity.date < end,
+        )
+        .group_by(*group_cols)
+        .order_by(*group_cols)
+    )
+    stats = (await session.execute(query)).mappings().all()
+
+    if not stats:
         raise HTTPException(status_code=404, detail="No activities found")
 
-    return modified_activities
\ No newline at end of file
+    return stats
+
+
+@router.get("/{user_id}/weekly-summary", response_model=list[UserWeeklySummary])
+async def get_weekly_summary_by_user_id(
+    session: AsyncSessionDep,
+    user_id: int,
+    start_date: str = "1981-01-01",
+    end_date: str = "2081-01-01",
+):
+    """Endpoint to get the totals of a user's activities in each week (starting on
+    Monday), read from the weekly summaries rather than computed from the
+    activities.
+
+    :param user_id: user_id for which to get the weekly summary for
+    :param start_date: start date for which to get weeks starting after
+    :param end_date: end date for which to get weeks starting before
+
+    Dates can be in the format "YYYY-MM-DD" or "YYYY/MM/DD", otherwise an exception
+    with 422 status code is raised.
+    """
+    start, end = parse_date_range(start_date, end_date)
+
+    query = (
+        select(UserWeeklySummary)
+        .where(
+            UserWeeklySummary.user_id == user_id,
+            UserWeeklySummary.week_start > start,
+            UserWeeklySummary.week_start < end,
+        )
+        .order_by(UserWeeklySummary.week_start)
+    )
+    weeks = (await session.execute(query)).scalars().all()
+
+    if not weeks:
+        raise HTTPException(status_code=404, detail="No activities found")
+
+    return weeks
+
+
+async def stream_activities_export(
+    session_maker: async_sessionmaker[AsyncSession], user_id: int, format: ExportFormat
+) -> AsyncIterator[str]:
+    """streams all of a user's activities from a server-side cursor, yielding
+    EXPORT_CHUNK_SIZE rows at a time as NDJSON lines or CSV rows"""
+    query = (
+        select(*ACTIVITY_PUBLIC_COLUMNS)
+        .where(Activity.user_id == user_id)
+        .order_by(Activity.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    async with session_maker() as session:
+        result = await session.stream(query)
+        col_names = list(result.keys())
+
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(col_names)
+            async for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():  # header only, if the user has no activities
+                yield buffer.getvalue()
+        else:
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(col_names, row))) + "\n" for row in rows
+                )
+
+
+@router.get("/{user_id}/activities/export")
+async def export_activities_by_user_id(
+    session_maker: AsyncSessionMakerDep,
+    user_id: int,
+    format: ExportFormat = "ndjson",
+):
+    """Endpoint to download all of a user's activities, ordered by id, as
+    newline delimited JSON (one activity object per line) or CSV (with a header
+    row).
+
+    The activities are streamed from the database in chunks, so memory use
+    doesn't grow with the number of activities.
+
+    If the user_id does not exist, an exception with 404 status code is raised.
+    """
+    async with session_maker() as session:
+        user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return StreamingResponse(
+        stream_activities_export(session_maker, user_id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="activities_user_{user_id}.{format}"'
+            )
+        },
+    )
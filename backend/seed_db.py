@@ -1,173 +1,340 @@
-from sqlmodel import Session
-from database.models import Activity, User
+"""Seeds the database (from DB_URL) with synthetic, but realistic, users and
+activities, e.g. a production sized dataset for profiling:
+
+    python seed_db.py --users 5000 --activities-per-user 400
+
+Each user has their own mix of activities (around the --mix given), ability
+(pace), typical distances and time of day, so the data has the spread real users
+do. The same --seed (and options) always generates the same data.
+
+The activity types, paces, distances, elevation and effort of each activity can be
+changed with --profiles, a JSON file in the format of ACTIVITY_PROFILES, e.g.
+
+    {"run": {"types": {"road": 1}, "pace_secs_per_km": [300, 360],
+             "distance_km": [5, 10], "elevation_m_per_km": {"road": 5},
+             "perceived_effort": 5}}
+
+Activities are generated and loaded in chunks of --chunk-size, so memory use
+doesn't grow with the size of the dataset: with COPY on Postgres (psycopg2),
+otherwise with multi-row INSERTs. The weekly summaries are rebuilt afterwards.
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import time as timer
+from datetime import date, time, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import Connection, Engine, func, insert, select
+
+from common.utils import format_time_secs
 from database.database import engine
+from database.models import Activity, User, utc_now
+from database.summaries import rebuild_weekly_summaries
 
+# per activity (those accepted by the API): the weights of its activity types, the
+# range of users' typical paces (secs per km) and distances (km), the elevation
+# gain per km of each activity type (None if it has no elevation, e.g. indoor), and
+# the perceived effort of an activity of a user's typical distance
+ACTIVITY_PROFILES: Dict[str, Dict[str, Any]] = {
+    "run": {
+        "types": {"road": 0.6, "trail": 0.3, "track": 0.1},
+        "pace_secs_per_km": (240, 420),
+        "distance_km": (4, 16),
+        "elevation_m_per_km": {"road": 8, "trail": 40, "track": 0},
+        "perceived_effort": 5,
+    },
+    "ride": {
+        "types": {"road": 0.6, "gravel": 0.25, "indoor": 0.15},
+        "pace_secs_per_km": (100, 180),
+        "distance_km": (20, 80),
+        "elevation_m_per_km": {"road": 10, "gravel": 15, "indoor": None},
+        "perceived_effort": 5,
+    },
+}
 
-def create_users():
-    user_1 = User(name="luc", email="luc@gmail.com")
-    user_2 = User(name="bob", email="bob@gmail.com")
-    user_3 = User(name="sam", email="sam@gmail.com")
+DEFAULT_MIX = {"run": 0.7, "ride": 0.3}
+DEFAULT_START_DATE = date(2015, 1, 1)
+DEFAULT_END_DATE = date(2025, 12, 31)
 
-    session = Session(engine)
+# the activity_table columns loaded, in the order of the generated rows
+ACTIVITY_COLUMNS = (
+    "user_id",
+    "date",
+    "time",
+    "activity",
+    "activity_type",
+    "moving_time",
+    "distance_km",
+    "perceived_effort",
+    "elevation_m",
+    "date_updated",
+)
 
-    session.add(user_1)
-    session.add(user_2)
-    session.add(user_3)
 
-    session.commit()
+class SyntheticUser:
+    """a user's habits (activity mix, pace, distances and time of day), drawn from
+    rng, from which their activities are generated"""
 
+    def __init__(
+        self,
+        rng: random.Random,
+        mix: Dict[str, float] = DEFAULT_MIX,
+        start_date: date = DEFAULT_START_DATE,
+        end_date: date = DEFAULT_END_DATE,
+        profiles: Dict[str, Dict[str, Any]] = ACTIVITY_PROFILES,
+    ):
+        self.rng = rng
+        self.profiles = profiles
+        self.start_date = start_date
+        self.days = (end_date - start_date).days
+        self.activities = list(mix)
+        # each user does more or less of each activity than the overall mix
+        self.weights = [weight * rng.uniform(0.2, 1.8) for weight in mix.values()]
+        # the fraction of the way from the fastest to the slowest pace, and from the
+        # shortest to the longest distances (the same for all activities, as fitter
+        # users tend to be faster and go further)
+        self.ability = rng.betavariate(2, 2)
+        self.endurance = rng.betavariate(2, 2)
+        # most users have a morning or an evening habit
+        self.hour = rng.choice([6.5, 7.5, 12.5, 17.5, 18.5])
 
-def create_activities():
-    activity_1 = Activity(
-        user_id=1,
-        date="2025-03-25",
-        time="20:16",
-        activity="run",
-        activity_type="road",
-        moving_time="00:49:21",
-        distance_km=7.16,
-        perceived_effort=5,
-        elevation_m=94,
-    )
-    activity_2 = Activity(
-        user_id=1,
-        date="2025-03-23",
-        time="10:08",
-        activity="run",
-        activity_type="road",
-        moving_time="00:33:01",
-        distance_km=5.01,
-        perceived_effort=8,
-        elevation_m=89,
-    )
-    activity_3 = Activity(
-        user_id=1,
-        date="2025-03-18",
-        time="14:40",
-        activity="run",
-        activity_type="trail",
-        moving_time="01:16:22",
-        distance_km=10.60,
-        perceived_effort=4,
-        elevation_m=146,
-    )
-    activity_4 = Activity(
-        user_id=1,
-        date="2025-03-16",
-        time="09:02",
-        activity="run",
-        activity_type="road",
-        moving_time="00:52:38",
-        distance_km=6.89,
-        perceived_effort=3,
-        elevation_m=104,
-    )
-    activity_5 = Activity(
-        user_id=1,
-        date="2025-03-12",
-        time="17:02",
-        activity="run",
-        activity_type="road",
-        moving_time="00:37:53",
-        distance_km=5.14,
-        perceived_effort=3,
-        elevation_m=46,
-    )
-    activity_5 = Activity(
-        user_id=1,
-        date="2025-03-05",
-        time="17:45",
-        activity="run",
-        activity_type="road",
-        moving_time="00:33:24",
-        distance_km=5.01,
-        perceived_effort=6,
-        elevation_m=36,
-    )
-    activity_6 = Activity(
-        user_id=1,
-        date="2025-02-27",
-        time="17:45",
-        activity="run",
-        activity_type="road",
-        moving_time="00:34:01",
-        distance_km=5.01,
-        perceived_effort=6,
-        elevation_m=81,
-    )
-    activity_7 = Activity(
-        user_id=1,
-        date="2025-02-22",
-        time="17:12",
-        activity="run",
-        activity_type="road",
-        moving_time="00:30:56",
-        distance_km=5.02,
-        perceived_effort=7,
-        elevation_m=43,
-    )
-    activity_8 = Activity(
-        user_id=1,
-        date="2025-02-17",
-        time="17:34",
-        activity="run",
-        activity_type="road",
-        moving_time="00:32:15",
-        distance_km=5.01,
-        perceived_effort=6,
-        elevation_m=50,
-    )
-    activity_9 = Activity(
-        user_id=1,
-        date="2025-02-10",
-        time="17:28",
-        activity="run",
-        activity_type="road",
-        moving_time="00:38:57",
-        distance_km=5.59,
-        perceived_effort=6,
-        elevation_m=103,
-    )
-    activity_10 = Activity(
-        user_id=1,
-        date="2025-02-03",
-        time="17:29",
-        activity="run",
-        activity_type="road",
-        moving_time="00:37:25",
-        distance_km=5.20,
-        perceived_effort=8,
-        elevation_m=116,
-    )
-    activity_11 = Activity(
-        user_id=1,
-        date="2025-01-29",
-        time="17:35",
-        activity="run",
-        activity_type="road",
-        moving_time="00:32:02",
-        distance_km=5.01,
-        perceived_effort=5,
-        elevation_m=49,
-    )
+    def make_row(self, user_id: int, date_updated=None) -> Tuple:
+        """returns a random activity, as a row of ACTIVITY_COLUMNS (with the date,
+        time and moving_time as native values)"""
+        rng = self.rng
+        activity = rng.choices(self.activities, self.weights)[0]
+        profile = self.profiles[activity]
+        activity_type = rng.choices(
+            list(profile["types"]), list(profile["types"].values())
+        )[0]
+
+        day = self.start_date + timedelta(days=rng.randint(0, self.days))
+        # longer activities at the weekend, later in the morning
+        weekend = day.weekday() >= 5
+        hour = 9.5 if weekend else self.hour
+        minutes = min(max(int(rng.gauss(hour, 1) * 60), 0), 24 * 60 - 1)
+
+        shortest, longest = profile["distance_km"]
+        typical_km = shortest + self.endurance * (longest - shortest)
+        relative_distance = rng.lognormvariate(0.4 if weekend else 0, 0.3)
+        distance_km = round(max(typical_km * relative_distance, 0.5), 2)
 
-    session = Session(engine)
+        fastest, slowest = profile["pace_secs_per_km"]
+        pace = fastest + (1 - self.ability) * (slowest - fastest)
+        # slower over longer distances and off road
+        pace *= rng.gauss(1, 0.04) * relative_distance**0.05
+        if activity_type in ("trail", "gravel"):
+            pace *= 1.1
+        moving_secs = int(distance_km * pace)
 
-    session.add(activity_1)
-    session.add(activity_2)
-    session.add(activity_3)
-    session.add(activity_4)
-    session.add(activity_5)
-    session.add(activity_6)
-    session.add(activity_7)
-    session.add(activity_8)
-    session.add(activity_9)
-    session.add(activity_10)
-    session.add(activity_11)
+        elevation_per_km = profile["elevation_m_per_km"][activity_type]
+        elevation_m = None
+        if elevation_per_km is not None:
+            elevation_m = int(distance_km * elevation_per_km * rng.uniform(0.3, 1.7))
 
-    session.commit()
+        # harder the further (or faster) than usual
+        effort = profile["perceived_effort"] + 3 * (relative_distance - 1)
+        effort = rng.gauss(effort + 2 * rng.random() - 1, 1.2)
+        perceived_effort = min(max(round(effort), 1), 10)
+
+        return (
+            user_id,
+            day,
+            time(minutes // 60, minutes % 60),
+            activity,
+            activity_type,
+            moving_secs,
+            distance_km,
+            perceived_effort,
+            elevation_m,
+            date_updated,
+        )
+
+
+def make_activity(user_id: int, rng: random.Random) -> Dict[str, Any]:
+    """creates a random (but valid) activity for the given user_id, in the API
+    format (e.g. the body of POST /activities/)"""
+    row = SyntheticUser(rng).make_row(user_id)
+    activity = dict(zip(ACTIVITY_COLUMNS[:-1], row))
+    activity["date"] = activity["date"].isoformat()
+    activity["time"] = activity["time"].strftime("%H:%M")
+    activity["moving_time"] = format_time_secs(activity["moving_time"])
+    return activity
+
+
+def generate_activities(
+    user_ids: List[int],
+    activities_per_user: int,
+    seed: int = 0,
+    chunk_size: int = 10_000,
+    **user_options,
+) -> Iterator[List[Tuple]]:
+    """yields the activities of each user (ordered by date), as rows of
+    ACTIVITY_COLUMNS, in lists of up to chunk_size. Each user's activities are
+    generated from their own seed, so don't depend on the chunk size or the other
+    users. user_options (mix, start_date, end_date, profiles) are passed to
+    SyntheticUser."""
+    date_updated = utc_now()
+    chunk = []
+    for user_id in user_ids:
+        user = SyntheticUser(random.Random(f"{seed}:{user_id}"), **user_options)
+        rows = [
+            user.make_row(user_id, date_updated) for _ in range(activities_per_user)
+        ]
+        rows.sort(key=lambda row: (row[1], row[2]))
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def copy_activities(conn: Connection, rows: List[Tuple]):
+    """loads the rows into activity_table with Postgres' COPY (psycopg2 only)"""
+    buffer = io.StringIO()
+    # empty (unquoted) values are loaded as NULL
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY activity_table ({', '.join(ACTIVITY_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def insert_activities(conn: Connection, rows: List[Tuple]):
+    """loads the rows into activity_table with multi-row INSERTs"""
+    conn.execute(insert(Activity), [dict(zip(ACTIVITY_COLUMNS, row)) for row in rows])
+
+
+def seed_synthetic_data(
+    engine: Engine,
+    n_users: int,
+    activities_per_user: int,
+    seed: int = 0,
+    chunk_size: int = 10_000,
+    **user_options,
+) -> int:
+    """adds n_users users, each with activities_per_user synthetic activities (see
+    generate_activities), in a single transaction, then rebuilds the weekly
+    summaries. Returns the number of activities added."""
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        load_activities = copy_activities
+    else:
+        load_activities = insert_activities
+
+    count = 0
+    with engine.begin() as conn:
+        # numbered after the existing users, so the seeded names and emails don't
+        # repeat those of earlier seeds
+        start = conn.scalar(select(func.count()).select_from(User))
+        users = [
+            {"name": f"user_{i}", "email": f"user_{i}@email"}
+            for i in range(start, start + n_users)
+        ]
+        user_ids = sorted(
+            conn.execute(insert(User).returning(User.user_id), users).scalars()
+        )
+        for chunk in generate_activities(
+            user_ids, activities_per_user, seed, chunk_size, **user_options
+        ):
+            load_activities(conn, chunk)
+            count += len(chunk)
+        rebuild_weekly_summaries(conn)
+        if engine.dialect.name == "postgresql":
+            # update the planner's statistics for the new rows
+            conn.exec_driver_sql("ANALYZE activity_table")
+            conn.exec_driver_sql("ANALYZE user_table")
+    return count
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """parses an activity mix, e.g. "run=0.7,ride=0.3" """
+    mix = {}
+    for part in value.split(","):
+        activity, _, weight = part.partition("=")
+        if activity not in ACTIVITY_PROFILES:
+            raise argparse.ArgumentTypeError(
+                f"Unknown activity {activity!r} (choose from "
+                f"{', '.join(ACTIVITY_PROFILES)})"
+            )
+        mix[activity] = float(weight or 1)
+    return mix
+
+
+def load_profiles(path: str) -> Dict[str, Dict[str, Any]]:
+    """loads activity profiles from a JSON file (in the format of ACTIVITY_PROFILES),
+    replacing the default profile of each activity in the file"""
+    with open(path) as file:
+        loaded = json.load(file)
+    profiles = dict(ACTIVITY_PROFILES)
+    for activity, profile in loaded.items():
+        if activity not in ACTIVITY_PROFILES:
+            raise argparse.ArgumentTypeError(
+                f"Unknown activity {activity!r} (choose from "
+                f"{', '.join(ACTIVITY_PROFILES)})"
+            )
+        missing = [key for key in ACTIVITY_PROFILES[activity] if key not in profile]
+        if missing:
+            raise argparse.ArgumentTypeError(
+                f"Profile of {activity!r} is missing {', '.join(missing)}"
+            )
+        if set(profile["elevation_m_per_km"]) != set(profile["types"]):
+            raise argparse.ArgumentTypeError(
+                f"Profile of {activity!r} needs the elevation_m_per_km of each type"
+            )
+        profiles[activity] = profile
+    return profiles
 
 
 if __name__ == "__main__":
-    create_users()
-    create_activities()
+    parser = argparse.ArgumentParser(description="Seeds the database.")
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--activities-per-user", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help='relative weights of the activities, e.g. "run=0.7,ride=0.3"',
+    )
+    parser.add_argument(
+        "--start-date", type=date.fromisoformat, default=DEFAULT_START_DATE
+    )
+    parser.add_argument("--end-date", type=date.fromisoformat, default=DEFAULT_END_DATE)
+    parser.add_argument(
+        "--profiles",
+        type=load_profiles,
+        default=ACTIVITY_PROFILES,
+        help="JSON file of activity profiles, replacing those of ACTIVITY_PROFILES",
+    )
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    start = timer.perf_counter()
+    count = seed_synthetic_data(
+        engine,
+        args.users,
+        args.activities_per_user,
+        args.seed,
+        args.chunk_size,
+        mix=args.mix,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        profiles=args.profiles,
+    )
+    secs = timer.perf_counter() - start
+    print(
+        f"Added {args.users} users and {count} activities in {secs:.1f}s "
+        f"({count / secs:,.0f} activities/s)"
+    )
@@ -0,0 +1,64 @@
+"""Runs the API in production, with multiple worker processes:
+
+    python server.py --workers 4
+
+The schema is created (and migrated) once if needed, in this process, before the
+workers start, so they don't race to migrate the database. Each worker runs on
+uvloop with the httptools HTTP parser, and has its own connection pool
+(DB_POOL_SIZE is per worker), response cache and metrics.
+
+On SIGTERM or SIGINT the workers stop accepting connections, wait up to
+--graceful-timeout seconds for in-flight requests to finish, then close their
+database connections (see the lifespan in main.py).
+
+`python main.py` still runs a single process for development.
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+from database.database import engine, setup_schema
+
+
+def get_worker_count() -> int:
+    """returns WEB_CONCURRENCY if set, otherwise one worker per CPU core"""
+    return int(os.getenv("WEB_CONCURRENCY", 0)) or os.cpu_count() or 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8080)))
+    parser.add_argument("--workers", type=int, default=get_worker_count())
+    # uvloop and httptools are in requirements.txt, "asyncio" and "h11" are the
+    # pure Python fallbacks
+    parser.add_argument("--loop", default="uvloop", choices=["uvloop", "asyncio"])
+    parser.add_argument("--http", default="httptools", choices=["httptools", "h11"])
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=int(os.getenv("GRACEFUL_TIMEOUT", 20)),
+        help="seconds to wait for in-flight requests on shutdown",
+    )
+    args = parser.parse_args()
+
+    setup_schema()
+    # the workers are new processes with their own engines
+    engine.dispose()
+    os.environ["DB_SCHEMA_ON_STARTUP"] = "skip"
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,88 @@
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
 
+from common.cache import activities_to_plot_cache
 from main import app
-from database.database import get_session
+from database.database import get_async_session_maker
+from database.profiling import count_queries
+
+
+@pytest.fixture(name="db_path")
+def db_path_fixture(tmp_path):
+    """fixture giving the path of a temporary SQLite database file, shared by the
+    sync test session and the async engine used by the app"""
+    return tmp_path / "test.db"
 
 
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(db_path):
     """fixture to create the custom engine for testing purposes,
     create the tables, and create the session.
     SQLite used rather than Postgres for ease/speed of testing, as the
-    database can be stored in-memory"""
-    engine = create_engine(
-        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
-    )
+    database is a temporary file (so the sync session used to set up test data
+    and the async session used by the app see the same tables)"""
+    engine = create_engine(f"sqlite:///{db_path}")
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(db_path):
+    """fixture to create the async engine used by the app in the tests.
+
+    NullPool is used as the TestClient may run each request on a new event loop,
+    so connections can't be reused between requests"""
+    return create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
-    """fixture to tell fastAPI to use get_session_override (test session) instead of
-    get_session (production session). After the test function is done, pytest will
-    come back to execute the rest of the code after yield"""
+def client_fixture(session: Session, async_engine: AsyncEngine):
+    """fixture to tell fastAPI to use get_session_maker_override (test async
+    sessions) instead of get_async_session_maker (production sessions). After the
+    test function is done, pytest will come back to execute the rest of the code
+    after yield."""
+    session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
 
-    def get_session_override():
-        return session
+    def get_session_maker_override():
+        return session_maker
 
-    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session_maker] = get_session_maker_override
+    # the test databases reuse user_ids, so cached responses mustn't carry over
+    activities_to_plot_cache.clear()
 
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
 
 
+@pytest.fixture(name="query_budget")
+def query_budget_fixture(async_engine: AsyncEngine):
+    """fixture to check the number of queries made by the app in a block doesn't
+    exceed a budget, e.g.
+
+        with query_budget(2):
+            client.get("/users/1/activities/")
+
+    On failure, the statements executed are listed with their counts."""
+
+    @contextmanager
+    def query_budget(max_queries: int):
+        with count_queries(async_engine.sync_engine) as log:
+            yield log
+        assert (
+            len(log) <= max_queries
+        ), f"{len(log)} queries made (budget {max_queries}):\n{log.summary()}"
+
+    return query_budget
+
+
 @pytest.fixture
 def activity_test_1(scope="function"):
     return {
@@ -1,7 +1,22 @@
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
-from database.models import Activity
+from common.pagination import encode_cursor
+from database.models import Activity, User
+
+
+def get_all_pages(client: TestClient, url: str, params: dict) -> list:
+    """follows the X-Next-Cursor header from the first page of url to the last
+    page, returning the ids of the activities on each page"""
+    pages = []
+    response = client.get(url, params=params)
+    while True:
+        pages.append([activity["id"] for activity in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        response = client.get(url, params={**params, "cursor": cursor})
 
 
 class TestGetActivities:
@@ -85,6 +100,111 @@ class TestGetActivities:
         assert response.status_code == 422
 
 
+class TestGetActivitiesCursorPagination:
+    @pytest.fixture
+    def activities(self, session: Session, activity_test_1, activity_test_2):
+        # ties on distance_km and dates, and a null elevation_m
+        for i in range(7):
+            activity = activity_test_1 if i % 2 else activity_test_2
+            session.add(Activity(**{**activity, "elevation_m": i if i != 3 else None}))
+        session.commit()
+
+    @pytest.mark.parametrize(
+        "sort_by",
+        [
+            "id",
+            "date",
+            "time",
+            "moving_time",
+            "distance_km",
+            "activity",
+            "date_updated",
+        ],
+    )
+    @pytest.mark.parametrize("order_by", ["asc", "desc"])
+    def test_cursor_pages_match_offset_pages(
+        self, client: TestClient, activities, sort_by, order_by
+    ):
+        params = {"sort_by": sort_by, "order_by": order_by}
+        response = client.get("/activities/", params=params)
+        all_ids = [activity["id"] for activity in response.json()]
+
+        pages = get_all_pages(client, "/activities/", {**params, "limit": 2})
+
+        assert pages == [all_ids[i : i + 2] for i in range(0, len(all_ids), 2)]
+
+    def test_cursor_sorts_nulls_last(self, client: TestClient, activities):
+        response = client.get("/activities/?sort_by=elevation_m&order_by=desc")
+        elevations = [activity["elevation_m"] for activity in response.json()]
+
+        assert elevations == [6, 5, 4, 2, 1, 0, None]
+
+    def test_no_cursor_for_nullable_sort_column(self, client: TestClient, activities):
+        response = client.get("/activities/?limit=2&sort_by=elevation_m")
+        assert response.status_code == 200
+        assert "X-Next-Cursor" not in response.headers
+
+        cursor = encode_cursor("elevation_m", "asc", 1, 1)
+        response = client.get(f"/activities/?sort_by=elevation_m&cursor={cursor}")
+        assert response.status_code == 400
+
+    def test_no_next_cursor_on_last_page(self, client: TestClient, activities):
+        response = client.get("/activities/?limit=10")
+        assert "X-Next-Cursor" not in response.headers
+
+    def test_cursor_ignores_offset(self, client: TestClient, activities):
+        first_page = client.get("/activities/?limit=3")
+        cursor = first_page.headers["X-Next-Cursor"]
+
+        response = client.get(f"/activities/?limit=3&offset=5&cursor={cursor}")
+
+        assert [activity["id"] for activity in response.json()] == [4, 5, 6]
+
+    def test_invalid_cursor_raises_400_error(self, client: TestClient, activities):
+        response = client.get("/activities/?cursor=not-a-cursor")
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+    @pytest.mark.parametrize(
+        "sort_by, value",
+        [
+            ("date", "notadate"),
+            ("date", 5),
+            ("time", "25:00"),
+            ("moving_time", "01:00"),
+            ("moving_time", 3600),
+            ("distance_km", "5.0"),
+            ("distance_km", True),
+            ("perceived_effort", 2.5),
+            ("activity", 5),
+            ("date_updated", "notadatetime"),
+            ("date_updated", None),
+            ("id", None),
+        ],
+    )
+    def test_cursor_with_wrong_typed_value_raises_400_error(
+        self, client: TestClient, activities, sort_by, value
+    ):
+        cursor = encode_cursor(sort_by, "asc", value, 1)
+        response = client.get(f"/activities/?sort_by={sort_by}&cursor={cursor}")
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+    def test_cursor_for_different_sort_raises_400_error(
+        self, client: TestClient, activities
+    ):
+        first_page = client.get("/activities/?limit=3&sort_by=date")
+        cursor = first_page.headers["X-Next-Cursor"]
+
+        response = client.get(
+            f"/activities/?limit=3&sort_by=distance_km&cursor={cursor}"
+        )
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Cursor does not match sort_by and order_by"
+
+
 class TestGetActivitiesById:
     def test_endpoint_responds_with_appropriate_activity_id(
         self, session: Session, client: TestClient, activity_test_1, activity_test_2
@@ -105,6 +225,29 @@ class TestGetActivitiesById:
         assert response.status_code == 404
         assert response.json()["detail"] == "Activity not found"
 
+    def test_matching_etag_returns_304(self, client: TestClient, activity_test_1):
+        client.post("/activities/", json=activity_test_1)
+        etag = client.get("/activities/1").headers["ETag"]
+
+        response = client.get("/activities/1", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    def test_etag_changes_when_activity_updated(
+        self, client: TestClient, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        etag = client.get("/activities/1").headers["ETag"]
+
+        client.patch("/activities/1", json={"distance_km": 7.5})
+        response = client.get("/activities/1", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.json()["distance_km"] == 7.5
+        assert response.headers["ETag"] != etag
+
 
 class TestCreateActivity:
     def test_endpoint_returns_201_status_code_on_success(self, client: TestClient):
@@ -179,6 +322,99 @@ class TestCreateActivity:
         assert response.status_code == 422
 
 
+class TestCreateActivitiesBulk:
+    @pytest.fixture
+    def user(self, session: Session):
+        session.add(User(name="test", email="test@email"))
+        session.commit()
+
+    def test_endpoint_creates_all_valid_activities(
+        self, client: TestClient, user, activity_test_1, activity_test_2
+    ):
+        response = client.post(
+            "/activities/bulk", json=[activity_test_1, activity_test_2]
+        )
+        data = response.json()
+        activities = client.get("/activities/").json()
+
+        assert response.status_code == 201
+        assert data == {"created": 2, "ids": [1, 2], "errors": []}
+        assert activities == [
+            {"id": 1, **activity_test_1},
+            {"id": 2, **activity_test_2},
+        ]
+
+    def test_endpoint_returns_errors_for_invalid_activities_and_creates_valid(
+        self, client: TestClient, user, activity_test_1, activity_test_2
+    ):
+        invalid_activity = {
+            **activity_test_1,
+            "date": "25 March 25",
+            "activity": "swim",
+        }
+        incomplete_activity = {"user_id": 1, "distance_km": 4.4}
+        response = client.post(
+            "/activities/bulk",
+            json=[
+                invalid_activity,
+                activity_test_1,
+                incomplete_activity,
+                activity_test_2,
+            ],
+        )
+        data = response.json()
+
+        assert response.status_code == 201
+        assert data["created"] == 2
+        assert len(data["ids"]) == 2
+        assert [error["index"] for error in data["errors"]] == [0, 2]
+        assert "Format of data incorrect:" in data["errors"][0]["detail"]
+        assert "date" in data["errors"][0]["detail"]
+        assert "activity" in data["errors"][0]["detail"]
+        assert "moving_time" in data["errors"][1]["detail"]
+        assert len(client.get("/activities/").json()) == 2
+
+    def test_endpoint_returns_errors_for_unknown_user_id(
+        self, client: TestClient, user, activity_test_1
+    ):
+        unknown_user_activity = {**activity_test_1, "user_id": 2}
+        response = client.post(
+            "/activities/bulk", json=[unknown_user_activity, activity_test_1]
+        )
+        data = response.json()
+
+        assert data["ids"] == [1]
+        assert data["errors"] == [{"index": 0, "detail": "user_id - User not found"}]
+
+    def test_endpoint_returns_errors_for_non_object_activities(
+        self, client: TestClient, user, activity_test_1
+    ):
+        response = client.post(
+            "/activities/bulk", json=[activity_test_1, 5, None, [activity_test_1]]
+        )
+        data = response.json()
+
+        assert response.status_code == 201
+        assert data["ids"] == [1]
+        assert data["errors"] == [
+            {"index": index, "detail": "Activity must be an object"}
+            for index in [1, 2, 3]
+        ]
+
+    def test_endpoint_documents_activities_as_activity_create(self, client: TestClient):
+        openapi = client.get("/openapi.json").json()
+        request_body = openapi["paths"]["/activities/bulk"]["post"]["requestBody"]
+        schema = request_body["content"]["application/json"]["schema"]
+
+        assert schema["type"] == "array"
+        assert schema["items"] == {"$ref": "#/components/schemas/ActivityCreate"}
+        assert "ActivityCreate" in openapi["components"]["schemas"]
+
+    def test_endpoint_raises_422_error_for_empty_list(self, client: TestClient):
+        response = client.post("/activities/bulk", json=[])
+        assert response.status_code == 422
+
+
 class TestUpdateActivity:
     def test_endpoint_returns_200_status_code_on_success_non_validated_fields(
         self, client: TestClient, session: Session, activity_test_1
@@ -286,3 +522,41 @@ class TestDeleteActivity:
         assert len(response_before_del) == len(response_after_del) + 1
         for activity in response_after_del:
             assert activity["id"] != 2
+
+
+class TestActivitiesQueryBudgets:
+    @pytest.fixture
+    def activities(self, session: Session, activity_test_1, activity_test_2):
+        session.add(User(name="test", email="test@email"))
+        for activity in [activity_test_1, activity_test_2] * 5:
+            session.add(Activity(**activity))
+        session.commit()
+
+    def test_get_activities_single_query(
+        self, client: TestClient, activities, query_budget
+    ):
+        with query_budget(1):
+            response = client.get("/activities/")
+        assert len(response.json()) == 10
+
+    def test_get_activity_by_id_single_query(
+        self, client: TestClient, activities, query_budget
+    ):
+        with query_budget(1):
+            client.get("/activities/1")
+
+    def test_create_activity(
+        self, client: TestClient, activities, query_budget, activity_test_1
+    ):
+        # insert, weekly summary update and the refresh of the created activity
+        with query_budget(3):
+            client.post("/activities/", json=activity_test_1)
+
+    def test_update_activity(self, client: TestClient, activities, query_budget):
+        # get, weekly summary subtract, update, weekly summary add and refresh
+        with query_budget(6):
+            client.patch("/activities/1", json={"distance_km": 6.0})
+
+    def test_delete_activity(self, client: TestClient, activities, query_budget):
+        with query_budget(4):
+            client.delete("/activities/1")
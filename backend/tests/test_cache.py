@@ -0,0 +1,157 @@
+from fastapi.testclient import TestClient
+
+from common.cache import UserCache, activities_to_plot_cache
+from routes import users
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestUserCache:
+    def test_get_returns_cached_value_and_counts_hits_and_misses(self):
+        cache = UserCache(max_entries=10, max_bytes=100, ttl_secs=60)
+
+        assert cache.get((1, "a")) is None
+        cache.set((1, "a"), b"value", cache.generation(1))
+
+        assert cache.get((1, "a")) == b"value"
+        assert cache.stats() == {
+            "entries": 1,
+            "size_bytes": 5,
+            "hits": 1,
+            "misses": 1,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def test_least_recently_used_entry_evicted(self):
+        cache = UserCache(max_entries=2, max_bytes=100, ttl_secs=60)
+        cache.set((1, "a"), b"a", 0)
+        cache.set((1, "b"), b"b", 0)
+        cache.get((1, "a"))
+        cache.set((1, "c"), b"c", 0)
+
+        assert cache.get((1, "b")) is None
+        assert cache.get((1, "a")) == b"a"
+        assert cache.get((1, "c")) == b"c"
+        assert cache.evictions == 1
+
+    def test_entries_evicted_when_over_max_bytes(self):
+        cache = UserCache(max_entries=10, max_bytes=10, ttl_secs=60)
+        cache.set((1, "a"), b"123456", 0)
+        cache.set((2, "a"), b"123456", 0)
+        cache.set((3, "a"), b"12345678901", 0)  # larger than the cache
+
+        assert cache.get((1, "a")) is None
+        assert cache.get((2, "a")) == b"123456"
+        assert cache.get((3, "a")) is None
+        assert cache.size_bytes == 6
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = UserCache(max_entries=10, max_bytes=100, ttl_secs=60, clock=clock)
+        cache.set((1, "a"), b"a", 0)
+
+        clock.now = 59
+        assert cache.get((1, "a")) == b"a"
+        clock.now = 60
+        assert cache.get((1, "a")) is None
+        assert cache.evictions == 1
+
+    def test_invalidate_removes_only_the_users_entries(self):
+        cache = UserCache(max_entries=10, max_bytes=100, ttl_secs=60)
+        cache.set((1, "a"), b"a", 0)
+        cache.set((1, "b"), b"b", 0)
+        cache.set((2, "a"), b"a", 0)
+
+        cache.invalidate(1)
+
+        assert cache.get((1, "a")) is None
+        assert cache.get((1, "b")) is None
+        assert cache.get((2, "a")) == b"a"
+        assert cache.size_bytes == 1
+
+    def test_set_ignored_if_user_invalidated_since_generation_read(self):
+        cache = UserCache(max_entries=10, max_bytes=100, ttl_secs=60)
+        generation = cache.generation(1)
+        cache.invalidate(1)
+        cache.set((1, "a"), b"stale", generation)
+
+        assert cache.get((1, "a")) is None
+
+    def test_disabled_with_zero_ttl(self):
+        cache = UserCache(max_entries=10, max_bytes=100, ttl_secs=0)
+        cache.set((1, "a"), b"a", 0)
+
+        assert cache.get((1, "a")) is None
+
+
+class TestActivitiesToPlotCache:
+    def test_repeated_reads_are_cached(self, client: TestClient, activity_test_1):
+        client.post("/activities/", json=activity_test_1)
+
+        first = client.get("/users/1/activities-to-plot/")
+        second = client.get("/users/1/activities-to-plot/?end_date=2081/01/01")
+
+        assert first.json() == second.json()
+        assert activities_to_plot_cache.hits == 1
+        assert activities_to_plot_cache.misses == 1
+
+    def test_writes_invalidate_cached_reads(self, client: TestClient, activity_test_1):
+        client.post("/activities/", json=activity_test_1)
+        client.post("/activities/", json={**activity_test_1, "user_id": 2})
+        client.get("/users/1/activities-to-plot/")
+        client.get("/users/2/activities-to-plot/")
+
+        client.patch("/activities/1", json={"distance_km": 7.5})
+        response = client.get("/users/1/activities-to-plot/")
+        assert response.json()[0]["distance_km"] == 7.5
+
+        client.post("/activities/", json=activity_test_1)
+        assert len(client.get("/users/1/activities-to-plot/").json()) == 2
+
+        client.patch("/activities/1", json={"user_id": 2})
+        assert len(client.get("/users/1/activities-to-plot/").json()) == 1
+        assert len(client.get("/users/2/activities-to-plot/").json()) == 2
+
+        client.delete("/activities/3")
+        assert client.get("/users/1/activities-to-plot/").status_code == 404
+
+    def test_write_invalidates_only_the_users_entries(
+        self, client: TestClient, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.post("/activities/", json={**activity_test_1, "user_id": 2})
+        client.get("/users/1/activities-to-plot/")
+        client.get("/users/2/activities-to-plot/")
+
+        client.patch("/activities/1", json={"distance_km": 7.5})
+        client.get("/users/2/activities-to-plot/")
+
+        assert activities_to_plot_cache.hits == 1
+
+    def test_read_in_progress_during_write_is_not_cached(
+        self, client: TestClient, activity_test_1, monkeypatch
+    ):
+        client.post("/activities/", json=activity_test_1)
+        encode_json_rows = users.encode_json_rows
+
+        def encode_after_write(rows, col_names, *args):
+            # the read has queried the activities but not cached them yet, when
+            # an update is committed (in another request)
+            client.patch("/activities/1", json={"distance_km": 7.5})
+            return encode_json_rows(rows, col_names, *args)
+
+        monkeypatch.setattr(users, "encode_json_rows", encode_after_write)
+        in_progress = client.get("/users/1/activities-to-plot/")
+        monkeypatch.undo()
+        response = client.get("/users/1/activities-to-plot/")
+
+        assert in_progress.json()[0]["distance_km"] == 5.0
+        assert response.json()[0]["distance_km"] == 7.5
+        assert activities_to_plot_cache.hits == 0
@@ -0,0 +1,168 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from common.compression import CompressionMiddleware, negotiate_encoding
+from database.models import Activity, User
+
+BODY = json.dumps([{"activity": "run", "activity_type": "road"}] * 100).encode()
+
+
+@pytest.fixture
+def compressed_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+
+    @app.get("/large")
+    async def get_large():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"1"'})
+
+    @app.get("/small")
+    async def get_small():
+        return Response(b"[]", media_type="application/json")
+
+    return TestClient(app)
+
+
+class TestNegotiateEncoding:
+    @pytest.mark.parametrize(
+        "accept_encoding, expected",
+        [
+            ("gzip, deflate, br", "br"),
+            ("gzip, deflate", "gzip"),
+            ("br;q=0.5, gzip", "gzip"),
+            ("gzip;q=0.5, br;q=0.5", "br"),
+            ("*", "br"),
+            ("*, br;q=0", "gzip"),
+            ("GZIP", "gzip"),
+            ("identity", None),
+            ("gzip;q=0", None),
+            ("gzip;q=invalid", None),
+            ("", None),
+        ],
+    )
+    def test_negotiate_encoding(self, accept_encoding, expected):
+        assert negotiate_encoding(accept_encoding, ["br", "gzip"]) == expected
+
+    def test_only_supported_encodings_chosen(self):
+        assert negotiate_encoding("br, gzip;q=0.5", ["gzip"]) == "gzip"
+
+
+class TestCompressionMiddleware:
+    @pytest.mark.parametrize(
+        "encoding, decompress", [("br", brotli.decompress), ("gzip", gzip.decompress)]
+    )
+    def test_large_response_compressed(
+        self, compressed_client: TestClient, encoding, decompress
+    ):
+        response = compressed_client.get(
+            "/large", headers={"Accept-Encoding": encoding}
+        )
+
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.content == BODY
+        compressed_size = int(response.headers["content-length"])
+        assert compressed_size < len(BODY) / 10
+
+    def test_compressed_response_has_weak_etag(self, compressed_client: TestClient):
+        response = compressed_client.get("/large", headers={"Accept-Encoding": "br"})
+        assert response.headers["ETag"] == 'W/"1"'
+
+    def test_small_response_not_compressed(self, compressed_client: TestClient):
+        response = compressed_client.get("/small", headers={"Accept-Encoding": "br"})
+        assert "content-encoding" not in response.headers
+        assert response.content == b"[]"
+
+    def test_not_compressed_if_not_accepted(self, compressed_client: TestClient):
+        response = compressed_client.get(
+            "/large", headers={"Accept-Encoding": "identity"}
+        )
+
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["ETag"] == '"1"'
+        assert response.content == BODY
+
+    @pytest.mark.parametrize(
+        "encoding, decompress",
+        [
+            ("br", brotli.Decompressor().process),
+            ("gzip", zlib.decompressobj(31).decompress),
+        ],
+    )
+    def test_stream_compressed_chunk_by_chunk(self, encoding, decompress):
+        chunks = [f"chunk {i}\n".encode() * 100 for i in range(3)]
+
+        async def stream_app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            for i, chunk in enumerate(chunks):
+                more_body = i < len(chunks) - 1
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": more_body,
+                    }
+                )
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "headers": [(b"accept-encoding", encoding.encode())],
+        }
+        middleware = CompressionMiddleware(stream_app, minimum_size=1000)
+        asyncio.run(middleware(scope, None, send))
+
+        start, *bodies = messages
+        assert (b"content-encoding", encoding.encode()) in start["headers"]
+        # each chunk is flushed, so decompresses to the whole chunk as it arrives
+        assert [decompress(message["body"]) for message in bodies] == chunks
+        assert [message["more_body"] for message in bodies] == [True, True, False]
+
+
+class TestAppCompression:
+    @pytest.fixture
+    def activities(self, session: Session, activity_test_1):
+        session.add(User(name="test", email="test@email"))
+        for _ in range(20):
+            session.add(Activity(**activity_test_1))
+        session.commit()
+
+    def test_activities_to_plot_compressed(self, client: TestClient, activities):
+        response = client.get(
+            "/users/1/activities-to-plot/", headers={"Accept-Encoding": "br"}
+        )
+
+        assert response.headers["content-encoding"] == "br"
+        assert len(response.json()) == 20
+
+        etag = response.headers["ETag"]
+        not_modified = client.get(
+            "/users/1/activities-to-plot/",
+            headers={"Accept-Encoding": "br", "If-None-Match": etag},
+        )
+        assert not_modified.status_code == 304
+        # the same (weak) ETag as the compressed 200
+        assert not_modified.headers["ETag"] == etag
+        assert etag.startswith("W/")
+
+    def test_export_compressed(self, client: TestClient, activities):
+        response = client.get(
+            "/users/1/activities/export?format=csv", headers={"Accept-Encoding": "gzip"}
+        )
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.text.splitlines()) == 21
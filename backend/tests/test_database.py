@@ -0,0 +1,384 @@
+import random
+
+import pytest
+from sqlalchemy import (
+    Integer,
+    create_engine,
+    delete,
+    inspect,
+    select,
+    text,
+    type_coerce,
+)
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, SQLModel
+
+from common.pagination import encode_cursor, paginate_activities
+from common.utils import (
+    calculate_pace_mins_per_km,
+    calculate_speed_km_per_hr,
+    convert_date_to_dt_format,
+    convert_pace_to_float,
+    format_time_secs,
+)
+from database import database
+from database.expressions import (
+    ACTIVITY_PLOT_METRICS,
+    activity_stats_columns,
+    date_bucket,
+)
+from database.migrations import (
+    LATEST_VERSION,
+    SchemaVersion,
+    get_schema_version,
+    run_migrations,
+    schema_is_current,
+)
+from database.models import Activity, UserWeeklySummary
+from database.summaries import check_weekly_summaries
+
+
+def explain_query_plan(session: Session, query) -> str:
+    """returns SQLite's query plan for the given query as a single string"""
+    compiled = query.compile(session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = session.exec(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return " | ".join(row[-1] for row in plan)
+
+
+class TestMigrations:
+    def test_migrations_add_indexes_to_existing_tables(self, session: Session):
+        engine = session.get_bind()
+        # simulate a deployment created before the indexes were declared
+        with engine.begin() as conn:
+            for index in Activity.__table__.indexes:
+                index.drop(conn)
+
+        applied = run_migrations(engine)
+        index_names = {
+            index["name"] for index in inspect(engine).get_indexes("activity_table")
+        }
+
+        assert applied == list(range(1, LATEST_VERSION + 1))
+        assert {index.name for index in Activity.__table__.indexes} <= index_names
+
+    def test_migrations_on_new_database_record_latest_version(self, session: Session):
+        engine = session.get_bind()
+        run_migrations(engine)
+
+        with engine.connect() as conn:
+            assert get_schema_version(conn) == LATEST_VERSION
+
+    def test_migrations_only_applied_once(self, session: Session):
+        engine = session.get_bind()
+        run_migrations(engine)
+
+        assert run_migrations(engine) == []
+
+    def test_migrations_convert_string_columns_to_native_types(
+        self, session: Session, activity_test_1
+    ):
+        engine = session.get_bind()
+        # simulate a deployment created when date, time and moving_time were strings
+        with engine.begin() as conn:
+            Activity.__table__.drop(conn)
+            conn.execute(
+                text(
+                    "CREATE TABLE activity_table (id INTEGER PRIMARY KEY, "
+                    "user_id INTEGER, date VARCHAR, time VARCHAR, activity VARCHAR, "
+                    "activity_type VARCHAR, moving_time VARCHAR, distance_km FLOAT, "
+                    "perceived_effort INTEGER, elevation_m INTEGER)"
+                )
+            )
+            conn.execute(
+                text(
+                    "INSERT INTO activity_table VALUES (1, :user_id, :date, :time, "
+                    ":activity, :activity_type, :moving_time, :distance_km, "
+                    ":perceived_effort, :elevation_m)"
+                ),
+                activity_test_1,
+            )
+
+        run_migrations(engine)
+        activity = session.get(Activity, 1)
+        moving_time_secs = session.exec(
+            select(type_coerce(Activity.moving_time, Integer))
+        ).scalar()
+
+        assert activity.model_dump() == {"id": 1, **activity_test_1}
+        assert moving_time_secs == 35 * 60
+
+    def test_migrations_fill_weekly_summaries_from_existing_activities(
+        self, session: Session, activity_test_1
+    ):
+        engine = session.get_bind()
+        # simulate a deployment created before the weekly summaries were added
+        with engine.begin() as conn:
+            UserWeeklySummary.__table__.drop(conn)
+        session.add(Activity(**activity_test_1))
+        session.commit()
+
+        run_migrations(engine)
+
+        assert session.exec(select(UserWeeklySummary.count)).scalars().all() == [1]
+        assert check_weekly_summaries(session.connection()) == []
+
+    def test_migrations_add_date_updated_to_existing_tables(
+        self, session: Session, activity_test_1
+    ):
+        engine = session.get_bind()
+        # simulate a deployment created before date_updated was added
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_activity_user_id_date_updated"))
+            conn.execute(text("DROP INDEX ix_activity_date_updated_id"))
+            conn.execute(text("ALTER TABLE activity_table DROP COLUMN date_updated"))
+            conn.execute(text("ALTER TABLE user_table DROP COLUMN date_updated"))
+            conn.execute(
+                text(
+                    "INSERT INTO activity_table (user_id, date, time, activity, "
+                    "activity_type, moving_time, distance_km, perceived_effort) "
+                    "VALUES (1, '2010-10-10', '10:00', 'run', 'trail', 2100, 5.0, 10)"
+                )
+            )
+
+        run_migrations(engine)
+        activity = session.get(Activity, 1)
+        index_names = {
+            index["name"] for index in inspect(engine).get_indexes("activity_table")
+        }
+
+        assert activity.date_updated is not None
+        assert activity.date == "2010-10-10" and activity.moving_time == "00:35:00"
+        assert "ix_activity_user_id_date_updated" in index_names
+        assert "ix_activity_date_updated_id" in index_names
+        columns = {
+            col["name"]: col for col in inspect(engine).get_columns("activity_table")
+        }
+        assert not columns["date_updated"]["nullable"]
+        assert "date_updated" in {
+            col["name"] for col in inspect(engine).get_columns("user_table")
+        }
+
+    def test_create_all_creates_schema_version_table(self, session: Session):
+        engine = session.get_bind()
+        SQLModel.metadata.create_all(engine)
+
+        assert "schema_version" in inspect(engine).get_table_names()
+
+    def test_schema_is_current_once_all_migrations_applied(self, session: Session):
+        engine = session.get_bind()
+        assert not schema_is_current(engine)
+
+        run_migrations(engine)
+        assert schema_is_current(engine)
+
+        with engine.begin() as conn:
+            conn.execute(
+                delete(SchemaVersion).where(SchemaVersion.version == LATEST_VERSION)
+            )
+        assert not schema_is_current(engine)
+
+    def test_schema_is_not_current_for_new_database(self):
+        assert not schema_is_current(create_engine("sqlite://"))
+
+
+class TestSetupSchema:
+    @pytest.mark.parametrize(
+        "mode, schema_current, creates",
+        [
+            ("check", False, True),
+            ("check", True, False),
+            ("create", True, True),
+            ("skip", False, False),
+        ],
+    )
+    def test_creates_tables_according_to_mode(
+        self, monkeypatch, mode, schema_current, creates
+    ):
+        calls = []
+        monkeypatch.setattr(
+            database, "schema_is_current", lambda engine: schema_current
+        )
+        monkeypatch.setattr(
+            database, "create_db_and_tables", lambda: calls.append("create")
+        )
+
+        database.setup_schema(mode)
+
+        assert calls == (["create"] if creates else [])
+
+
+class TestQueryPlans:
+    def test_activities_by_user_id_and_date_range_uses_index(self, session: Session):
+        query = select(*Activity.__table__.c).where(
+            Activity.user_id == 1,
+            Activity.date > "2010-01-01",
+            Activity.date < "2011-01-01",
+        )
+        plan = explain_query_plan(session, query)
+
+        assert "USING INDEX ix_activity_user_id_date" in plan
+
+    def test_activities_by_user_id_sorted_by_id_uses_index(self, session: Session):
+        query = (
+            select(Activity)
+            .where(Activity.user_id == 1)
+            .order_by(Activity.id)
+            .limit(10)
+        )
+        plan = explain_query_plan(session, query)
+
+        assert "USING INDEX ix_activity_user_id_id" in plan
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+
+    def test_activities_sorted_by_distance_uses_index(self, session: Session):
+        query = select(Activity).order_by(Activity.distance_km, Activity.id).limit(10)
+        plan = explain_query_plan(session, query)
+
+        assert "ix_activity_distance_km_id" in plan
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+
+    def test_cursor_page_seeks_using_index(self, session: Session):
+        cursor = encode_cursor("date", "desc", "2010-10-10", 5)
+        query = paginate_activities(select(Activity), "date", "desc", 0, 10, cursor)
+        plan = explain_query_plan(session, query)
+
+        assert "ix_activity_date_id" in plan
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+        # a plain row comparison, so the index can drive the seek on Postgres too
+        compiled = str(query.compile(dialect=postgresql.dialect()))
+        assert "(activity_table.date, activity_table.id) < (" in compiled
+        assert "NULL" not in compiled
+
+
+class TestColumnTypes:
+    def test_activity_dates_and_times_returned_as_strings(
+        self, session: Session, activity_test_1
+    ):
+        session.add(Activity(**activity_test_1))
+        session.commit()
+        session.expire_all()
+
+        activity = session.get(Activity, 1)
+
+        assert activity.date == "2010-10-10"
+        assert activity.time == "10:00"
+        assert activity.moving_time == "00:35:00"
+
+    def test_moving_time_stored_as_seconds(self, session: Session, activity_test_1):
+        session.add(Activity(**activity_test_1))
+        session.commit()
+
+        stored = session.exec(
+            text("SELECT typeof(moving_time), moving_time FROM activity_table")
+        ).one()
+
+        assert tuple(stored) == ("integer", 35 * 60)
+
+    def test_date_comparison_is_typed(
+        self, session: Session, activity_test_1, activity_test_2
+    ):
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**activity_test_2))
+        session.commit()
+
+        # "2011/01/01" would compare after both dates as a string
+        query = select(Activity.id).where(Activity.date < "2011/01/01")
+        ids = session.exec(query).scalars().all()
+
+        assert ids == [1]
+
+
+class TestExpressions:
+    def test_plot_metrics_match_python_functions(self, session: Session):
+        rng = random.Random(0)
+        activities = []
+        for _ in range(500):
+            moving_secs = rng.randint(60, 5 * 60 * 60)
+            activity = Activity(
+                user_id=1,
+                date=f"20{rng.randint(10, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                time="10:00",
+                activity="run",
+                activity_type="road",
+                moving_time=format_time_secs(moving_secs),
+                distance_km=round(rng.uniform(0.5, 100), 2),
+                perceived_effort=5,
+            )
+            activities.append(activity)
+            session.add(activity)
+        session.commit()
+
+        query = select(Activity.id, *ACTIVITY_PLOT_METRICS).order_by(Activity.id)
+        rows = session.exec(query).mappings().all()
+
+        for activity, row in zip(activities, rows):
+            pace = calculate_pace_mins_per_km(
+                activity.distance_km, activity.moving_time
+            )
+            assert row["pace_str_mps"] == pace
+            assert row["pace_float_mps"] == convert_pace_to_float(pace)
+            assert row["speed_kmphr"] == calculate_speed_km_per_hr(
+                activity.distance_km, activity.moving_time
+            )
+            assert row["formatted_date"] == convert_date_to_dt_format(activity.date)
+
+    @pytest.mark.parametrize(
+        "distance_km, moving_time, speed_kmphr",
+        [
+            (0.5, "04:00:00", 0.12),  # 0.125, halfway in binary (rounds to even)
+            (0.125, "01:00:00", 0.12),
+            (8.125, "01:00:00", 8.12),
+            (2.675, "01:00:00", 2.67),  # stored as 2.67499...
+            (1.005, "01:00:00", 1.0),  # stored as 1.00499...
+        ],
+    )
+    def test_plot_metrics_round_halfway_values_like_python(
+        self, session: Session, activity_test_1, distance_km, moving_time, speed_kmphr
+    ):
+        activity = Activity(
+            **{
+                **activity_test_1,
+                "distance_km": distance_km,
+                "moving_time": moving_time,
+            }
+        )
+        session.add(activity)
+        session.commit()
+
+        row = session.exec(select(*ACTIVITY_PLOT_METRICS)).mappings().one()
+
+        assert row["speed_kmphr"] == speed_kmphr
+        assert row["speed_kmphr"] == calculate_speed_km_per_hr(distance_km, moving_time)
+        pace = calculate_pace_mins_per_km(distance_km, moving_time)
+        assert row["pace_float_mps"] == convert_pace_to_float(pace)
+
+    def test_plot_metrics_are_null_for_zero_distance_or_time(
+        self, session: Session, activity_test_1
+    ):
+        session.add(Activity(**{**activity_test_1, "distance_km": 0}))
+        session.add(Activity(**{**activity_test_1, "moving_time": "00:00:00"}))
+        session.commit()
+
+        rows = session.exec(select(*ACTIVITY_PLOT_METRICS[:3])).all()
+
+        assert [tuple(row) for row in rows] == [(None, None, 0.0), ("0:00", 0.0, None)]
+
+    def test_plot_metrics_compile_for_postgres(self):
+        query = select(*ACTIVITY_PLOT_METRICS)
+        compiled = str(query.compile(dialect=postgresql.dialect()))
+
+        assert "CAST(FLOOR(" in compiled
+        # rounded in Python when the result is read
+        assert "ROUND" not in compiled
+
+    def test_date_bucket_compiles_to_date_trunc_for_postgres(self):
+        query = select(*activity_stats_columns("month"))
+        compiled = str(query.compile(dialect=postgresql.dialect()))
+
+        assert "CAST(DATE_TRUNC('month', activity_table.date) AS DATE)" in compiled
+
+    def test_date_bucket_period_is_part_of_cache_key(self):
+        week = select(date_bucket("week", Activity.date))
+        year = select(date_bucket("year", Activity.date))
+
+        assert week._generate_cache_key() != year._generate_cache_key()
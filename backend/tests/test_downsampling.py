@@ -0,0 +1,59 @@
+import math
+
+import pytest
+from hypothesis import given, strategies as st
+
+from common.downsampling import downsample_rows, lttb_indices, plot_values_to_floats
+
+
+class TestLttbIndices:
+    def test_all_points_kept_if_no_more_than_max_points(self):
+        assert list(lttb_indices([1, 2, 3], [4, 5, 6], 3)) == [0, 1, 2]
+        assert list(lttb_indices([1, 2], [4, 5], 10)) == [0, 1]
+        assert list(lttb_indices([], [], 10)) == []
+
+    @given(
+        n=st.integers(min_value=1, max_value=500),
+        max_points=st.integers(min_value=3, max_value=100),
+        seed=st.integers(min_value=0, max_value=1000),
+    )
+    def test_selects_first_last_and_at_most_max_points(self, n, max_points, seed):
+        x = list(range(n))
+        y = [math.sin(i * (seed + 1)) for i in x]
+
+        indices = list(lttb_indices(x, y, max_points))
+
+        assert len(indices) == min(n, max_points)
+        assert indices == sorted(set(indices))
+        assert indices[0] == 0 and indices[-1] == n - 1
+
+    def test_keeps_peaks(self):
+        x = list(range(1000))
+        y = [math.sin(i / 50) for i in x]
+        y[321], y[654] = 10, -10
+
+        indices = lttb_indices(x, y, 50)
+
+        assert 321 in indices and 654 in indices
+
+    def test_max_points_less_than_3_raises_error(self):
+        with pytest.raises(ValueError, match="at least 3"):
+            lttb_indices([1, 2, 3, 4], [1, 2, 3, 4], 2)
+
+
+class TestDownsampleRows:
+    def test_downsample_rows_by_date(self):
+        rows = [(f"2025-01-{day:02d}", day % 5) for day in range(1, 32)]
+        downsampled = downsample_rows(rows, 0, 1, 10)
+
+        assert len(downsampled) == 10
+        assert downsampled[0] == rows[0] and downsampled[-1] == rows[-1]
+
+    def test_rows_returned_if_no_more_than_max_points(self):
+        rows = [(1, 2), (2, 3)]
+        assert downsample_rows(rows, 0, 1, 3) == rows
+
+    def test_plot_values_to_floats(self):
+        days = plot_values_to_floats(["2024-12-31", "2025-01-02"])
+        assert days[1] - days[0] == 2
+        assert list(plot_values_to_floats([5, 6.5])) == [5.0, 6.5]
@@ -0,0 +1,103 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from common.metrics import Histogram, Metrics, instrument_engine, metrics
+from database.database import get_async_session_maker
+from main import app
+
+
+@pytest.fixture(name="metrics")
+def metrics_fixture(monkeypatch):
+    """fixture giving the app's metrics, reset so each test starts from zero"""
+    metrics.reset()
+    monkeypatch.setattr(metrics, "gauges", list(metrics.gauges))
+    monkeypatch.setattr(metrics, "enabled", True)
+    yield metrics
+    metrics.reset()
+
+
+class TestHistogram:
+    def test_render_has_cumulative_buckets(self):
+        histogram = Histogram("latency", "Latency.", [0.1, 1], ["route"])
+        for value in [0.05, 0.1, 0.5, 5]:
+            histogram.observe(("/users",), value)
+
+        assert histogram.render() == [
+            "# HELP latency Latency.",
+            "# TYPE latency histogram",
+            'latency_bucket{route="/users",le="0.1"} 2',
+            'latency_bucket{route="/users",le="1"} 3',
+            'latency_bucket{route="/users",le="+Inf"} 4',
+            'latency_sum{route="/users"} 5.65',
+            'latency_count{route="/users"} 4',
+        ]
+
+    def test_label_values_escaped(self):
+        histogram = Histogram("latency", "Latency.", [1], ["route"])
+        histogram.observe(('/a"b',), 0.5)
+
+        assert 'latency_count{route="/a\\"b"} 1' in histogram.render()
+
+
+class TestMetricsMiddleware:
+    def test_requests_recorded_by_route_template_and_status(
+        self, client: TestClient, metrics: Metrics, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.get("/activities/1")
+        client.get("/activities/1")
+        client.get("/activities/-1")
+        client.get("/not-a-route")
+
+        series = metrics.request_duration.series
+
+        assert series[("GET", "/activities/{id}", "200")][2] == 2
+        assert series[("GET", "/activities/{id}", "404")][2] == 1
+        assert series[("POST", "/activities/", "201")][2] == 1
+        assert series[("GET", "<unmatched>", "404")][2] == 1
+
+    def test_response_size_recorded(self, client: TestClient, metrics: Metrics):
+        response = client.get("/")
+
+        size_series = metrics.response_size.series[("GET", "/", "200")]
+
+        assert size_series[1] == len(response.content)
+
+    def test_db_queries_recorded_per_request(
+        self, client: TestClient, metrics: Metrics, activity_test_1
+    ):
+        session_maker = app.dependency_overrides[get_async_session_maker]()
+        instrument_engine(session_maker.kw["bind"].sync_engine)
+        client.post("/activities/", json=activity_test_1)
+
+        client.get("/activities/1")
+        client.get("/")
+
+        queries = metrics.db_queries.series
+        assert queries[("GET", "/activities/{id}", "200")][1] == 1
+        assert queries[("GET", "/", "200")][1] == 0
+        assert metrics.db_duration.series[("GET", "/activities/{id}", "200")][1] > 0
+
+    def test_not_recorded_when_disabled(self, client: TestClient, metrics: Metrics):
+        metrics.enabled = False
+        client.get("/")
+
+        assert metrics.request_duration.series == {}
+
+
+class TestMetricsEndpoint:
+    def test_endpoint_responds_with_prometheus_text(
+        self, client: TestClient, metrics: Metrics
+    ):
+        metrics.register_gauges("test_cache", "Test stats.", lambda: {"hits": 3})
+        client.get("/")
+
+        response = client.get("/metrics")
+        count = (
+            'http_request_duration_seconds_count{method="GET",route="/",status="200"}'
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert f"{count} 1" in response.text
+        assert "test_cache_hits 3" in response.text
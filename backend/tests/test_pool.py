@@ -0,0 +1,106 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, text
+
+from database.pool import (
+    PoolMetrics,
+    get_pool_class,
+    get_pool_options,
+    get_pool_stats,
+)
+
+
+class TestGetPoolOptions:
+    def test_defaults(self, monkeypatch):
+        for name in [
+            "DB_POOL_SIZE",
+            "DB_MAX_OVERFLOW",
+            "DB_POOL_TIMEOUT",
+            "DB_POOL_PRE_PING",
+            "DB_POOL_RECYCLE",
+        ]:
+            monkeypatch.delenv(name, raising=False)
+
+        assert get_pool_options("postgresql://user@localhost/db") == {
+            "pool_pre_ping": True,
+            "pool_recycle": 1800,
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_timeout": 30.0,
+        }
+
+    def test_read_from_environment(self, monkeypatch):
+        monkeypatch.setenv("DB_POOL_SIZE", "20")
+        monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+        monkeypatch.setenv("DB_POOL_TIMEOUT", "2.5")
+        monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+        monkeypatch.setenv("DB_POOL_RECYCLE", "-1")
+
+        assert get_pool_options("postgresql+asyncpg://user@localhost/db") == {
+            "pool_pre_ping": False,
+            "pool_recycle": -1,
+            "pool_size": 20,
+            "max_overflow": 0,
+            "pool_timeout": 2.5,
+        }
+
+    def test_sqlite_has_no_pool_size(self):
+        options = get_pool_options("sqlite:///test.db")
+        assert "pool_size" not in options
+        assert "max_overflow" not in options
+
+
+class TestPoolMetrics:
+    @pytest.fixture
+    def metrics(self):
+        return PoolMetrics()
+
+    @pytest.fixture
+    def engine(self, tmp_path, metrics):
+        url = f"sqlite:///{tmp_path / 'pool.db'}"
+        engine = create_engine(
+            url,
+            poolclass=get_pool_class(url, metrics),
+            pool_size=1,
+            max_overflow=1,
+            pool_timeout=0.01,
+        )
+        yield engine
+        engine.dispose()
+
+    def test_checkouts_recorded(self, engine, metrics):
+        for _ in range(3):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        stats = get_pool_stats(engine, metrics)
+
+        assert stats["checkouts"] == 3
+        assert stats["checkout_secs_total"] > 0
+        assert stats["in_use"] == 0
+        assert stats["idle"] == 1
+        assert stats["peak_in_use"] == 1
+        assert stats["overflow_checkouts"] == 0
+
+    def test_overflow_and_timeouts_recorded(self, engine, metrics):
+        with engine.connect(), engine.connect():
+            stats = get_pool_stats(engine, metrics)
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+
+        assert stats["in_use"] == 2
+        assert stats["overflow"] == 1
+        assert metrics.overflow_checkouts == 1
+        assert metrics.checkout_timeouts == 1
+        assert metrics.peak_in_use == 2
+
+    def test_no_timed_pool_for_in_memory_sqlite(self, metrics):
+        assert get_pool_class("sqlite://", metrics) is None
+
+
+class TestPoolMetricsEndpoint:
+    def test_endpoint_responds_with_pool_metrics(self, client: TestClient):
+        response = client.get("/metrics/pool")
+
+        assert response.status_code == 200
+        assert "checkouts" in response.json()
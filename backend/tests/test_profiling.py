@@ -0,0 +1,145 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from database.profiling import (
+    ProfilingMiddleware,
+    QueryLog,
+    count_queries,
+    enable_profiling,
+    explain,
+    track_queries,
+)
+
+
+@pytest.fixture(name="engine")
+def engine_fixture():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO item (name) VALUES ('a'), ('b'), ('c')"))
+    yield engine
+    engine.dispose()
+
+
+class TestQueryLog:
+    def test_repeated_statements_above_threshold(self):
+        log = QueryLog()
+        for statement in ["SELECT 1", "SELECT  1\n", "SELECT 1", "SELECT 2"]:
+            log.add(statement)
+
+        assert len(log) == 4
+        assert log.repeated(2) == [("SELECT 1", 3)]
+        assert log.repeated(3) == []
+        assert log.summary() == "3 x SELECT 1\n1 x SELECT 2"
+
+
+class TestCountQueries:
+    def test_counts_statements_in_block_only(self, engine):
+        with count_queries(engine) as log:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT * FROM item"))
+                conn.execute(text("SELECT * FROM item WHERE id = 1"))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT * FROM item"))
+
+        assert log.statements == [
+            "SELECT * FROM item",
+            "SELECT * FROM item WHERE id = 1",
+        ]
+
+
+class TestSlowQueryLog:
+    def test_slow_query_logged_with_parameters_and_plan(self, engine, caplog):
+        enable_profiling(engine, slow_query_ms=0)
+
+        with caplog.at_level(logging.WARNING, logger="database.profiling"):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT * FROM item WHERE id = :id"), {"id": 2})
+
+        assert len(caplog.records) == 1
+        message = caplog.records[0].getMessage()
+        assert "Slow query" in message
+        assert "SELECT * FROM item WHERE id = ?" in message
+        assert "Parameters: (2,)" in message
+        # SQLite's EXPLAIN QUERY PLAN for a primary key lookup
+        assert "SEARCH item USING INTEGER PRIMARY KEY" in message
+
+    def test_failed_explain_keeps_transaction(self, engine):
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO item (name) VALUES ('d')"))
+            with pytest.raises(Exception, match="no such table"):
+                explain(conn, "SELECT * FROM missing", ())
+            # the transaction is still usable, and is committed
+            conn.execute(text("INSERT INTO item (name) VALUES ('e')"))
+
+        with engine.connect() as conn:
+            names = conn.execute(text("SELECT name FROM item")).scalars().all()
+        assert names == ["a", "b", "c", "d", "e"]
+
+    def test_only_select_insert_update_delete_explained(self, engine):
+        with engine.connect() as conn:
+            plan = explain(conn, "PRAGMA table_info(item)", ())
+            assert plan.startswith("(not explained")
+            plan = explain(conn, "  delete FROM item WHERE id = ?", (1,))
+            assert "SEARCH item USING INTEGER PRIMARY KEY" in plan
+
+    def test_fast_query_not_logged(self, engine, caplog):
+        enable_profiling(engine, slow_query_ms=10_000)
+
+        with caplog.at_level(logging.WARNING, logger="database.profiling"):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT * FROM item"))
+
+        assert caplog.records == []
+
+    def test_statements_recorded_in_tracked_block(self, engine):
+        enable_profiling(engine, slow_query_ms=10_000)
+
+        with track_queries() as log:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT * FROM item"))
+
+        assert log.statements == ["SELECT * FROM item"]
+
+
+class TestProfilingMiddleware:
+    @pytest.fixture(name="client")
+    def client_fixture(self, engine):
+        enable_profiling(engine, slow_query_ms=10_000)
+        app = FastAPI()
+        app.add_middleware(ProfilingMiddleware, n_plus_one_threshold=2)
+
+        @app.get("/items/{n}")
+        async def get_items(n: int):
+            # one query per item, as an N+1 pattern would
+            with engine.connect() as conn:
+                for id in range(1, n + 1):
+                    conn.execute(text("SELECT * FROM item WHERE id = :id"), {"id": id})
+            return {"n": n}
+
+        return TestClient(app)
+
+    def test_repeated_statements_logged(self, client: TestClient, caplog):
+        with caplog.at_level(logging.WARNING, logger="database.profiling"):
+            response = client.get("/items/3")
+
+        assert response.status_code == 200
+        assert [record.getMessage() for record in caplog.records] == [
+            "Possible N+1 query: GET /items/3 executed a statement 3 times: "
+            "SELECT * FROM item WHERE id = ?"
+        ]
+
+    def test_statements_within_threshold_not_logged(self, client: TestClient, caplog):
+        with caplog.at_level(logging.WARNING, logger="database.profiling"):
+            client.get("/items/2")
+
+        assert caplog.records == []
@@ -0,0 +1,138 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from common.cache import activities_to_plot_cache
+from common.responses import JSONRowsResponse, encode_json_columns, encode_json_rows
+from database.models import Activity
+from routes import activities, users
+
+
+class TestEncodeJsonRows:
+    def test_encode_json_rows_multiple_rows(self):
+        rows = [(1, "run", 5.5, None), (2, "ride", 10.0, 15)]
+        col_names = ["id", "activity", "distance_km", "elevation_m"]
+        result = encode_json_rows(rows, col_names)
+        assert json.loads(bytes(result)) == [
+            {"id": 1, "activity": "run", "distance_km": 5.5, "elevation_m": None},
+            {"id": 2, "activity": "ride", "distance_km": 10.0, "elevation_m": 15},
+        ]
+
+    def test_encode_json_rows_matches_json_dumps(self):
+        rows = [(1, "café"), (2, "road")]
+        col_names = ["id", "activity_type"]
+        result = encode_json_rows(rows, col_names)
+        expected = json.dumps(
+            [dict(zip(col_names, row)) for row in rows],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        assert bytes(result) == expected.encode("utf-8")
+
+    def test_encode_json_rows_no_rows(self):
+        assert bytes(encode_json_rows([], ["id"])) == b"[]"
+
+    def test_encode_json_rows_from_generator(self):
+        rows = ((i,) for i in range(3))
+        result = encode_json_rows(rows, ["id"])
+        assert json.loads(bytes(result)) == [{"id": 0}, {"id": 1}, {"id": 2}]
+
+    def test_fast_encoding_matches_json_module(self):
+        rows = [(1, "café", 5.5, None, 0.1), (2, "road", 10.0, 15, 12.35)]
+        col_names = ["id", "activity_type", "distance_km", "elevation_m", "speed"]
+        assert bytes(encode_json_rows(rows, col_names, fast=True)) == bytes(
+            encode_json_rows(rows, col_names)
+        )
+
+
+class TestEncodeJsonColumns:
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_encode_json_columns(self, fast):
+        rows = [(1, "café", None), (2, "road", 15)]
+        result = encode_json_columns(rows, ["id", "activity_type", "elevation_m"], fast)
+        assert result == (
+            '{"id":[1,2],"activity_type":["café","road"],"elevation_m":[null,15]}'
+        ).encode("utf-8")
+
+    def test_encode_json_columns_no_rows(self):
+        assert encode_json_columns([], ["id", "date"]) == b'{"id":[],"date":[]}'
+
+
+class TestJSONRowsResponse:
+    def test_json_rows_response_body_and_headers(self):
+        response = JSONRowsResponse([(1, "run")], ["id", "activity"])
+        assert response.body == b'[{"id":1,"activity":"run"}]'
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["content-length"] == str(len(response.body))
+
+
+class TestFastJsonResponses:
+    """the activity listings return the same responses with FAST_JSON_RESPONSES"""
+
+    @pytest.fixture
+    def get_both(self, client: TestClient, monkeypatch):
+        def get_both(path: str):
+            responses = []
+            for fast in (False, True):
+                monkeypatch.setattr(activities, "FAST_JSON_RESPONSES", fast)
+                monkeypatch.setattr(users, "FAST_JSON_RESPONSES", fast)
+                activities_to_plot_cache.clear()
+                responses.append(client.get(path))
+            return responses
+
+        return get_both
+
+    @pytest.mark.parametrize(
+        "path",
+        [
+            "/activities/?limit=3&sort_by=date&order_by=desc",
+            "/users/1/activities/?limit=3&sort_by=distance_km",
+            "/users/1/activities/?limit=3&sort_by=date_updated",
+            "/users/1/activities-to-plot/",
+        ],
+    )
+    def test_same_body_and_headers(
+        self, session: Session, get_both, path, activity_test_1, activity_test_2
+    ):
+        for activity in [activity_test_1, activity_test_2] * 2:
+            session.add(Activity(**activity))
+        session.add(Activity(**{**activity_test_1, "elevation_m": None}))
+        session.commit()
+
+        default, fast = get_both(path)
+
+        assert fast.status_code == default.status_code == 200
+        # the same objects (the keys may be in a different order)
+        assert fast.json() == default.json()
+        for header in ("content-type", "ETag", "X-Next-Cursor"):
+            assert fast.headers.get(header) == default.headers.get(header)
+
+    def test_fast_next_page_from_cursor(
+        self, session: Session, client: TestClient, monkeypatch, activity_test_1
+    ):
+        monkeypatch.setattr(activities, "FAST_JSON_RESPONSES", True)
+        for _ in range(3):
+            session.add(Activity(**activity_test_1))
+        session.commit()
+
+        first_page = client.get("/activities/?limit=2")
+        cursor = first_page.headers["X-Next-Cursor"]
+        second_page = client.get(f"/activities/?limit=2&cursor={cursor}")
+
+        assert [activity["id"] for activity in second_page.json()] == [3]
+
+    def test_not_found_unchanged(self, get_both):
+        default, fast = get_both("/users/1/activities/")
+        assert fast.status_code == default.status_code == 404
+        assert fast.json() == default.json()
+
+    def test_openapi_schema_unchanged(self, client: TestClient):
+        schema = client.get("/openapi.json").json()
+        response = schema["paths"]["/activities/"]["get"]["responses"]["200"]
+        assert response["content"]["application/json"]["schema"] == {
+            "type": "array",
+            "items": {"$ref": "#/components/schemas/Activity"},
+            "title": "Response Get Activities Activities  Get",
+        }
@@ -0,0 +1,105 @@
+import argparse
+import json
+import random
+from datetime import date
+
+import pytest
+
+from sqlalchemy import func, select
+from sqlmodel import Session
+
+from database.models import Activity, ActivityCreate, User
+from database.summaries import check_weekly_summaries
+from seed_db import (
+    generate_activities,
+    load_profiles,
+    make_activity,
+    seed_synthetic_data,
+)
+
+
+class TestGenerateActivities:
+    def test_same_seed_generates_same_activities(self):
+        first = list(generate_activities([1, 2], 50, seed=1))
+        second = list(generate_activities([1, 2], 50, seed=1))
+        other_seed = list(generate_activities([1, 2], 50, seed=2))
+
+        # date_updated (the last column) is the time of generation
+        assert [row[:-1] for row in first[0]] == [row[:-1] for row in second[0]]
+        assert [row[:-1] for row in first[0]] != [row[:-1] for row in other_seed[0]]
+
+    def test_activities_do_not_depend_on_chunk_size(self):
+        chunks = list(generate_activities([1, 2, 3], 10, chunk_size=7))
+        rows = [row for chunk in chunks for row in chunk]
+
+        assert [len(chunk) for chunk in chunks] == [7, 7, 7, 7, 2]
+        assert [row[:-1] for row in rows] == [
+            row[:-1] for row in next(generate_activities([1, 2, 3], 10))
+        ]
+
+    def test_activities_follow_mix_and_dates(self):
+        (rows,) = generate_activities(
+            [1],
+            200,
+            mix={"ride": 1},
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 3, 31),
+        )
+
+        assert {row[3] for row in rows} == {"ride"}
+        assert all(date(2024, 1, 1) <= row[1] <= date(2024, 3, 31) for row in rows)
+        # each user's activities are ordered by date
+        assert [row[1] for row in rows] == sorted(row[1] for row in rows)
+
+    def test_activities_follow_profiles(self, tmp_path):
+        path = tmp_path / "profiles.json"
+        run = {
+            "types": {"track": 1},
+            "pace_secs_per_km": [300, 300],
+            "distance_km": [5, 5],
+            "elevation_m_per_km": {"track": 0},
+            "perceived_effort": 9,
+        }
+        path.write_text(json.dumps({"run": run}))
+
+        (rows,) = generate_activities(
+            [1], 200, mix={"run": 1}, profiles=load_profiles(str(path))
+        )
+
+        assert {row[4] for row in rows} == {"track"}
+        assert {row[8] for row in rows} == {0}
+        # about 300 secs per km
+        assert all(250 < row[5] / row[6] < 350 for row in rows)
+        assert sum(row[7] for row in rows) / len(rows) > 7
+
+    def test_incomplete_profile_raises_error(self, tmp_path):
+        path = tmp_path / "profiles.json"
+        path.write_text(json.dumps({"run": {"types": {"road": 1}}}))
+
+        with pytest.raises(argparse.ArgumentTypeError, match="missing"):
+            load_profiles(str(path))
+
+
+class TestMakeActivity:
+    def test_activities_are_valid(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            activity = make_activity(1, rng)
+            Activity.model_validate(ActivityCreate.model_validate(activity))
+            assert 1 <= activity["perceived_effort"] <= 10
+
+
+class TestSeedSyntheticData:
+    def test_seeds_users_activities_and_summaries(self, session: Session):
+        session.add(User(name="existing", email="existing@email"))
+        session.commit()
+
+        count = seed_synthetic_data(session.get_bind(), 3, 20, chunk_size=25)
+
+        assert count == 60
+        assert session.exec(select(func.count()).select_from(User)).one() == (4,)
+        assert session.exec(
+            select(Activity.user_id, func.count()).group_by(Activity.user_id)
+        ).all() == [(2, 20), (3, 20), (4, 20)]
+        with session.get_bind().connect() as conn:
+            assert check_weekly_summaries(conn) == []
@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+
+import main
+from server import get_worker_count
+
+
+class TestGetWorkerCount:
+    def test_defaults_to_cpu_count(self, monkeypatch):
+        monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+        monkeypatch.setattr("os.cpu_count", lambda: 6)
+        assert get_worker_count() == 6
+
+    def test_web_concurrency_overrides_cpu_count(self, monkeypatch):
+        monkeypatch.setenv("WEB_CONCURRENCY", "3")
+        assert get_worker_count() == 3
+
+
+class TestLifespan:
+    def test_sets_up_schema_and_closes_connections(self, monkeypatch):
+        calls = []
+
+        async def dispose_engines():
+            calls.append("dispose_engines")
+
+        monkeypatch.setattr(main, "setup_schema", lambda: calls.append("setup_schema"))
+        monkeypatch.setattr(main, "dispose_engines", dispose_engines)
+
+        with TestClient(main.app):
+            assert calls == ["setup_schema"]
+        assert calls == ["setup_schema", "dispose_engines"]
@@ -0,0 +1,184 @@
+import random
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from database.models import Activity, UserWeeklySummary
+from database.summaries import check_weekly_summaries, rebuild_weekly_summaries
+
+
+def get_weekly_summaries(session: Session) -> list[tuple]:
+    """returns the (user_id, week_start, count, total_distance_km) of each weekly
+    summary"""
+    query = select(
+        UserWeeklySummary.user_id,
+        UserWeeklySummary.week_start,
+        UserWeeklySummary.count,
+        UserWeeklySummary.total_distance_km,
+    ).order_by(UserWeeklySummary.user_id, UserWeeklySummary.week_start)
+    return [tuple(row) for row in session.exec(query).all()]
+
+
+class TestWeeklySummaryUpdates:
+    def test_create_activity_adds_to_week(
+        self, session: Session, client: TestClient, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.post("/activities/", json={**activity_test_1, "date": "2010-10-04"})
+
+        # 2010-10-10 is a Sunday, so in the week starting Monday 2010-10-04
+        assert get_weekly_summaries(session) == [(1, "2010-10-04", 2, 10.0)]
+
+    def test_bulk_create_activities_adds_to_weeks(
+        self, session: Session, client: TestClient, activity_test_1, activity_test_2
+    ):
+        client.post("/users/", json={"name": "Test", "email": "test@email"})
+        client.post("/activities/bulk", json=[activity_test_1, activity_test_2])
+
+        assert get_weekly_summaries(session) == [
+            (1, "2010-10-04", 1, 5.0),
+            (1, "2011-10-10", 1, 10.0),
+        ]
+
+    def test_update_activity_distance_updates_week(
+        self, session: Session, client: TestClient, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.patch("/activities/1", json={"distance_km": 7.5})
+
+        assert get_weekly_summaries(session) == [(1, "2010-10-04", 1, 7.5)]
+
+    def test_update_activity_date_and_user_id_moves_to_new_week(
+        self, session: Session, client: TestClient, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.post("/activities/", json=activity_test_1)
+        client.patch("/activities/1", json={"date": "2010-10-11", "user_id": 2})
+        client.patch("/activities/2", json={"date": "2010-10-11", "distance_km": 2.0})
+
+        # the old week is removed once it has no activities
+        assert get_weekly_summaries(session) == [
+            (1, "2010-10-11", 1, 2.0),
+            (2, "2010-10-11", 1, 5.0),
+        ]
+
+    def test_delete_activity_removes_from_week(
+        self, session: Session, client: TestClient, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.post("/activities/", json=activity_test_1)
+        client.delete("/activities/1")
+
+        assert get_weekly_summaries(session) == [(1, "2010-10-04", 1, 5.0)]
+
+        client.delete("/activities/2")
+
+        assert get_weekly_summaries(session) == []
+
+    def test_random_changes_match_full_recompute(
+        self, session: Session, client: TestClient, activity_test_1
+    ):
+        rng = random.Random(0)
+        ids = []
+        for _ in range(200):
+            action = rng.choice(["create", "create", "update", "delete"])
+            changes = {
+                "user_id": rng.randint(1, 3),
+                "date": f"2010-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}",
+                "distance_km": round(rng.uniform(0.1, 50), 2),
+                "elevation_m": rng.choice([None, rng.randint(0, 500)]),
+            }
+            if action == "create" or not ids:
+                activity = {**activity_test_1, **changes}
+                ids.append(client.post("/activities/", json=activity).json()["id"])
+            elif action == "update":
+                client.patch(f"/activities/{rng.choice(ids)}", json=changes)
+            else:
+                client.delete(f"/activities/{ids.pop(rng.randrange(len(ids)))}")
+
+        assert check_weekly_summaries(session.connection()) == []
+
+
+class TestWeeklySummaryConsistency:
+    def test_check_finds_missing_and_incorrect_weeks(
+        self, session: Session, activity_test_1, activity_test_2
+    ):
+        # added directly, so not in the weekly summaries
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**activity_test_2))
+        session.add(
+            UserWeeklySummary(
+                user_id=1,
+                week_start="2010-10-04",
+                count=1,
+                total_distance_km=4.0,
+                total_moving_time_secs=35 * 60,
+                total_elevation_m=15,
+                total_perceived_effort=10,
+            )
+        )
+        session.commit()
+
+        mismatches = check_weekly_summaries(session.connection())
+
+        assert [(user_id, week) for user_id, week, _, _ in mismatches] == [
+            (1, "2010-10-04"),
+            (1, "2011-10-10"),
+        ]
+        assert mismatches[0][2]["total_distance_km"] == 4.0
+        assert mismatches[0][3]["total_distance_km"] == 5.0
+        assert mismatches[1][2] is None
+
+    def test_rebuild_matches_full_recompute(
+        self, session: Session, activity_test_1, activity_test_2
+    ):
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**activity_test_2))
+        session.add(Activity(**{**activity_test_1, "elevation_m": None}))
+        session.commit()
+
+        rebuild_weekly_summaries(session.connection())
+
+        assert check_weekly_summaries(session.connection()) == []
+        assert get_weekly_summaries(session) == [
+            (1, "2010-10-04", 2, 10.0),
+            (1, "2011-10-10", 1, 10.0),
+        ]
+
+    def test_rebuild_single_user(self, session: Session, activity_test_1):
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**{**activity_test_1, "user_id": 2}))
+        session.commit()
+
+        rebuild_weekly_summaries(session.connection(), user_id=2)
+
+        assert check_weekly_summaries(session.connection(), user_id=2) == []
+        assert len(check_weekly_summaries(session.connection())) == 1
+
+
+class TestGetWeeklySummaryByUserId:
+    def test_endpoint_responds_with_weekly_summaries(
+        self, client: TestClient, activity_test_1, activity_test_2
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.post("/activities/", json=activity_test_2)
+
+        response = client.get("/users/1/weekly-summary?start_date=2011-01-01")
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {
+                "user_id": 1,
+                "week_start": "2011-10-10",
+                "count": 1,
+                "total_distance_km": 10.0,
+                "total_moving_time_secs": 60 * 60,
+                "total_elevation_m": 10,
+                "total_perceived_effort": 8,
+            }
+        ]
+
+    def test_invalid_user_id_raises_404_error(self, client: TestClient):
+        response = client.get("/users/-1/weekly-summary")
+        assert response.status_code == 404
+        assert response.json()["detail"] == "No activities found"
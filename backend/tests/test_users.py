@@ -1,7 +1,18 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from common.cache import activities_to_plot_cache
+from database.database import get_async_session_maker
 from database.models import Activity, User
+from main import app
+from routes import users
 
 
 class TestCreateUser:
@@ -85,6 +96,30 @@ class TestGetUserByUserId:
         assert data["detail"] == "User not found"
 
 
+class TestGetUserByUserIdETag:
+    def test_matching_etag_returns_304(self, client: TestClient):
+        client.post("/users/", json={"name": "Test", "email": "test@email"})
+        etag = client.get("/users/1").headers["ETag"]
+
+        # weak comparison, so matches without the W/ prefix
+        response = client.get(
+            "/users/1", headers={"If-None-Match": etag.removeprefix("W/")}
+        )
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_etag_changes_when_user_updated(self, client: TestClient):
+        client.post("/users/", json={"name": "Test", "email": "test@email"})
+        etag = client.get("/users/1").headers["ETag"]
+
+        client.patch("/users/1", json={"name": "New name"})
+        response = client.get("/users/1", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.json()["name"] == "New name"
+
+
 class TestUpdateUser:
     def test_update_user_updates_user_name(self, session: Session, client: TestClient):
         user_1 = User(name="test_1", email="test@email")
@@ -152,6 +187,97 @@ class TestGetActivitiesByUserId:
         assert response.status_code == 404
         assert response.json()["detail"] == "No activities found"
 
+    def test_endpoint_pages_with_cursor(
+        self, session: Session, client: TestClient, activity_test_1, activity_test_2
+    ):
+        for activity in [activity_test_1, activity_test_2] * 2:
+            session.add(Activity(**activity))
+        session.add(Activity(**{**activity_test_1, "user_id": 2}))
+        session.commit()
+
+        first_page = client.get(
+            "/users/1/activities?limit=3&sort_by=date&order_by=desc"
+        )
+        cursor = first_page.headers["X-Next-Cursor"]
+        second_page = client.get(
+            f"/users/1/activities?limit=3&sort_by=date&order_by=desc&cursor={cursor}"
+        )
+
+        assert [activity["id"] for activity in first_page.json()] == [4, 2, 3]
+        assert [activity["id"] for activity in second_page.json()] == [1]
+        assert "X-Next-Cursor" not in second_page.headers
+
+
+class TestUserActivitiesETags:
+    @pytest.mark.parametrize(
+        "path", ["/users/1/activities/", "/users/1/activities-to-plot/"]
+    )
+    def test_matching_etag_returns_304(self, client: TestClient, activity_test_1, path):
+        client.post("/activities/", json=activity_test_1)
+        etag = client.get(path).headers["ETag"]
+
+        response = client.get(path, headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    @pytest.mark.parametrize(
+        "path", ["/users/1/activities/", "/users/1/activities-to-plot/"]
+    )
+    def test_etag_changes_when_activities_change(
+        self, client: TestClient, activity_test_1, activity_test_2, path
+    ):
+        client.post("/activities/", json=activity_test_1)
+        etags = [client.get(path).headers["ETag"]]
+        client.post("/activities/", json=activity_test_2)
+        etags.append(client.get(path).headers["ETag"])
+        client.patch("/activities/1", json={"distance_km": 7.5})
+        etags.append(client.get(path).headers["ETag"])
+        client.delete("/activities/2")
+        etags.append(client.get(path).headers["ETag"])
+
+        assert len(set(etags)) == 4
+
+    def test_etag_changes_when_activity_moved_to_another_user(
+        self, client: TestClient, activity_test_1
+    ):
+        client.post("/activities/", json=activity_test_1)
+        client.post("/activities/", json=activity_test_1)
+        etag = client.get("/users/1/activities/").headers["ETag"]
+
+        client.patch("/activities/2", json={"user_id": 2})
+        response = client.get("/users/1/activities/", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+    def test_etag_depends_on_query_params(self, client: TestClient, activity_test_1):
+        client.post("/activities/", json=activity_test_1)
+        etag = client.get("/users/1/activities-to-plot/").headers["ETag"]
+
+        response = client.get(
+            "/users/1/activities-to-plot/?start_date=2010-01-01",
+            headers={"If-None-Match": etag},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_matching_etag_returns_304_without_cache(
+        self, client: TestClient, activity_test_1, monkeypatch
+    ):
+        monkeypatch.setattr(activities_to_plot_cache, "ttl_secs", 0)
+        client.post("/activities/", json=activity_test_1)
+        etag = client.get("/users/1/activities-to-plot/").headers["ETag"]
+
+        response = client.get(
+            "/users/1/activities-to-plot/", headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == 304
+        assert activities_to_plot_cache.hits == 0
+
 
 class TestGetActivitiesToPlotByUserId:
     def test_endpoint_responds_with_additional_fields_default_dates(
@@ -185,7 +311,9 @@ class TestGetActivitiesToPlotByUserId:
 
         start_date = "2010-09-01"
         end_date = "2010-11-01"
-        response = client.get(f"/users/1/activities-to-plot?start_date={start_date}&end_date={end_date}")
+        response = client.get(
+            f"/users/1/activities-to-plot?start_date={start_date}&end_date={end_date}"
+        )
         response_activities = response.json()
 
         assert len(response_activities) == 1
@@ -208,7 +336,331 @@ class TestGetActivitiesToPlotByUserId:
 
         start_date = "2000/09/01"
         end_date = "2000/11/01"
-        response = client.get(f"/users/1/activities-to-plot?start_date={start_date}&end_date={end_date}")
-        
+        response = client.get(
+            f"/users/1/activities-to-plot?start_date={start_date}&end_date={end_date}"
+        )
+
+        assert response.status_code == 404
+        assert response.json()["detail"] == "No activities found"
+
+    def test_invalid_dates_raises_422_error(self, client: TestClient):
+        response = client.get("/users/1/activities-to-plot?start_date=01-09-2000")
+
+        assert response.status_code == 422
+        assert "Dates do not match format" in response.json()["detail"]
+
+    def test_columnar_format_returns_list_per_field(
+        self, session: Session, client: TestClient, activity_test_1, activity_test_2
+    ):
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**activity_test_2))
+        session.commit()
+
+        rows = client.get("/users/1/activities-to-plot").json()
+        columns = client.get("/users/1/activities-to-plot?format=columnar").json()
+
+        assert list(columns) == list(rows[0])
+        assert columns == {field: [row[field] for row in rows] for field in rows[0]}
+
+    @pytest.mark.parametrize("format", ["rows", "columnar"])
+    def test_fields_selects_only_requested_columns(
+        self,
+        session: Session,
+        client: TestClient,
+        activity_test_1,
+        query_budget,
+        format,
+    ):
+        session.add(Activity(**activity_test_1))
+        session.commit()
+
+        with query_budget(2) as log:
+            response = client.get(
+                "/users/1/activities-to-plot"
+                f"?format={format}&fields=distance_km,pace_float_mps,distance_km"
+            )
+
+        expected = {"distance_km": 5.0, "pace_float_mps": 7.0}
+        if format == "columnar":
+            assert response.json() == {k: [v] for k, v in expected.items()}
+        else:
+            assert response.json() == [expected]
+        query = log.statements[-1]
+        assert "moving_time" in query  # used to compute the pace
+        assert "perceived_effort" not in query and "elevation_m" not in query
+
+    def test_format_and_fields_have_separate_etags(
+        self, session: Session, client: TestClient, activity_test_1
+    ):
+        session.add(Activity(**activity_test_1))
+        session.commit()
+
+        etags = {
+            client.get(f"/users/1/activities-to-plot{params}").headers["ETag"]
+            for params in ["", "?format=columnar", "?fields=id", "?fields=date"]
+        }
+        assert len(etags) == 4
+
+    @pytest.mark.parametrize("fields", ["distance", "id,", ""])
+    def test_invalid_fields_raises_422_error(self, client: TestClient, fields):
+        response = client.get(f"/users/1/activities-to-plot?fields={fields}")
+
+        assert response.status_code == 422
+        assert "Fields must be a comma separated list of" in response.json()["detail"]
+
+    def test_invalid_format_raises_422_error(self, client: TestClient):
+        response = client.get("/users/1/activities-to-plot?format=columns")
+        assert response.status_code == 422
+
+
+class TestGetActivitiesToPlotDownsampled:
+    @pytest.fixture
+    def activities(self, session: Session, activity_test_1):
+        # daily activities, in reverse order of date, with a null elevation
+        for day in range(60, 0, -1):
+            distance_km = 20.0 if day == 30 else 5.0 + day % 7
+            session.add(
+                Activity(
+                    **{
+                        **activity_test_1,
+                        "date": str(date(2024, 1, 1) + timedelta(days=day - 1)),
+                        "distance_km": distance_km,
+                        "elevation_m": None if day == 1 else day,
+                    }
+                )
+            )
+        session.commit()
+
+    def test_downsampled_to_max_points_sorted_by_x(
+        self, client: TestClient, activities
+    ):
+        response = client.get(
+            "/users/1/activities-to-plot?max_points=10&x=date&y=distance_km"
+        )
+        dates = [activity["date"] for activity in response.json()]
+
+        assert len(dates) == 10
+        assert dates == sorted(dates)
+        assert dates[0] == "2024-01-01" and dates[-1] == "2024-02-29"
+        # the longest activity is kept
+        assert 20.0 in [activity["distance_km"] for activity in response.json()]
+
+    def test_downsampled_columnar_fields_without_x_and_y(
+        self, client: TestClient, activities
+    ):
+        response = client.get(
+            "/users/1/activities-to-plot?max_points=5&x=date&y=distance_km"
+            "&format=columnar&fields=id"
+        )
+        assert list(response.json()) == ["id"]
+        assert len(response.json()["id"]) == 5
+
+    def test_null_x_or_y_left_out(self, client: TestClient, activities):
+        response = client.get(
+            "/users/1/activities-to-plot?max_points=100&x=date&y=elevation_m"
+        )
+        activities = response.json()
+
+        assert len(activities) == 59
+        assert all(activity["elevation_m"] is not None for activity in activities)
+
+    def test_max_points_has_separate_etags(self, client: TestClient, activities):
+        etags = {
+            client.get(f"/users/1/activities-to-plot{params}").headers["ETag"]
+            for params in [
+                "",
+                "?max_points=10",
+                "?max_points=20",
+                "?max_points=10&y=speed_kmphr",
+            ]
+        }
+        assert len(etags) == 4
+
+    @pytest.mark.parametrize(
+        "params", ["max_points=2", "max_points=10&x=time", "max_points=10&y=date"]
+    )
+    def test_invalid_params_raise_422_error(self, client: TestClient, params):
+        response = client.get(f"/users/1/activities-to-plot?{params}")
+        assert response.status_code == 422
+
+
+class TestGetActivityStatsByUserId:
+    def test_weekly_stats_start_on_monday(
+        self, session: Session, client: TestClient, activity_test_1
+    ):
+        # 2010-10-10 is a Sunday, 2010-10-11 the following Monday
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**{**activity_test_1, "date": "2010-10-04"}))
+        session.add(Activity(**{**activity_test_1, "date": "2010-10-11"}))
+        session.commit()
+
+        response = client.get("/users/1/stats?period=week")
+        stats = response.json()
+
+        assert response.status_code == 200
+        assert [(s["period_start"], s["count"]) for s in stats] == [
+            ("2010-10-04", 2),
+            ("2010-10-11", 1),
+        ]
+        assert stats[0]["total_distance_km"] == 10.0
+        assert stats[0]["total_moving_time_secs"] == 2 * 35 * 60
+        assert stats[0]["average_perceived_effort"] == 10.0
+        assert stats[0]["activity"] is None
+
+    def test_monthly_stats_grouped_by_activity(
+        self, session: Session, client: TestClient, activity_test_1, activity_test_2
+    ):
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**{**activity_test_1, "date": "2010-10-20"}))
+        session.add(Activity(**{**activity_test_1, "activity": "walk"}))
+        session.add(Activity(**activity_test_2))
+        session.commit()
+
+        response = client.get("/users/1/stats?period=month&group_by=activity")
+        stats = response.json()
+
+        assert [(s["period_start"], s["activity"], s["count"]) for s in stats] == [
+            ("2010-10-01", "run", 2),
+            ("2010-10-01", "walk", 1),
+            ("2011-10-01", "run", 1),
+        ]
+        assert stats[0]["total_elevation_m"] == 30
+        assert stats[2]["average_distance_km"] == 10.0
+
+    def test_stats_between_given_dates(
+        self, session: Session, client: TestClient, activity_test_1, activity_test_2
+    ):
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**activity_test_2))
+        session.commit()
+
+        response = client.get("/users/1/stats?period=year&start_date=2011/01/01")
+
+        assert [(s["period_start"], s["count"]) for s in response.json()] == [
+            ("2011-01-01", 1)
+        ]
+
+    def test_invalid_user_id_raises_404_error(self, client: TestClient):
+        response = client.get("/users/-1/stats")
         assert response.status_code == 404
-        assert response.json()["detail"] == "No activities found"
\ No newline at end of file
+        assert response.json()["detail"] == "No activities found"
+
+    def test_invalid_period_raises_422_error(self, client: TestClient):
+        response = client.get("/users/1/stats?period=day")
+        assert response.status_code == 422
+
+    def test_invalid_dates_raises_422_error(self, client: TestClient):
+        response = client.get("/users/1/stats?end_date=01-09-2000")
+
+        assert response.status_code == 422
+        assert "Dates do not match format" in response.json()["detail"]
+
+
+class TestExportActivitiesByUserId:
+    def test_export_ndjson_returns_all_user_activities(
+        self, session: Session, client: TestClient, activity_test_1, activity_test_2
+    ):
+        session.add(User(name="test_1", email="test@email"))
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**{**activity_test_1, "user_id": 2}))
+        session.add(Activity(**activity_test_2))
+        session.commit()
+
+        response = client.get("/users/1/activities/export")
+        lines = response.text.splitlines()
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in lines] == [
+            {"id": 1, **activity_test_1},
+            {"id": 3, **activity_test_2},
+        ]
+
+    def test_export_csv_returns_header_and_rows(
+        self, session: Session, client: TestClient, activity_test_1, activity_test_2
+    ):
+        session.add(User(name="test_1", email="test@email"))
+        session.add(Activity(**activity_test_1))
+        session.add(Activity(**activity_test_2))
+        session.commit()
+
+        response = client.get("/users/1/activities/export?format=csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert "activities_user_1.csv" in response.headers["content-disposition"]
+        assert [row["id"] for row in rows] == ["1", "2"]
+        assert rows[1]["moving_time"] == activity_test_2["moving_time"]
+        assert rows[1]["date"] == activity_test_2["date"]
+
+    def test_export_streams_in_chunks(
+        self, session: Session, client: TestClient, activity_test_1, monkeypatch
+    ):
+        monkeypatch.setattr(users, "EXPORT_CHUNK_SIZE", 2)
+        session.add(User(name="test_1", email="test@email"))
+        for _ in range(5):
+            session.add(Activity(**activity_test_1))
+        session.commit()
+
+        # the TestClient buffers the whole response, so the stream is read directly
+        session_maker = app.dependency_overrides[get_async_session_maker]()
+
+        async def read_stream():
+            stream = users.stream_activities_export(session_maker, 1, "ndjson")
+            return [chunk async for chunk in stream]
+
+        chunks = asyncio.run(read_stream())
+
+        assert len(chunks) == 3
+        assert len("".join(chunks).splitlines()) == 5
+
+    def test_export_csv_for_user_without_activities_returns_header(
+        self, session: Session, client: TestClient
+    ):
+        session.add(User(name="test_1", email="test@email"))
+        session.commit()
+
+        response = client.get("/users/1/activities/export?format=csv")
+
+        assert response.text.startswith("id,user_id,date")
+        assert len(response.text.splitlines()) == 1
+
+    def test_export_invalid_user_id_raises_404_error(self, client: TestClient):
+        response = client.get("/users/-1/activities/export")
+        assert response.status_code == 404
+        assert response.json()["detail"] == "User not found"
+
+    def test_export_invalid_format_raises_422_error(self, client: TestClient):
+        response = client.get("/users/1/activities/export?format=xml")
+        assert response.status_code == 422
+
+
+class TestUsersQueryBudgets:
+    @pytest.fixture
+    def activities(self, session: Session, activity_test_1, activity_test_2):
+        session.add(User(name="test", email="test@email"))
+        for activity in [activity_test_1, activity_test_2] * 5:
+            session.add(Activity(**activity))
+        session.commit()
+
+    def test_get_activities_by_user_id(
+        self, client: TestClient, activities, query_budget
+    ):
+        # the ETag version and the page
+        with query_budget(2):
+            response = client.get("/users/1/activities/")
+        assert len(response.json()) == 10
+
+    def test_get_activities_to_plot_cached_after_first_request(
+        self, client: TestClient, activities, query_budget
+    ):
+        with query_budget(2):
+            client.get("/users/1/activities-to-plot")
+        with query_budget(0):
+            response = client.get("/users/1/activities-to-plot")
+        assert len(response.json()) == 10
+
+    def test_get_stats_single_query(self, client: TestClient, activities, query_budget):
+        with query_budget(1):
+            client.get("/users/1/stats")
@@ -1,12 +1,20 @@
 from common.utils import (
+    calculate_activity_metrics,
     calculate_pace_mins_per_km,
-    calculate_speed_km_per_hr, 
-    calculate_time_secs, 
+    calculate_speed_km_per_hr,
+    calculate_time_secs,
     convert_pace_to_float,
     convert_date_to_dt_format,
     format_query_output,
-    update_activities_dict
+    format_time_secs,
+    parse_date,
+    round_2dp,
+    update_activities_dict,
 )
+from datetime import date
+import numpy as np
+import pytest
+from hypothesis import given, strategies as st
 
 
 class TestCalculateTimeSecs:
@@ -29,6 +37,30 @@ class TestCalculateTimeSecs:
         assert result == expected
 
 
+class TestFormatTimeSecs:
+    def test_format_time_secs_just_secs(self):
+        assert format_time_secs(40) == "00:00:40"
+
+    def test_format_time_secs_hours_minutes_and_secs(self):
+        assert format_time_secs(3690) == "01:01:30"
+
+    def test_format_time_secs_is_inverse_of_calculate_time_secs(self):
+        moving_time = "02:15:30"
+        assert format_time_secs(calculate_time_secs(moving_time)) == moving_time
+
+
+class TestParseDate:
+    def test_parse_date_dashes(self):
+        assert parse_date("2025-03-25") == date(2025, 3, 25)
+
+    def test_parse_date_slashes(self):
+        assert parse_date("2025/03/25") == date(2025, 3, 25)
+
+    def test_parse_date_raises_value_error_for_invalid_date(self):
+        with pytest.raises(ValueError):
+            parse_date("25 March 25")
+
+
 class TestCalculatePace:
     def test_calculate_pace_min_per_km_30_mins(self):
         moving_time = "00:30:00"
@@ -85,6 +117,66 @@ class TestCalculateSpeed:
         assert result == 12.86
 
 
+class TestCalculateActivityMetrics:
+    def test_calculate_activity_metrics(self):
+        result = calculate_activity_metrics([7.16, 10.0], [2961, 3600])
+        assert result == {
+            "pace_str_mps": ["6:53", "6:00"],
+            "pace_float_mps": [6.88, 6.0],
+            "speed_kmphr": [8.71, 10.0],
+        }
+
+    def test_calculate_activity_metrics_empty(self):
+        result = calculate_activity_metrics([], [])
+        assert result == {"pace_str_mps": [], "pace_float_mps": [], "speed_kmphr": []}
+
+    def test_calculate_activity_metrics_raises_zero_division_error(self):
+        with pytest.raises(ZeroDivisionError):
+            calculate_activity_metrics([5.0, 0.0], [1800, 1800])
+        with pytest.raises(ZeroDivisionError):
+            calculate_activity_metrics([5.0, 5.0], [1800, 0])
+
+    @given(
+        st.lists(
+            st.tuples(
+                st.floats(min_value=0.01, max_value=1000, allow_nan=False),
+                st.integers(min_value=1, max_value=100 * 60 * 60),
+            ),
+            max_size=50,
+        )
+    )
+    def test_calculate_activity_metrics_matches_per_activity_functions(
+        self, activities
+    ):
+        distances = [distance for distance, _ in activities]
+        moving_times = [format_time_secs(secs) for _, secs in activities]
+        result = calculate_activity_metrics(distances, [secs for _, secs in activities])
+
+        paces = [
+            calculate_pace_mins_per_km(distance, moving_time)
+            for distance, moving_time in zip(distances, moving_times)
+        ]
+        assert result["pace_str_mps"] == paces
+        assert result["pace_float_mps"] == [
+            convert_pace_to_float(pace) for pace in paces
+        ]
+        assert result["speed_kmphr"] == [
+            calculate_speed_km_per_hr(distance, moving_time)
+            for distance, moving_time in zip(distances, moving_times)
+        ]
+
+    @given(st.lists(st.floats(min_value=-1e6, max_value=1e6, allow_nan=False)))
+    def test_round_2dp_matches_round(self, values):
+        result = round_2dp(np.array(values, dtype=np.float64)).tolist()
+        assert result == [round(value, 2) for value in values]
+
+    def test_round_2dp_matches_round_for_halfway_values(self):
+        # np.round(2.675, 2) differs from round(2.675, 2)
+        values = [2.675, 1.005, 0.125, 0.375, 8.125, 1e17]
+        result = round_2dp(np.array(values)).tolist()
+        assert result == [round(value, 2) for value in values]
+
+
 class TestUpdateActivitiesDict:
     def test_update_activities_dict_single_dict(self):
         activities = [
@@ -93,7 +185,7 @@ class TestUpdateActivitiesDict:
                 "time": "20:16",
                 "date": "2025/03/25",
                 "moving_time": "00:49:21",
-                "distance_km": 7.16
+                "distance_km": 7.16,
             }
         ]
         expected = [
@@ -106,7 +198,7 @@ class TestUpdateActivitiesDict:
                 "pace_str_mps": "6:53",
                 "pace_float_mps": 6.88,
                 "speed_kmphr": 8.71,
-                "formatted_date": "2025-03-25T00:00:00.000Z"
+                "formatted_date": "2025-03-25T00:00:00.000Z",
             }
         ]
         result = update_activities_dict(activities)
@@ -119,15 +211,15 @@ class TestUpdateActivitiesDict:
                 "time": "10:10",
                 "date": "2025/04/25",
                 "moving_time": "01:00:00",
-                "distance_km": 10.0
+                "distance_km": 10.0,
             },
             {
                 "activity": "run",
                 "time": "20:16",
                 "date": "2025/03/25",
                 "moving_time": "00:49:21",
-                "distance_km": 7.16
-            }
+                "distance_km": 7.16,
+            },
         ]
         expected = [
             {
@@ -139,7 +231,7 @@ class TestUpdateActivitiesDict:
                 "pace_str_mps": "6:00",
                 "pace_float_mps": 6.00,
                 "speed_kmphr": 10.00,
-                "formatted_date": "2025-04-25T00:00:00.000Z"
+                "formatted_date": "2025-04-25T00:00:00.000Z",
             },
             {
                 "activity": "run",
@@ -150,13 +242,25 @@ class TestUpdateActivitiesDict:
                 "pace_str_mps": "6:53",
                 "pace_float_mps": 6.88,
                 "speed_kmphr": 8.71,
-                "formatted_date": "2025-03-25T00:00:00.000Z"
-            }
+                "formatted_date": "2025-03-25T00:00:00.000Z",
+            },
         ]
         result = update_activities_dict(activities)
         assert len(result) == len(activities)
         assert result == expected
 
+    def test_update_activities_dict_does_not_modify_input(self):
+        activities = [
+            {"date": "2025/03/25", "moving_time": "00:49:21", "distance_km": 7.16}
+        ]
+        update_activities_dict(activities)
+        assert activities == [
+            {"date": "2025/03/25", "moving_time": "00:49:21", "distance_km": 7.16}
+        ]
+
+    def test_update_activities_dict_empty_list(self):
+        assert update_activities_dict([]) == []
+
 
 class TestFormatQueryOutput:
     def test_format_query_output_single_row(self):
@@ -0,0 +1,154 @@
+from datetime import datetime
+
+import pytest
+from hypothesis import given, strategies as st
+
+from common.validation import (
+    check_activity,
+    check_date,
+    check_duration,
+    check_perceived_effort,
+    check_time,
+)
+from database.models import ActivityUpdate
+
+
+def accepts(check, value) -> bool:
+    try:
+        check(value)
+        return True
+    except ValueError:
+        return False
+
+
+def strptime_accepts(value, format: str) -> bool:
+    """the previous date and time validation"""
+    try:
+        datetime.strptime(value, format)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def split_accepts(value) -> bool:
+    """the previous moving_time validation"""
+    try:
+        hours, minutes, seconds = map(int, value.split(":"))
+        return True
+    except (ValueError, AttributeError):
+        return False
+
+
+# strings made of the characters of dates and times, so many are (nearly) valid
+date_like = st.text(alphabet="0123456789-:/ ", max_size=12)
+
+
+class TestCheckDate:
+    @given(
+        st.one_of(
+            date_like,
+            st.dates().map(lambda d: d.isoformat()),
+            st.builds(
+                "{}-{}-{}".format,
+                st.integers(0, 9999),
+                st.integers(0, 13),
+                st.integers(0, 32),
+            ),
+        )
+    )
+    def test_accepts_same_dates_as_strptime(self, value):
+        assert accepts(check_date, value) == strptime_accepts(value, "%Y-%m-%d")
+
+    @pytest.mark.parametrize(
+        "value", ["2025-03-05", "2025-3-5", "2024-02-29", "0001-01-01"]
+    )
+    def test_valid_dates(self, value):
+        assert check_date(value) == value
+
+    @pytest.mark.parametrize(
+        "value", ["2025-02-29", "2025-13-01", "25 March 25", "2025/03/05", None, 5]
+    )
+    def test_invalid_dates_raise_error(self, value):
+        with pytest.raises(ValueError, match="Date does not match format"):
+            check_date(value)
+
+
+class TestCheckTime:
+    @given(
+        st.one_of(
+            date_like,
+            st.times().map(lambda t: t.strftime("%H:%M")),
+            st.builds("{}:{}".format, st.integers(0, 25), st.integers(0, 61)),
+        )
+    )
+    def test_accepts_same_times_as_strptime(self, value):
+        assert accepts(check_time, value) == strptime_accepts(value, "%H:%M")
+
+    @pytest.mark.parametrize("value", ["24:00", "7.30pm", "12:60", None])
+    def test_invalid_times_raise_error(self, value):
+        with pytest.raises(ValueError, match="Time does not match format 'HH:MM'"):
+            check_time(value)
+
+
+class TestCheckDuration:
+    @given(st.one_of(date_like, st.text(max_size=10)))
+    def test_accepts_same_durations_as_before(self, value):
+        assert accepts(check_duration, value) == split_accepts(value)
+
+    @pytest.mark.parametrize("value", ["00:30:05", "1:2:3", "100:00:00"])
+    def test_valid_durations(self, value):
+        assert check_duration(value) == value
+
+    @pytest.mark.parametrize("value", ["30mins 5secs", "00:30", None, 30])
+    def test_invalid_durations_raise_error(self, value):
+        with pytest.raises(ValueError, match="Time does not match format 'HH:MM:SS'"):
+            check_duration(value)
+
+
+class TestCheckActivity:
+    def test_valid_activities(self):
+        assert check_activity("run") == "run"
+        assert check_activity("ride") == "ride"
+
+    @pytest.mark.parametrize("value", ["running", "Run", None, ["run"]])
+    def test_invalid_activities_raise_error(self, value):
+        with pytest.raises(ValueError, match=r"Activity not in \['run', 'ride'\]"):
+            check_activity(value)
+
+
+class TestCheckPerceivedEffort:
+    @pytest.mark.parametrize("value", [1, 10, 5.0])
+    def test_valid_efforts(self, value):
+        assert check_perceived_effort(value) == value
+
+    @pytest.mark.parametrize("value", [0, 11, 100, -1])
+    def test_out_of_range_efforts_raise_error(self, value):
+        with pytest.raises(ValueError, match="Perceived_effort not in range 1 - 10"):
+            check_perceived_effort(value)
+
+    @pytest.mark.parametrize("value", ["five", None])
+    def test_non_numbers_raise_error(self, value):
+        with pytest.raises(ValueError, match="not a valid number in the range"):
+            check_perceived_effort(value)
+
+
+class TestActivityValidators:
+    def test_update_fields_validated_with_same_messages(self):
+        with pytest.raises(ValueError) as e:
+            ActivityUpdate.model_validate(
+                {
+                    "date": "25 March 25",
+                    "time": "7.30pm",
+                    "activity": "running",
+                    "moving_time": "30mins",
+                    "perceived_effort": 100,
+                }
+            )
+
+        assert [error["msg"] for error in e.value.errors()] == [
+            "Value error, Date does not match format 'YYYY-MM-DD'",
+            "Value error, Time does not match format 'HH:MM'",
+            "Value error, Activity not in ['run', 'ride']",
+            "Value error, Time does not match format 'HH:MM:SS'",
+            "Value error, Perceived_effort not in range 1 - 10",
+        ]